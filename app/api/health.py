@@ -5,8 +5,12 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.mongodb.indexes import get_missing_indexes
 from app.db.mongodb.mongodb import MongoDB
 from app.db.postgres.session import check_db_connection, get_db
+from app.services.circuit_breaker import CircuitBreaker, CircuitState
+from app.services.concurrency_limiter import AdaptiveLimiter
+from app.services.llm.router import LLMRouter
 
 router = APIRouter(prefix="/health", tags=["health"], include_in_schema=False)
 logger = logging.getLogger(__name__)
@@ -80,3 +84,42 @@ async def mongodb_health():
             "error": str(e),
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
+
+
+@router.get("/mongodb/indexes")
+async def mongodb_indexes_health():
+    """
+    MongoDB index health check.
+    Reports the registered indexes that are missing from MongoDB.
+    """
+    try:
+        missing_indexes = await get_missing_indexes()
+        return {
+            "status": "ok" if not missing_indexes else "error",
+            "missing_indexes": missing_indexes,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+    except Exception as e:
+        logger.error(f"MongoDB index health check failed: {str(e)}")
+        return {
+            "status": "error",
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+@router.get("/upstreams")
+def upstreams_health():
+    """
+    Upstream health check.
+    Reports the circuit breaker state and concurrency limit of each external API this process has called, and the
+    health of the LLM providers.
+    """
+    breakers = CircuitBreaker.snapshot_all()
+    return {
+        "status": "ok" if all(breaker["state"] == CircuitState.CLOSED for breaker in breakers.values()) else "degraded",
+        "upstreams": breakers,
+        "limiters": AdaptiveLimiter.snapshot_all(),
+        "llm_providers": LLMRouter.snapshot_default(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
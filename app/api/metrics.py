@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter(tags=["metrics"], include_in_schema=False)
+
+
+@router.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics of this process.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
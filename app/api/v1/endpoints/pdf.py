@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, File, Header, UploadFile
+import asyncio
+import json
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import quote
+from uuid import UUID
+
+from fastapi import (APIRouter, Depends, File, Header, Query, Request,
+                     Response, UploadFile, status)
+from fastapi.responses import StreamingResponse
 
 from app.api.deps import (depends_chat_service, depends_pdf_service,
                           get_current_user)
 from app.core.error_codes import ErrorCode
 from app.core.exceptions import ExceptionBase
-from app.schemas.pdf import (PDFChatHistoryResponse, PDFChatRequest,
-                             PDFChatResponse, PDFListResponse, PDFMetadata,
-                             PDFParseResponse, PDFSelectResponse)
+from app.middleware.logging import default_logger
+from app.schemas.pdf import (PDFChatBatchRequest, PDFChatBatchResponse,
+                             PDFChatHistoryResponse, PDFChatRequest,
+                             PDFChatResponse, PDFChatSessionResponse,
+                             PDFDeleteResponse,
+                             PDFListResponse, PDFMetadata,
+                             PDFParseResponse, PDFParseStatus,
+                             PDFParseStatusResponse, PDFSelectResponse,
+                             PDFWorkspaceRequest, PDFWorkspaceResponse)
 from app.services.chat import ChatService
 from app.services.pdf import PDFService
 
@@ -30,66 +46,100 @@ async def upload_pdf(
     user = await get_current_user(authorization)
     try:
         return await service.upload_pdf(title=title or file.filename, filename=filename or file.filename, file=file, user_id=user.id)
+    except ExceptionBase:
+        raise
     except Exception:
         raise ExceptionBase(ErrorCode.PDF_UPLOAD_FAILED)
 
 
-@router.get("/list", response_model=PDFListResponse)
-async def list_pdfs(authorization: str = Header(..., description="Bearer token"), service: PDFService = Depends(depends_pdf_service)):
+@router.get("/list", response_model=PDFListResponse, response_model_exclude_unset=True)
+async def list_pdfs(
+    limit: Optional[int] = Query(None, ge=1, description="Number of PDFs per page, capped by the server"),
+    cursor: Optional[str] = Query(None, description="The next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated metadata fields to return, all fields by default"),
+    authorization: str = Header(..., description="Bearer token"),
+    service: PDFService = Depends(depends_pdf_service),
+):
     """
-    Get list of all PDFs uploaded by the authenticated user.
+    Get a page of the PDFs uploaded by the authenticated user, newest first.
     """
     user = await get_current_user(authorization)
+    selected_fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
     try:
-        pdfs = await service.get_user_pdfs(user.id)
-        return PDFListResponse(pdfs=pdfs)
+        pdfs, next_cursor = await service.list_user_pdfs(user.id, limit=limit, cursor=cursor, fields=selected_fields)
+        return PDFListResponse(pdfs=pdfs, next_cursor=next_cursor)
+    except ExceptionBase:
+        raise
     except Exception:
         raise ExceptionBase(ErrorCode.DATABASE_ERROR)
 
 
-@router.post("/parse/{pdf_id}", response_model=PDFParseResponse)
+@router.post("/parse/{pdf_id}", response_model=PDFParseResponse, status_code=status.HTTP_202_ACCEPTED)
 async def parse_pdf(
     pdf_id: str, authorization: str = Header(..., description="Bearer token"), service: PDFService = Depends(depends_pdf_service)
 ):
     """
-    Extract and save text content from a selected PDF.
-    This must be done before using the chat feature.
+    Queue a background job that extracts and saves text content from a selected PDF.
+    This must be done before using the chat feature, poll the status endpoint to follow its progress.
     """
     user = await get_current_user(authorization)
 
-    # Get PDF metadata to check ownership
-    pdfs = await service.get_user_pdfs(user.id)
-    if not any(pdf.id == pdf_id for pdf in pdfs):
+    # Get PDF parse state, this also checks ownership
+    pdf = await service.get_user_pdf(pdf_id, user.id)
+    if not pdf:
         raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
 
     # Check if PDF is already parsed
-    pdf = next((p for p in pdfs if p.id == pdf_id), None)
-    if pdf and pdf.parsed:
+    if pdf.get("parsed"):
         raise ExceptionBase(ErrorCode.PDF_ALREADY_PARSED)
 
     try:
-        success = await service.parse_pdf(pdf_id)
-        if not success:
+        parse_status = await service.queue_parse(pdf_id)
+        if parse_status is None:
             raise ExceptionBase(ErrorCode.PDF_PARSE_FAILED)
 
-        return PDFParseResponse(message="PDF parsed successfully", pdf_id=pdf_id)
+        return PDFParseResponse(message="PDF parse queued", pdf_id=pdf_id, status=parse_status)
     except Exception:
         raise ExceptionBase(ErrorCode.PDF_PARSE_FAILED)
 
 
+@router.get("/parse/{pdf_id}/status", response_model=PDFParseStatusResponse)
+async def parse_pdf_status(
+    pdf_id: str, authorization: str = Header(..., description="Bearer token"), service: PDFService = Depends(depends_pdf_service)
+):
+    """
+    Get the status and page progress of the background parse job of a PDF.
+    """
+    user = await get_current_user(authorization)
+
+    # Get PDF parse state, this also checks ownership
+    pdf = await service.get_user_pdf(pdf_id, user.id)
+    if not pdf:
+        raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
+
+    parsed = pdf.get("parsed", False)
+    return PDFParseStatusResponse(
+        pdf_id=pdf_id,
+        status=PDFParseStatus.DONE if parsed else pdf.get("parse_status"),
+        parsed=parsed,
+        pages_done=pdf.get("pages_done"),
+        total_pages=pdf.get("page_count"),
+        error=pdf.get("parse_error"),
+    )
+
+
 @router.post("/select/{pdf_id}", response_model=PDFSelectResponse)
 async def select_pdf(
     pdf_id: str, authorization: str = Header(..., description="Bearer token"), service: PDFService = Depends(depends_pdf_service)
 ):
     """
     Select a previously uploaded PDF to chat with.
-    The PDF will be automatically parsed if it hasn't been parsed before.
+    A parse job is queued if the PDF hasn't been parsed before, chat is available once it is done.
     """
     user = await get_current_user(authorization)
 
-    # Get PDF metadata to check ownership
-    pdfs = await service.get_user_pdfs(user.id)
-    if not any(pdf.id == pdf_id for pdf in pdfs):
+    # Check ownership
+    if not await service.get_user_pdf(pdf_id, user.id):
         raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
 
     try:
@@ -97,24 +147,265 @@ async def select_pdf(
         if not selected_pdf:
             raise ExceptionBase(ErrorCode.PDF_SELECTION_FAILED)
 
-        return PDFSelectResponse(message="PDF selected successfully", pdf=selected_pdf)
+        message = "PDF selected successfully" if selected_pdf.parsed else "PDF selected, parse queued"
+        return PDFSelectResponse(message=message, pdf=selected_pdf)
     except Exception:
         raise ExceptionBase(ErrorCode.PDF_SELECTION_FAILED)
 
 
+@router.put("/workspace", response_model=PDFWorkspaceResponse)
+async def select_workspace(
+    request: PDFWorkspaceRequest,
+    authorization: str = Header(..., description="Bearer token"),
+    service: PDFService = Depends(depends_pdf_service),
+):
+    """
+    Select several previously uploaded PDFs to chat with together.
+    Questions are answered from the most relevant excerpts of all of them, citing the document and page of each.
+    Parse jobs are queued for the PDFs that haven't been parsed before.
+    """
+    user = await get_current_user(authorization)
+
+    # Check ownership
+    owned = await asyncio.gather(*(service.get_user_pdf(pdf_id, user.id) for pdf_id in request.pdf_ids))
+    if not all(owned):
+        raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
+
+    selected_pdfs = await service.select_pdfs(request.pdf_ids, user.id)
+    if not selected_pdfs:
+        raise ExceptionBase(ErrorCode.PDF_SELECTION_FAILED)
+
+    message = "PDFs selected successfully" if all(pdf.parsed for pdf in selected_pdfs) else "PDFs selected, parse queued"
+    return PDFWorkspaceResponse(message=message, pdfs=selected_pdfs)
+
+
+@router.get("/{pdf_id}/file", response_class=StreamingResponse)
+async def download_pdf(
+    pdf_id: str,
+    request: Request,
+    authorization: str = Header(..., description="Bearer token"),
+    service: PDFService = Depends(depends_pdf_service),
+):
+    """
+    Stream a previously uploaded PDF, supports single byte ranges and conditional requests.
+    """
+    user = await get_current_user(authorization)
+
+    # Check ownership
+    pdf = await service.get_user_pdf(pdf_id, user.id, fields=["file_id", "content_hash", "filename"])
+    if not pdf:
+        raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
+
+    try:
+        grid_out = await service.open_pdf_file(pdf["file_id"])
+    except Exception:
+        raise ExceptionBase(ErrorCode.PDF_NOT_FOUND)
+
+    length = grid_out.length
+    etag = '"%s"' % (pdf.get("content_hash") or f"{pdf['file_id']}-{length}")
+    last_modified = grid_out.upload_date.replace(tzinfo=timezone.utc, microsecond=0)
+    last_modified_header = format_datetime(last_modified, usegmt=True)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": last_modified_header,
+        "Cache-Control": "private, no-cache",
+    }
+
+    # Conditional GET, If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            if last_modified <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    # A Range is only honoured when If-Range still matches the stored file
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (etag, last_modified_header):
+        range_header = None
+
+    try:
+        byte_range = service.parse_range(range_header, length)
+    except ExceptionBase as e:
+        if e.code != ErrorCode.RANGE_NOT_SATISFIABLE.code:
+            raise
+        return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={**headers, "Content-Range": f"bytes */{length}"})
+
+    start, end = byte_range or (0, length - 1)
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+    headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(pdf.get('filename') or f'{pdf_id}.pdf')}"
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+
+    return StreamingResponse(
+        service.iter_pdf_file(grid_out, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type="application/pdf",
+        headers=headers,
+    )
+
+
+@router.delete("/{pdf_id}", response_model=PDFDeleteResponse)
+async def delete_pdf(
+    pdf_id: str, authorization: str = Header(..., description="Bearer token"), service: PDFService = Depends(depends_pdf_service)
+):
+    """
+    Delete a previously uploaded PDF.
+    """
+    user = await get_current_user(authorization)
+
+    # Check ownership
+    if not await service.get_user_pdf(pdf_id, user.id):
+        raise ExceptionBase(ErrorCode.PDF_ACCESS_DENIED)
+
+    if not await service.delete_pdf(pdf_id):
+        raise ExceptionBase(ErrorCode.PDF_DELETE_FAILED)
+
+    return PDFDeleteResponse(message="PDF deleted successfully", pdf_id=pdf_id)
+
+
+async def _get_chat_pdfs(pdf_service: PDFService, user_id: int) -> list:
+    """The PDFs a user chats with, all of them must be parsed."""
+    pdfs = await pdf_service.get_selected_pdfs(user_id)
+    if not pdfs:
+        raise ExceptionBase(ErrorCode.PDF_NOT_FOUND, description="No PDF is selected for chat")
+    if not all(pdf.parsed for pdf in pdfs):
+        raise ExceptionBase(ErrorCode.PDF_NOT_PARSED)
+    return pdfs
+
+
+def _use_answer_cache(cache_control: Optional[str]) -> bool:
+    """Whether a chat request may be answered from, and stored in, the answer cache."""
+    directives = {directive.strip().lower() for directive in (cache_control or "").split(",")}
+    return not directives & {"no-cache", "no-store"}
+
+
 @router.post("/chat", response_model=PDFChatResponse)
 async def chat_pdf(
     request: PDFChatRequest,
+    authorization: str = Header(..., description="Bearer token"),
+    cache_control: Optional[str] = Header(None, description="no-cache or no-store bypasses the answer cache"),
+    pdf_service: PDFService = Depends(depends_pdf_service),
+    chat_service: ChatService = Depends(depends_chat_service),
+):
+    """
+    Chat with the previously selected PDF, or PDFs of the workspace.
+    """
+    user = await get_current_user(authorization)
+    pdfs = await _get_chat_pdfs(pdf_service, user.id)
+    return await chat_service.chat_pdf(
+        request.question, pdfs, user.id, use_cache=_use_answer_cache(cache_control), session_id=request.session_id
+    )
+
+
+@router.post("/chat/batch", response_model=PDFChatBatchResponse)
+async def chat_pdf_batch(
+    request: PDFChatBatchRequest,
+    authorization: str = Header(..., description="Bearer token"),
+    cache_control: Optional[str] = Header(None, description="no-cache or no-store bypasses the answer cache"),
+    pdf_service: PDFService = Depends(depends_pdf_service),
+    chat_service: ChatService = Depends(depends_chat_service),
+):
+    """
+    Ask several questions about the selected PDFs in one request.
+    The PDFs are loaded once and questions are answered concurrently, answers come back in the order of the questions.
+    """
+    user = await get_current_user(authorization)
+    pdfs = await _get_chat_pdfs(pdf_service, user.id)
+    answers = await chat_service.chat_pdf_batch(request.questions, pdfs, user.id, use_cache=_use_answer_cache(cache_control))
+    return PDFChatBatchResponse(pdf_id=pdfs[0].id, answers=answers)
+
+
+def _sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a server-sent event."""
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+
+@router.post("/chat/stream", response_class=StreamingResponse)
+async def chat_pdf_stream(
+    request: PDFChatRequest,
+    authorization: str = Header(..., description="Bearer token"),
+    cache_control: Optional[str] = Header(None, description="no-cache or no-store bypasses the answer cache"),
+    pdf_service: PDFService = Depends(depends_pdf_service),
+    chat_service: ChatService = Depends(depends_chat_service),
+):
+    """
+    Chat with the previously selected PDF, or PDFs of the workspace, the answer is streamed as server-sent events.
+    Each `data` event carries a text delta, the stream ends with a `done` event or an `error` event.
+    """
+    user = await get_current_user(authorization)
+    pdfs = await _get_chat_pdfs(pdf_service, user.id)
+
+    # Wait for the first delta so a failing upstream is still reported with a regular error response
+    stream = chat_service.chat_pdf_stream(
+        request.question, pdfs, user.id, use_cache=_use_answer_cache(cache_control), session_id=request.session_id
+    )
+    try:
+        first_text = await stream.__anext__()
+    except StopAsyncIteration:
+        first_text = None
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            if first_text is not None:
+                yield _sse_event({"text": first_text})
+                async for text in stream:
+                    yield _sse_event({"text": text})
+            yield _sse_event(
+                {
+                    "pdf_id": pdfs[0].id,
+                    "pdf_ids": [pdf.id for pdf in pdfs],
+                    "session_id": str(request.session_id) if request.session_id else None,
+                },
+                event="done",
+            )
+        except ExceptionBase as e:
+            yield _sse_event({"error_code": e.code, "message": e.description}, event="error")
+        except Exception as e:
+            # The response has started, the error handlers can't turn this into an error response anymore
+            default_logger.error("Chat stream failed", user_id=user.id, error=str(e) or type(e).__name__)
+            error = ExceptionBase(ErrorCode.INTERNAL_SERVER_ERROR)
+            yield _sse_event({"error_code": error.code, "message": error.description}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/chat/sessions", response_model=PDFChatSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_chat_session(
     authorization: str = Header(..., description="Bearer token"),
     pdf_service: PDFService = Depends(depends_pdf_service),
     chat_service: ChatService = Depends(depends_chat_service),
 ):
     """
-    Chat with a previously selected PDF.
+    Start a chat session, pass its `session_id` with chat requests to ask follow-up questions.
+    Recent turns are sent along with each question and older ones are compacted into a summary.
     """
     user = await get_current_user(authorization)
     pdf = await pdf_service.get_selected_pdf(user.id)
-    return await chat_service.chat_pdf(request.question, pdf, user.id)
+    return await chat_service.create_session(user.id, pdf.id if pdf else None)
+
+
+@router.get("/chat/sessions/{session_id}", response_model=PDFChatSessionResponse)
+async def get_chat_session(
+    session_id: UUID,
+    authorization: str = Header(..., description="Bearer token"),
+    chat_service: ChatService = Depends(depends_chat_service),
+):
+    """
+    Get a chat session with its summary and turns.
+    """
+    user = await get_current_user(authorization)
+    return await chat_service.get_session(session_id, user.id)
 
 
 @router.get("/chat-history", response_model=PDFChatHistoryResponse)
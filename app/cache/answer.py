@@ -0,0 +1,86 @@
+import hashlib
+import re
+from typing import Optional
+
+from app.cache.lru import TTLCache
+from app.cache.service import AsyncCacheService
+from app.core.config import config
+from app.core.metrics import CHAT_CACHE_REQUESTS
+from app.middleware.logging import default_logger
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different spellings share a cache entry."""
+    return WHITESPACE_PATTERN.sub(" ", question.lower()).strip().rstrip("?!. ")
+
+
+def answer_cache_key(content_key: str, question: str, prompt_version: str) -> str:
+    """
+    Cache key of an answer, a hash of the document content, the normalized question and everything that shapes the prompt.
+    Changing the prompt template, model or retrieval settings starts a fresh set of entries.
+    """
+    parts = [
+        content_key,
+        normalize_question(question),
+        prompt_version,
+        config.GEMINI_ENDPOINT,
+        config.CHAT_RETRIEVAL_MODE,
+        str(config.CHAT_RETRIEVAL_TOP_K),
+        str(config.CHAT_CONTEXT_TOKEN_BUDGET),
+    ]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Two level cache of chat answers.
+    A per-process LRU with TTL answers repeated questions without a network hop, Redis shares answers across workers.
+    Redis errors are logged and treated as misses, the cache never fails a chat request.
+    """
+
+    _local: Optional[TTLCache] = None
+
+    def __init__(self):
+        self.redis = AsyncCacheService()
+
+    @classmethod
+    def get_local(cls) -> TTLCache:
+        """Get the per-process cache, creating it on first use."""
+        if cls._local is None:
+            cls._local = TTLCache(max_entries=config.CHAT_CACHE_MAX_ENTRIES, ttl=config.CHAT_CACHE_TTL)
+        return cls._local
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f":chat_answer:{key}"
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get a cached answer."""
+        answer = self.get_local().get(key)
+        if answer is not None:
+            CHAT_CACHE_REQUESTS.labels(result="hit", layer="local").inc()
+            return answer
+
+        try:
+            answer = await self.redis.get(self._redis_key(key))
+        except Exception as e:
+            default_logger.warning("Chat answer cache lookup failed", error=str(e))
+            answer = None
+
+        if answer is None:
+            CHAT_CACHE_REQUESTS.labels(result="miss", layer="none").inc()
+            return None
+
+        CHAT_CACHE_REQUESTS.labels(result="hit", layer="redis").inc()
+        self.get_local().set(key, answer)
+        return answer
+
+    async def set(self, key: str, answer: str) -> None:
+        """Cache an answer in both levels."""
+        self.get_local().set(key, answer)
+        try:
+            await self.redis.set(self._redis_key(key), answer, ex=config.CHAT_CACHE_TTL)
+        except Exception as e:
+            default_logger.warning("Chat answer cache store failed", error=str(e))
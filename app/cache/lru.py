@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    In-process LRU cache whose entries also expire after a time to live.
+    Not thread safe, meant to be used from a single event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        """Get a value and mark it as recently used, expired entries are dropped."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V, ttl: Optional[float] = None) -> None:
+        """Store a value, the least recently used entry is evicted when the cache is full."""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Remove a value if present."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every value."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,4 +1,7 @@
+from typing import Optional
+
 import redis
+import redis.asyncio as async_redis
 
 from app.core.config import config
 
@@ -80,3 +83,79 @@ class CacheService:
         Clear all keys from the cache.
         """
         self.client.flushall()
+
+
+class AsyncCacheService:
+    """
+    Asyncio counterpart of CacheService for use on the event loop.
+    The Redis connection pool is shared by every instance of the process.
+    """
+
+    client: Optional[async_redis.Redis] = None
+
+    def __init__(self) -> None:
+        self.prefix = config.REDIS_PREFIX
+
+    @classmethod
+    def get_client(cls) -> async_redis.Redis:
+        """Get the shared client, creating it on first use."""
+        if cls.client is None:
+            cls.client = async_redis.from_url(config.REDIS_URL, decode_responses=True)
+        return cls.client
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close the shared client and its connection pool."""
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+
+    def _add_prefix(self, key) -> str:
+        """
+        Add prefix to the key.
+
+        :param key: The original key.
+        :return: The key with prefix.
+        """
+        return f"{self.prefix}{key}"
+
+    async def set(self, key, value, ex=None, nx=False) -> bool:
+        """
+        Set a key-value pair in the cache with an optional expiration time.
+
+        :param key: The key to set.
+        :param value: The value to set.
+        :param ex: Expiration time in seconds.
+        :param nx: Only set the key if it does not exist.
+        :return: True if the key was set.
+        """
+        return bool(await self.get_client().set(name=self._add_prefix(key), value=value, ex=ex, nx=nx))
+
+    async def get(self, key) -> Optional[str]:
+        """
+        Get the value of a key from the cache.
+
+        :param key: The key to retrieve.
+        :return: The value of the key, or None if the key does not exist.
+        """
+        return await self.get_client().get(name=self._add_prefix(key))
+
+    async def delete(self, key) -> int:
+        """
+        Delete a key from the cache.
+
+        :param key: The key to delete.
+        :return: The number of keys that were removed.
+        """
+        return await self.get_client().delete(self._add_prefix(key))
+
+    async def delete_if_equal(self, key, value) -> bool:
+        """
+        Delete a key only if it still holds the given value, atomically.
+
+        :param key: The key to delete.
+        :param value: The value the key must hold.
+        :return: True if the key was deleted.
+        """
+        script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+        return bool(await self.get_client().eval(script, 1, self._add_prefix(key), value))
@@ -0,0 +1,114 @@
+import asyncio
+import math
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.cache.service import AsyncCacheService
+from app.core.config import config
+from app.core.metrics import CHAT_SINGLE_FLIGHT
+from app.middleware.logging import default_logger
+
+
+def lock_ttl() -> int:
+    """
+    Seconds a leader may hold the lock of a call, CHAT_SINGLE_FLIGHT_LOCK_TTL or else the slowest an LLM call can take:
+    every provider but the last waited for up to its latency SLO, then each attempt of the last one queued for a slot
+    and timed out, with the longest backoff between attempts.
+    """
+    if config.CHAT_SINGLE_FLIGHT_LOCK_TTL:
+        return config.CHAT_SINGLE_FLIGHT_LOCK_TTL
+    latency_slos = {"gemini": config.GEMINI_LATENCY_SLO, "openai": config.OPENAI_LATENCY_SLO}
+    providers = [name.strip() for name in config.LLM_PROVIDERS.split(",") if name.strip()]
+    failover = sum(latency_slos.get(name, 0) for name in providers[:-1])
+    attempts = config.API_RETRY_ATTEMPTS
+    call = attempts * (config.CONCURRENCY_QUEUE_TIMEOUT + config.API_REQUEST_TIMEOUT) + (attempts - 1) * config.API_RETRY_MAX_WAIT
+    return math.ceil(failover + call)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls so only one of them does the work.
+    Within a process callers share one task. Across workers a short lived Redis lock elects a leader, the others poll
+    the result key it publishes. Followers fall back to calling themselves if the leader gives up or Redis is unavailable.
+    """
+
+    _inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.redis = AsyncCacheService()
+
+    def _lock_key(self, key: str) -> str:
+        return f":{self.namespace}:lock:{key}"
+
+    def _result_key(self, key: str) -> str:
+        return f":{self.namespace}:result:{key}"
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """Run `fn` unless an identical call is already in flight, in which case wait for its result."""
+        task = self._inflight.get(key)
+        if task is not None:
+            CHAT_SINGLE_FLIGHT.labels(role="follower").inc()
+        else:
+            # The call runs in its own task so a caller that goes away doesn't cancel it for the others
+            task = asyncio.ensure_future(self._do_across_workers(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: "asyncio.Task[str]") -> None:
+        """Forget a finished call, its exception is marked as retrieved in case every caller went away."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _do_across_workers(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """Take the Redis lock and run `fn`, or wait for the worker holding it to publish its result."""
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(self._lock_key(key), token, ex=lock_ttl(), nx=True)
+        except Exception as e:
+            default_logger.warning("Single flight lock unavailable", namespace=self.namespace, error=str(e))
+            CHAT_SINGLE_FLIGHT.labels(role="leader").inc()
+            return await fn()
+
+        if not acquired:
+            result = await self._wait_for_result(key)
+            if result is not None:
+                CHAT_SINGLE_FLIGHT.labels(role="remote_follower").inc()
+                return result
+            # The leader failed or timed out, do the work ourselves
+            CHAT_SINGLE_FLIGHT.labels(role="leader").inc()
+            return await fn()
+
+        CHAT_SINGLE_FLIGHT.labels(role="leader").inc()
+        try:
+            result = await fn()
+            try:
+                await self.redis.set(self._result_key(key), result, ex=config.CHAT_SINGLE_FLIGHT_RESULT_TTL)
+            except Exception as e:
+                default_logger.warning("Single flight result not published", namespace=self.namespace, error=str(e))
+            return result
+        finally:
+            try:
+                await self.redis.delete_if_equal(self._lock_key(key), token)
+            except Exception as e:
+                default_logger.warning("Single flight lock not released", namespace=self.namespace, error=str(e))
+
+    async def _wait_for_result(self, key: str) -> Optional[str]:
+        """Poll the result of another worker until it is published, the lock goes away or the lock TTL passes."""
+        deadline = time.monotonic() + lock_ttl()
+        try:
+            while time.monotonic() < deadline:
+                result = await self.redis.get(self._result_key(key))
+                if result is not None:
+                    return result
+                if await self.redis.get(self._lock_key(key)) is None:
+                    # Released between the two reads, the result may have just been published
+                    return await self.redis.get(self._result_key(key))
+                await asyncio.sleep(config.CHAT_SINGLE_FLIGHT_POLL_INTERVAL)
+        except Exception as e:
+            default_logger.warning("Single flight wait failed", namespace=self.namespace, error=str(e))
+        return None
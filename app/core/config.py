@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -69,11 +71,121 @@ class Config(BaseSettings):
     GEMINI_API_KEY: str
     GEMINI_BASE_URL: str
     GEMINI_ENDPOINT: str
+    GEMINI_LATENCY_SLO: float = 20  # Seconds Gemini may take to answer before the next provider is tried
+
+    # LLM Providers
+    LLM_PROVIDERS: str = "gemini"  # Providers in priority order, comma separated: gemini, openai, fake
+    LLM_DEGRADED_COOLDOWN: float = 30  # Seconds a provider that missed its latency SLO is only used as a last resort
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"  # Any OpenAI compatible chat completions API
+    OPENAI_API_KEY: str = ""
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_LATENCY_SLO: float = 20
+    FAKE_LLM_ANSWER: str = ""  # Fixed answer of the fake provider, it echoes the question when empty
+
+    # Gemini Context Caching, the document of full mode prompts is cached at the provider and referenced by each question
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = True
+    GEMINI_CONTEXT_CACHE_TTL: int = 60 * 60  # Seconds a cached document lives at the provider unless the user selects another PDF
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = 4096  # Provider minimum, smaller documents are sent inline
+    GEMINI_CONTEXT_CACHE_RETRY_AFTER: int = 10 * 60  # Seconds before trying to cache a document again after it failed
+
+    # Outgoing HTTP
+    HTTP_POOL_SIZE: int = 100  # Open connections across all hosts
+    HTTP_POOL_SIZE_PER_HOST: int = 20  # Open connections to a single host
+    HTTP_KEEPALIVE_TIMEOUT: float = 30  # Seconds an idle pooled connection is kept open
+    HTTP_CONNECT_TIMEOUT: float = 10  # Seconds to establish a connection
+    HTTP_TIMEOUT: float = 60  # Seconds for a whole request, APIService passes its own timeout per request
+    API_REQUEST_TIMEOUT: float = 30  # Seconds per API request attempt, unless a service sets its own
+    API_RETRY_ATTEMPTS: int = 3  # Attempts per API request, including the first one
+    API_RETRY_BASE_WAIT: float = 0.5  # Seconds, base of the jittered exponential backoff
+    API_RETRY_MAX_WAIT: float = 10  # Seconds, longest wait between attempts, a longer Retry-After is not retried
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failed requests that open the circuit
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT: float = 30  # Seconds the circuit stays open before a trial request
+    CONCURRENCY_LIMIT_INITIAL: int = 10  # Calls to an upstream allowed in flight at start, adapted from then on
+    CONCURRENCY_LIMIT_MIN: int = 1
+    CONCURRENCY_LIMIT_MAX: int = 20  # Keep within HTTP_POOL_SIZE_PER_HOST
+    CONCURRENCY_LIMIT_BACKOFF: float = 0.5  # Factor the limit is multiplied by on 429s, 5xx, timeouts or slow calls
+    CONCURRENCY_LIMIT_LATENCY_THRESHOLD: float = 10.0  # Seconds after which a successful call counts as congestion, well below the request timeout
+    CONCURRENCY_LIMIT_LATENCY_TOLERANCE: float = 3.0  # A successful call slower than this multiple of the usual latency counts as congestion
+    CONCURRENCY_LIMIT_LATENCY_MIN_SAMPLES: int = 10  # Successful calls needed before the usual latency is trusted
+    CONCURRENCY_QUEUE_SIZE: int = 100  # Calls that may wait for a slot, more are rejected right away
+    CONCURRENCY_QUEUE_TIMEOUT: float = 10.0  # Seconds a call waits for a slot before it is rejected
+    HEDGE_ENABLED: bool = False  # Send a second identical chat request when the first one is unusually slow
+    HEDGE_PERCENTILE: float = 95  # Percentile of recent latencies after which a request is hedged
+    HEDGE_MIN_SAMPLES: int = 20  # Latencies needed before hedging starts
+    HEDGE_LATENCY_WINDOW: int = 200  # Recent latencies the percentile is computed over
+    HEDGE_BUDGET_PERCENT: float = 5  # Hedges allowed as a percentage of hedgeable requests
+
+    # PDF Upload
+    PDF_MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # Maximum upload size in bytes
+    PDF_UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read from the upload per GridFS write
+
+    # PDF Listing
+    PDF_LIST_PAGE_SIZE: int = 20  # Default number of PDFs per list page
+    PDF_LIST_MAX_PAGE_SIZE: int = 100  # Upper bound for the requested page size
+
+    # PDF Parsing
+    PDF_EXTRACT_WORKERS: int = 0  # Text extraction processes, 0 uses all available cores
+    PDF_PARSE_BATCH_SIZE: int = 50  # Pages extracted and checkpointed together
+    PDF_PARSE_LEASE_TIMEOUT: int = 30 * 60  # Seconds without progress after which a queued or running parse may be queued again
+
+    # Chat Retrieval
+    PDF_CHUNK_TOKENS: int = 300  # Approximate size of the chunks indexed for retrieval
+    PDF_CHUNK_OVERLAP_TOKENS: int = 50  # Tokens repeated at the start of the next chunk of a page
+    CHAT_RETRIEVAL_TOP_K: int = 8  # Maximum number of chunks sent with a question
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 4000  # Upper bound for the document context of a prompt
+    CHAT_RETRIEVAL_MODE: str = "bm25"  # bm25, vector or full to send the whole document
+    PDF_VECTOR_DIM: int = 1024  # Dimensions of the hashed TF-IDF chunk vectors
+    PDF_VECTOR_CACHE_DIR: str = "cache/vectors"  # Local copies of the vector matrices, memory-mapped at query time
+    PDF_VECTOR_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # Least recently used matrices are removed past this size
+
+    # Chat Answer Cache
+    CHAT_CACHE_ENABLED: bool = True
+    CHAT_CACHE_TTL: int = 24 * 60 * 60  # Seconds an answer is served from the cache
+    CHAT_CACHE_MAX_ENTRIES: int = 1024  # Answers kept in each process, least recently used are evicted first
+
+    # Chat Request Coalescing
+    CHAT_SINGLE_FLIGHT_ENABLED: bool = True
+    CHAT_SINGLE_FLIGHT_LOCK_TTL: Optional[int] = None  # Seconds a worker may hold the lock of a question, unset derives it from the LLM settings
+    CHAT_SINGLE_FLIGHT_RESULT_TTL: int = 30  # Seconds the answer stays published for waiting workers
+    CHAT_SINGLE_FLIGHT_POLL_INTERVAL: float = 0.1  # Seconds between checks for the answer of another worker
+
+    # Chat Sessions
+    CHAT_SESSION_WINDOW_TURNS: int = 6  # Most recent turns sent verbatim with each question
+    CHAT_SESSION_COMPACT_EVERY: int = 6  # Turns that may pile up beyond the window before they are folded into the summary
+    CHAT_SESSION_SUMMARY_WORDS: int = 250  # Length the summary is asked to stay within
+
+    # Chat Batches
+    CHAT_BATCH_MAX_QUESTIONS: int = 50  # Questions accepted in one batch request
+    CHAT_BATCH_CONCURRENCY: int = 5  # Questions of a batch answered at the same time
+
+    # Chat Workspaces
+    CHAT_WORKSPACE_MAX_PDFS: int = 10  # PDFs a user can select to chat with together
+
+    # Chat History Write-Behind
+    CHAT_HISTORY_WRITE_BEHIND: bool = True  # Queue chat turns and insert them in batches instead of before each response
+    CHAT_HISTORY_QUEUE_SIZE: int = 10000  # Turns waiting to be written, callers write directly once it is full
+    CHAT_HISTORY_BATCH_SIZE: int = 100  # Turns inserted together
+    CHAT_HISTORY_FLUSH_INTERVAL: float = 0.2  # Seconds a turn may wait for its batch to fill up
 
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FILE: str = "logs/app.log"
 
+    @property
+    def GEMINI_STREAM_ENDPOINT(self):
+        """Streaming variant of GEMINI_ENDPOINT, answers are sent as server-sent events."""
+        return self.GEMINI_ENDPOINT.replace(":generateContent", ":streamGenerateContent")
+
+    @property
+    def GEMINI_MODEL(self):
+        """Model name of GEMINI_ENDPOINT, e.g. models/gemini-2.0-flash."""
+        return "models/" + self.GEMINI_ENDPOINT.split("/models/", 1)[1].split(":", 1)[0]
+
+    @property
+    def GEMINI_CACHED_CONTENTS_ENDPOINT(self):
+        """Context caching endpoint of the API version of GEMINI_ENDPOINT."""
+        return self.GEMINI_ENDPOINT.split("/models/", 1)[0] + "/cachedContents"
+
     @property
     def ORIGIN(self):
         if self.APP_ENV == "PRODUCTION":
@@ -47,6 +47,7 @@ class ErrorCode(IntEnum):
     MISSING_REQUIRED_FIELD = (2001, "Missing required field", 400, "A required field is missing")
     INVALID_FILE_TYPE = (2002, "Invalid file type", 400, "The uploaded file type is not supported")
     FILE_TOO_LARGE = (2003, "File too large", 400, "The uploaded file exceeds the maximum allowed size")
+    RANGE_NOT_SATISFIABLE = (2004, "Range not satisfiable", 416, "The requested byte range is outside the file")
 
     # PDF Processing Errors (3000-3999)
     PDF_UPLOAD_FAILED = (3000, "PDF upload failed", 500, "Failed to upload PDF file")
@@ -55,6 +56,9 @@ class ErrorCode(IntEnum):
     PDF_ACCESS_DENIED = (3003, "PDF access denied", 403, "User does not have access to this PDF")
     PDF_ALREADY_PARSED = (3004, "PDF already parsed", 400, "PDF has already been parsed")
     PDF_SELECTION_FAILED = (3005, "PDF selection failed", 500, "Failed to select PDF for chat")
+    PDF_NOT_PARSED = (3006, "PDF not parsed", 409, "The PDF has not been parsed yet")
+    PDF_DELETE_FAILED = (3007, "PDF delete failed", 500, "Failed to delete PDF file")
+    CHAT_SESSION_NOT_FOUND = (3008, "Chat session not found", 404, "The requested chat session was not found")
 
     # Database Errors (4000-4999)
     DATABASE_ERROR = (4000, "Database error", 500, "An error occurred while accessing the database")
@@ -68,3 +72,5 @@ class ErrorCode(IntEnum):
 
     # API Errors (6000-6999)
     API_ERROR = (6000, "API error", 500, "An error occurred while accessing the API")
+    UPSTREAM_UNAVAILABLE = (6001, "Upstream unavailable", 503, "The upstream provider is temporarily unavailable, try again later")
+    UPSTREAM_OVERLOADED = (6002, "Upstream overloaded", 503, "Too many requests are waiting for the upstream provider, try again shortly")
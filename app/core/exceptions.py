@@ -1,3 +1,5 @@
+from typing import Optional
+
 from app.core.error_codes import ErrorCode
 
 
@@ -15,3 +17,11 @@ class RequestTimeoutException(ExceptionBase):
 
 class NotFoundException(ExceptionBase):
     pass
+
+
+class UpstreamAPIException(ExceptionBase):
+    """A failed call to an external API, `upstream_status` is the HTTP status it answered with, None if it didn't answer."""
+
+    def __init__(self, description: str = None, upstream_status: Optional[int] = None):
+        super().__init__(ErrorCode.API_ERROR, description=description)
+        self.upstream_status = upstream_status
@@ -0,0 +1,24 @@
+from prometheus_client import Counter, Gauge
+
+# Chat answer cache lookups, `layer` is where a hit was served from
+CHAT_CACHE_REQUESTS = Counter("chat_answer_cache_requests_total", "Chat answer cache lookups", ["result", "layer"])
+
+# Coalesced chat calls, `role` is leader for the call that reached Gemini, follower or remote_follower for callers that shared it
+CHAT_SINGLE_FLIGHT = Counter("chat_single_flight_total", "Chat calls by single flight role", ["role"])
+
+# Adaptive concurrency limit of calls to each upstream, calls in flight and calls waiting for a slot
+UPSTREAM_CONCURRENCY_LIMIT = Gauge("upstream_concurrency_limit", "Current concurrency limit of calls to an upstream", ["upstream"])
+UPSTREAM_IN_FLIGHT = Gauge("upstream_in_flight", "Calls to an upstream in flight", ["upstream"])
+UPSTREAM_QUEUE_DEPTH = Gauge("upstream_queue_depth", "Calls waiting for a concurrency slot of an upstream", ["upstream"])
+
+# Calls rejected without reaching the upstream, `reason` is queue_full or timeout
+UPSTREAM_REJECTED = Counter("upstream_rejected_total", "Calls rejected by the concurrency limiter", ["upstream", "reason"])
+
+# Hedged requests, `outcome` is sent, won when the hedge answered first, or over_budget when it wasn't sent
+UPSTREAM_HEDGES = Counter("upstream_hedges_total", "Hedged requests to an upstream", ["upstream", "outcome"])
+
+# Requests moved on from an LLM provider, `reason` is error or slow when it missed its latency SLO
+LLM_FAILOVERS = Counter("llm_failovers_total", "Requests failed over from an LLM provider", ["provider", "reason"])
+
+# Chat history rows of the write-behind queue, `outcome` is written, dropped after failed retries, or queue_full when written directly
+CHAT_HISTORY_ROWS = Counter("chat_history_rows_total", "Chat history rows of the write-behind queue", ["outcome"])
@@ -0,0 +1,76 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING
+
+from app.db.mongodb.mongodb import MongoDB
+
+logger = logging.getLogger(__name__)
+
+
+class MongoIndex(BaseModel):
+    """Declarative MongoDB index definition."""
+
+    collection: str
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+
+    @property
+    def name(self) -> str:
+        """Index name, same as the one MongoDB generates by default."""
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+# Indexes the application relies on, applied at startup
+MONGO_INDEXES = [
+    # Ownership checks and listing a user's PDFs
+    MongoIndex(collection="pdf_metadata", keys=[("user_id", ASCENDING)]),
+    # Keyset pagination of the PDF list, newest first
+    MongoIndex(collection="pdf_metadata", keys=[("user_id", ASCENDING), ("upload_date", DESCENDING), ("_id", DESCENDING)]),
+    # Finding parsed copies of deduplicated uploads
+    MongoIndex(collection="pdf_metadata", keys=[("content_hash", ASCENDING)]),
+    # One selection per user
+    MongoIndex(collection="selected_pdfs", keys=[("user_id", ASCENDING)], unique=True),
+    # Extracted page texts of a content, in page order
+    MongoIndex(collection="pdf_pages", keys=[("content_key", ASCENDING), ("page_number", ASCENDING)], unique=True),
+    # Retrieval chunks of a content in document order
+    MongoIndex(collection="pdf_chunks", keys=[("content_key", ASCENDING), ("chunk_index", ASCENDING)], unique=True),
+    # Inverted index lookup of the chunks containing a term
+    MongoIndex(collection="pdf_chunks", keys=[("content_key", ASCENDING), ("terms", ASCENDING)]),
+]
+
+
+async def ensure_indexes() -> List[str]:
+    """
+    Create the registered indexes, existing ones are left untouched.
+    Returns the names of the indexes that could not be created.
+    """
+    db = await MongoDB.get_database()
+    failed = []
+    for index in MONGO_INDEXES:
+        try:
+            await db[index.collection].create_index(index.keys, name=index.name, unique=index.unique)
+        except Exception as e:
+            logger.error(f"Failed to create index {index.name} on {index.collection}: {str(e)}")
+            failed.append(index.name)
+    logger.info(f"MongoDB indexes ensured, {len(MONGO_INDEXES) - len(failed)}/{len(MONGO_INDEXES)} in place")
+    return failed
+
+
+async def get_missing_indexes() -> List[Dict[str, Any]]:
+    """Compare the registered indexes with the ones present in MongoDB and return the missing ones."""
+    db = await MongoDB.get_database()
+    index_information: Dict[str, Dict[str, Any]] = {}
+    missing = []
+    for index in MONGO_INDEXES:
+        if index.collection not in index_information:
+            index_information[index.collection] = await db[index.collection].index_information()
+
+        present = any(
+            [tuple(key) for key in info["key"]] == index.keys and info.get("unique", False) == index.unique
+            for info in index_information[index.collection].values()
+        )
+        if not present:
+            missing.append({"collection": index.collection, "name": index.name, "keys": index.keys, "unique": index.unique})
+    return missing
@@ -1,5 +1,6 @@
 from app.db.postgres.models.base import Base
 from app.db.postgres.models.user import User
 from app.db.postgres.models.chat_history import ChatHistory
+from app.db.postgres.models.chat_session import ChatSession
 
-__all__ = ["User", "Base", "ChatHistory"]
+__all__ = ["User", "Base", "ChatHistory", "ChatSession"]
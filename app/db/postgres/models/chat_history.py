@@ -11,7 +11,7 @@ class ChatHistory(BaseModel):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    session_id = Column(UUID(as_uuid=True), nullable=True)
+    session_id = Column(UUID(as_uuid=True), nullable=True, index=True)
 
     def __repr__(self) -> str:
         return f"<ChatHistory(user_id={self.user_id}, session_id={self.session_id})>"
@@ -0,0 +1,21 @@
+import uuid
+
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, UUID
+
+from app.db.postgres.models.base import BaseModel
+
+
+class ChatSession(BaseModel):
+    """Chat session model, a conversation whose turns are stored in chat history under its session_id"""
+
+    __tablename__ = "chat_sessions"
+
+    session_id = Column(UUID(as_uuid=True), nullable=False, unique=True, default=uuid.uuid4)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    pdf_id = Column(String, nullable=True)
+    # Compacted summary of the turns up to and including the chat history row `summarized_until`
+    summary = Column(Text, nullable=True)
+    summarized_until = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<ChatSession(user_id={self.user_id}, session_id={self.session_id})>"
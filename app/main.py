@@ -6,12 +6,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.api.v1.router import api_router as api_router_v1
+from app.cache.service import AsyncCacheService
 from app.core.config import config
 from app.core.exceptions import ExceptionBase
+from app.db.mongodb.indexes import ensure_indexes
 from app.middleware.logging import default_logger
 from app.middleware.rate_limit import init_limiter, rate_limit_middleware
 from app.middleware.request_id import RequestIDMiddleware
+from app.services.history_writer import ChatHistoryWriter
+from app.services.http_client import HTTPClient
 
 
 @asynccontextmanager
@@ -23,12 +28,22 @@ async def lifespan(app: FastAPI):
     # Startup
     default_logger.info("Application starting up...")
     await init_limiter()  # Initialize rate limiter
+    await HTTPClient.start()  # Open the shared outgoing HTTP connection pool
+    await ChatHistoryWriter.start()  # Write chat history in batches behind the responses
+    try:
+        await ensure_indexes()  # Create missing MongoDB indexes
+    except Exception as e:
+        # Keep serving, missing indexes are reported by the health check
+        default_logger.error("Failed to ensure MongoDB indexes", error=str(e))
 
     try:
         yield
     finally:
         # Shutdown
         default_logger.info("Application shutting down...")
+        await ChatHistoryWriter.close()  # Write the queued chat history before the process exits
+        await HTTPClient.close()
+        await AsyncCacheService.close()
         # TODO: close the necessary connections
 
 
@@ -91,14 +106,14 @@ async def log_request(request: Request, call_next):
     request_id = request.headers.get("X-Request-ID", "unknown")
     start_time = datetime.now(timezone.utc)
 
-    # Log incoming request
-    body = await request.body()
-
     # Check if the request is multipart/form-data
     content_type = request.headers.get("content-type", "")
     is_multipart = "multipart/form-data" in content_type
 
-    # For multipart requests, don't try to decode the body
+    # For multipart requests, don't buffer the body so file uploads can be streamed
+    body = b"" if is_multipart else await request.body()
+
+    # Log incoming request
     body_str = "{}"
     if not is_multipart and body:
         try:
@@ -148,3 +163,4 @@ async def log_request(request: Request, call_next):
 # Include API router
 app.include_router(api_router_v1, prefix=config.APP_STR)
 app.include_router(health_router, prefix=config.APP_STR)
+app.include_router(metrics_router, prefix=config.APP_STR)
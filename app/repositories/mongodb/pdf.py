@@ -1,12 +1,18 @@
+import hashlib
 import logging
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket, AsyncIOMotorGridIn, AsyncIOMotorGridOut
 from pydantic import BaseModel
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from app.core.config import config
 from app.db.mongodb.mongodb import MongoDB
+from app.schemas.pdf import PDFParseStatus
 
 
 class PDFMetadata(BaseModel):
@@ -18,19 +24,39 @@ class PDFMetadata(BaseModel):
     title: str
     upload_date: datetime
     file_id: str
+    content_hash: Optional[str] = None
     parsed: bool = False
+    parse_status: Optional[PDFParseStatus] = None
+    parse_error: Optional[str] = None
+    page_count: Optional[int] = None
+    pages_done: Optional[int] = None
+    # Loaded on demand from the pdf_pages collection, never stored on the metadata document
     text_content: Optional[str] = None
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat(), ObjectId: lambda v: str(v)}
 
+    @property
+    def content_key(self) -> str:
+        """Key of the extracted pages, uploads that predate content deduplication use their own ID."""
+        return self.content_hash or self.id
+
 
 class PDFRepository:
+    # Projection that keeps metadata reads small, text lives in pdf_pages
+    metadata_projection = {"text_content": 0}
+
     def __init__(self):
         self.mongodb = MongoDB()
         self.collection_name = "pdf_metadata"
         self.selected_pdf_collection_name = "selected_pdfs"
+        self.content_collection_name = "pdf_contents"
+        self.pages_collection_name = "pdf_pages"
+        self.chunks_collection_name = "pdf_chunks"
+        self.chunk_stats_collection_name = "pdf_chunk_stats"
+        self.vector_bucket_name = "pdf_vectors"
         self.fs: Optional[AsyncIOMotorGridFSBucket] = None
+        self.vector_fs: Optional[AsyncIOMotorGridFSBucket] = None
         self.logger = logging.getLogger(__name__)
 
     async def _get_fs(self) -> AsyncIOMotorGridFSBucket:
@@ -44,6 +70,17 @@ class PDFRepository:
             self.logger.error(f"Failed to get GridFS bucket: {str(e)}")
             raise
 
+    async def _get_vector_fs(self) -> AsyncIOMotorGridFSBucket:
+        """Get GridFS bucket for the chunk vector matrices."""
+        try:
+            if self.vector_fs is None:
+                db = await self.mongodb.get_database()
+                self.vector_fs = AsyncIOMotorGridFSBucket(db, bucket_name=self.vector_bucket_name)
+            return self.vector_fs
+        except Exception as e:
+            self.logger.error(f"Failed to get vector GridFS bucket: {str(e)}")
+            raise
+
     async def _get_collection(self):
         """Get MongoDB collection."""
         try:
@@ -62,83 +99,256 @@ class PDFRepository:
             self.logger.error(f"Failed to get selected PDF collection: {str(e)}")
             raise
 
-    async def upload_pdf(self, user_id: int, filename: str, title: str, file_content: bytes) -> PDFMetadata:
-        """Upload a PDF file to GridFS and store its metadata."""
+    async def _get_content_collection(self):
+        """Get MongoDB collection for stored PDF contents, keyed by their SHA-256 hash."""
+        try:
+            db = await self.mongodb.get_database()
+            return db[self.content_collection_name]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF content collection: {str(e)}")
+            raise
+
+    async def _get_pages_collection(self):
+        """Get MongoDB collection for extracted page texts."""
+        try:
+            db = await self.mongodb.get_database()
+            return db[self.pages_collection_name]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF pages collection: {str(e)}")
+            raise
+
+    async def _get_chunks_collection(self):
+        """Get MongoDB collection for the retrieval chunks, the postings of the BM25 index."""
+        try:
+            db = await self.mongodb.get_database()
+            return db[self.chunks_collection_name]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF chunks collection: {str(e)}")
+            raise
+
+    async def _get_chunk_stats_collection(self):
+        """Get MongoDB collection for the BM25 corpus statistics, keyed by content key."""
+        try:
+            db = await self.mongodb.get_database()
+            return db[self.chunk_stats_collection_name]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF chunk stats collection: {str(e)}")
+            raise
+
+    @staticmethod
+    def _to_metadata(doc: dict) -> PDFMetadata:
+        """Convert a pdf_metadata document into a PDFMetadata model."""
+        return PDFMetadata(
+            **{
+                "id": str(doc["_id"]),
+                "user_id": doc["user_id"],
+                "filename": doc["filename"],
+                "title": doc["title"],
+                "upload_date": doc["upload_date"],
+                "file_id": doc["file_id"],
+                "content_hash": doc.get("content_hash"),
+                "parsed": doc.get("parsed", False),
+                "parse_status": doc.get("parse_status"),
+                "parse_error": doc.get("parse_error"),
+                "page_count": doc.get("page_count"),
+                "pages_done": doc.get("pages_done"),
+            }
+        )
+
+    async def upload_pdf(self, user_id: int, filename: str, title: str, chunks: AsyncIterator[bytes]) -> PDFMetadata:
+        """
+        Stream a PDF file into GridFS chunk by chunk and store its metadata.
+        Uploads with the same content share one GridFS file and reuse the extracted text of an already parsed copy.
+        """
         try:
             # Get database and GridFS
             fs = await self._get_fs()
 
-            # Upload file to GridFS
-            file_id = await fs.upload_from_stream(filename, file_content, metadata={"content_type": "application/pdf"})
-
-            # Create metadata document
-            metadata = {
-                "id": str(ObjectId()),
-                "user_id": user_id,
-                "filename": filename,
-                "title": title,
-                "upload_date": datetime.utcnow(),
-                "file_id": str(file_id),
-                "parsed": False,
-                "text_content": None,
-            }
+            # Copy the chunks straight into a GridFS upload stream, hashing them on the way
+            grid_in = fs.open_upload_stream(filename, metadata={"content_type": "application/pdf"})
+            content_hash = hashlib.sha256()
+            try:
+                async for chunk in chunks:
+                    content_hash.update(chunk)
+                    await grid_in.write(chunk)
+            except Exception:
+                # Drop the chunks written so far so rejected uploads leave nothing behind
+                await grid_in.abort()
+                raise
 
-            # Insert metadata
-            collection = await self._get_collection()
-            await collection.insert_one(metadata)
+            file_id = await self._register_content(content_hash.hexdigest(), grid_in)
+            try:
+                # Create metadata document
+                pdf_id = ObjectId()
+                metadata = {
+                    "_id": pdf_id,
+                    "user_id": user_id,
+                    "filename": filename,
+                    "title": title,
+                    "upload_date": datetime.utcnow(),
+                    "file_id": file_id,
+                    "content_hash": content_hash.hexdigest(),
+                    "parsed": False,
+                }
+
+                # Reuse the extracted pages of a copy that has already been parsed
+                collection = await self._get_collection()
+                parsed_copy = await self._find_parsed_copy(metadata["content_hash"])
+                if parsed_copy:
+                    metadata.update(
+                        {
+                            "parsed": True,
+                            "parse_status": PDFParseStatus.DONE,
+                            "page_count": parsed_copy["page_count"],
+                            "pages_done": parsed_copy["page_count"],
+                        }
+                    )
+
+                # Insert metadata
+                await collection.insert_one(metadata)
+            except Exception:
+                # Drop the reference taken for this upload, the content is deleted if nothing else shares it
+                try:
+                    await self._release_content(content_hash.hexdigest())
+                except Exception as release_error:
+                    self.logger.error(f"Failed to release PDF content {content_hash.hexdigest()}: {str(release_error)}")
+                raise
 
             # Return metadata
-            return PDFMetadata(**metadata)
+            return self._to_metadata(metadata)
 
         except Exception as e:
             self.logger.error(f"Failed to upload PDF: {str(e)}")
             raise
 
+    async def _acquire_content(self, content_hash: str) -> Optional[str]:
+        """Take a reference on stored content, returns its GridFS file ID or None if it isn't stored."""
+        contents = await self._get_content_collection()
+        content = await contents.find_one_and_update(
+            # Content at zero references is being deleted and must not be revived
+            {"_id": content_hash, "ref_count": {"$gt": 0}},
+            {"$inc": {"ref_count": 1}},
+        )
+        return content["file_id"] if content else None
+
+    async def _register_content(self, content_hash: str, grid_in: AsyncIOMotorGridIn, attempts: int = 3) -> str:
+        """
+        Finish an upload stream and register its content.
+        If the content is already stored the upload is discarded and the existing GridFS file ID is returned.
+        """
+        file_id = await self._acquire_content(content_hash)
+        if file_id:
+            await grid_in.abort()
+            return file_id
+
+        await grid_in.close()
+        contents = await self._get_content_collection()
+        for _ in range(attempts):
+            try:
+                await contents.insert_one(
+                    {"_id": content_hash, "file_id": str(grid_in._id), "ref_count": 1, "length": grid_in.length, "created_at": datetime.utcnow()}
+                )
+                return str(grid_in._id)
+            except DuplicateKeyError:
+                # The same content was registered concurrently, keep that copy and drop ours
+                file_id = await self._acquire_content(content_hash)
+                if file_id:
+                    fs = await self._get_fs()
+                    await fs.delete(grid_in._id)
+                    return file_id
+
+        fs = await self._get_fs()
+        await fs.delete(grid_in._id)
+        raise Exception(f"Failed to register PDF content {content_hash}")
+
+    async def _release_content(self, content_hash: str) -> None:
+        """Drop a reference on stored content and delete its GridFS file once nothing references it."""
+        contents = await self._get_content_collection()
+        content = await contents.find_one_and_update({"_id": content_hash}, {"$inc": {"ref_count": -1}}, return_document=ReturnDocument.AFTER)
+        if not content or content["ref_count"] > 0:
+            return
+
+        result = await contents.delete_one({"_id": content_hash, "ref_count": {"$lte": 0}})
+        if result.deleted_count:
+            fs = await self._get_fs()
+            await fs.delete(ObjectId(content["file_id"]))
+            await self.delete_pdf_pages(content_hash)
+            await self.delete_pdf_chunks(content_hash)
+
     async def get_user_pdfs(self, user_id: int) -> List[PDFMetadata]:
         """Get all PDFs uploaded by a specific user."""
         try:
             collection = await self._get_collection()
-            cursor = collection.find({"user_id": user_id})
+            cursor = collection.find({"user_id": user_id}, self.metadata_projection)
 
-            pdfs = []
-            async for doc in cursor:
-                # Convert MongoDB document to dictionary
-                pdf_dict = {
-                    "id": str(doc["_id"]),
-                    "user_id": doc["user_id"],
-                    "filename": doc["filename"],
-                    "title": doc["title"],
-                    "upload_date": doc["upload_date"],
-                    "file_id": doc["file_id"],
-                    "parsed": doc.get("parsed", False),
-                    "text_content": doc.get("text_content"),
-                }
-                pdfs.append(PDFMetadata(**pdf_dict))
-
-            return pdfs
+            return [self._to_metadata(doc) async for doc in cursor]
 
-        except Exception:
+        except Exception as e:
             self.logger.error(f"Failed to get user PDFs: {str(e)}")
             raise
 
+    async def get_user_pdfs_page(
+        self,
+        user_id: int,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get one page of a user's PDFs, newest first, using keyset pagination on (upload_date, _id).
+        Only the requested metadata fields are read, `id` and `upload_date` are always returned.
+        Returns the documents and whether more pages follow.
+        """
+        try:
+            collection = await self._get_collection()
+            query: Dict[str, Any] = {"user_id": user_id}
+            if after:
+                upload_date, pdf_id = after
+                query["$or"] = [
+                    {"upload_date": {"$lt": upload_date}},
+                    {"upload_date": upload_date, "_id": {"$lt": ObjectId(pdf_id)}},
+                ]
+
+            projection = ({field: 1 for field in fields} | {"upload_date": 1}) if fields else self.metadata_projection
+            cursor = collection.find(query, projection).sort([("upload_date", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1)
+
+            docs = []
+            async for doc in cursor:
+                doc["id"] = str(doc.pop("_id"))
+                doc.pop("text_content", None)
+                docs.append(doc)
+            return docs[:limit], len(docs) > limit
+        except Exception as e:
+            self.logger.error(f"Failed to get user PDFs page: {str(e)}")
+            raise
+
+    async def get_user_pdf(self, pdf_id: str, user_id: int, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the parse state of a PDF if it belongs to the user, plus any extra `fields`.
+        Runs a single find_one on _id and user_id with a minimal projection, use it for ownership checks.
+        """
+        try:
+            collection = await self._get_collection()
+            projection = {"_id": 1, "parsed": 1, "parse_status": 1, "parse_error": 1, "page_count": 1, "pages_done": 1}
+            projection.update({field: 1 for field in fields or []})
+            doc = await collection.find_one({"_id": ObjectId(pdf_id), "user_id": user_id}, projection)
+            if not doc:
+                return None
+            doc["id"] = str(doc.pop("_id"))
+            return doc
+        except InvalidId:
+            return None
+        except Exception as e:
+            self.logger.error(f"Failed to get user PDF: {str(e)}")
+            raise
+
     async def get_pdf_metadata(self, pdf_id: str) -> Optional[PDFMetadata]:
         """Get PDF metadata by ID."""
         try:
             collection = await self._get_collection()
-            doc = await collection.find_one({"_id": ObjectId(pdf_id)})
+            doc = await collection.find_one({"_id": ObjectId(pdf_id)}, self.metadata_projection)
             if doc:
-                return PDFMetadata(
-                    **{
-                        "id": str(doc["_id"]),
-                        "user_id": doc["user_id"],
-                        "filename": doc["filename"],
-                        "title": doc["title"],
-                        "upload_date": doc["upload_date"],
-                        "file_id": doc["file_id"],
-                        "parsed": doc.get("parsed", False),
-                        "text_content": doc.get("text_content"),
-                    }
-                )
+                return self._to_metadata(doc)
             return None
         except Exception as e:
             self.logger.error(f"Failed to get PDF metadata: {str(e)}")
@@ -154,43 +364,362 @@ class PDFRepository:
             self.logger.error(f"Failed to get PDF file: {str(e)}")
             raise
 
-    async def update_pdf_text(self, pdf_id: str, text_content: str) -> bool:
-        """Update PDF text content."""
+    async def open_pdf_stream(self, file_id: str) -> AsyncIOMotorGridOut:
+        """Open a GridFS download stream, the file is read chunk by chunk by the caller."""
+        try:
+            fs = await self._get_fs()
+            return await fs.open_download_stream(ObjectId(file_id))
+        except Exception as e:
+            self.logger.error(f"Failed to open PDF file stream: {str(e)}")
+            raise
+
+    async def save_pdf_pages(self, content_key: str, pages: List[Tuple[int, str]]) -> None:
+        """Store extracted page texts, pages that are already stored are overwritten."""
+        if not pages:
+            return
+        try:
+            collection = await self._get_pages_collection()
+            await collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"content_key": content_key, "page_number": page_number},
+                        {"$set": {"text": text}},
+                        upsert=True,
+                    )
+                    for page_number, text in pages
+                ],
+                ordered=False,
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to save PDF pages: {str(e)}")
+            raise
+
+    async def get_pdf_pages(self, pdf: PDFMetadata) -> List[Tuple[int, str]]:
+        """Get the extracted page texts of a PDF ordered by page number."""
+        try:
+            collection = await self._get_pages_collection()
+            cursor = collection.find({"content_key": pdf.content_key}, {"_id": 0, "page_number": 1, "text": 1}).sort("page_number", ASCENDING)
+            pages = [(doc["page_number"], doc["text"]) async for doc in cursor]
+            if pages:
+                return pages
+
+            # PDFs parsed before pages were split out still carry their text on the metadata document
+            metadata_collection = await self._get_collection()
+            doc = await metadata_collection.find_one({"_id": ObjectId(pdf.id)}, {"text_content": 1})
+            return [(1, doc["text_content"])] if doc and doc.get("text_content") else []
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF pages: {str(e)}")
+            raise
+
+    async def get_pdf_text(self, pdf: PDFMetadata) -> Optional[str]:
+        """Get the full extracted text of a PDF."""
+        pages = await self.get_pdf_pages(pdf)
+        return "\n".join(text for _, text in pages) + "\n" if pages else None
+
+    async def count_pdf_pages(self, content_key: str) -> int:
+        """Count the page texts stored under a content key."""
+        try:
+            collection = await self._get_pages_collection()
+            return await collection.count_documents({"content_key": content_key})
+        except Exception as e:
+            self.logger.error(f"Failed to count PDF pages: {str(e)}")
+            raise
+
+    async def delete_pdf_pages(self, content_key: str) -> None:
+        """Delete the extracted page texts stored under a content key."""
+        try:
+            collection = await self._get_pages_collection()
+            await collection.delete_many({"content_key": content_key})
+        except Exception as e:
+            self.logger.error(f"Failed to delete PDF pages: {str(e)}")
+            raise
+
+    async def save_pdf_chunks(self, content_key: str, chunks: List[Dict[str, Any]], stats: Dict[str, Any]) -> None:
+        """
+        Replace the retrieval chunks and BM25 statistics stored under a content key.
+        Chunks are upserted by index so concurrent indexing of the same content, which stores the same chunks, doesn't fail.
+        """
+        try:
+            chunks_collection = await self._get_chunks_collection()
+            if chunks:
+                try:
+                    await chunks_collection.bulk_write(
+                        [
+                            ReplaceOne(
+                                {"content_key": content_key, "chunk_index": chunk["chunk_index"]},
+                                {**chunk, "content_key": content_key},
+                                upsert=True,
+                            )
+                            for chunk in chunks
+                        ],
+                        ordered=False,
+                    )
+                except BulkWriteError as e:
+                    # Racing upserts of the same chunk, the other writer stored it
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+            await chunks_collection.delete_many({"content_key": content_key, "chunk_index": {"$gte": len(chunks)}})
+
+            # The vectors of the previous chunks no longer match, drop them with the statistics they hang off
+            stats_collection = await self._get_chunk_stats_collection()
+            previous = await stats_collection.find_one_and_replace(
+                {"_id": content_key}, {**stats, "updated_at": datetime.utcnow()}, projection={"vector.file_id": 1}, upsert=True
+            )
+            if previous and previous.get("vector"):
+                fs = await self._get_vector_fs()
+                await fs.delete(ObjectId(previous["vector"]["file_id"]))
+        except Exception as e:
+            self.logger.error(f"Failed to save PDF chunks: {str(e)}")
+            raise
+
+    async def get_chunk_stats(self, content_key: str, terms: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Get the BM25 statistics of a content, only the document frequencies of `terms` are loaded.
+        `vector` describes the stored chunk vector matrix, it is None until the vectors are built.
+        """
+        try:
+            collection = await self._get_chunk_stats_collection()
+            projection = {"chunk_count": 1, "avg_length": 1, "vector": 1, **{f"doc_freq.{term}": 1 for term in terms}}
+            doc = await collection.find_one({"_id": content_key}, projection)
+            if not doc:
+                return None
+            return {
+                "chunk_count": doc["chunk_count"],
+                "avg_length": doc["avg_length"],
+                "doc_freq": doc.get("doc_freq", {}),
+                "vector": doc.get("vector"),
+            }
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF chunk stats: {str(e)}")
+            raise
+
+    async def find_pdf_chunks(self, content_key: str, terms: List[str]) -> List[Dict[str, Any]]:
+        """Get the chunks containing any of `terms`, with the frequencies of those terms only."""
+        try:
+            collection = await self._get_chunks_collection()
+            projection = {"_id": 0, "chunk_index": 1, "page_number": 1, "text": 1, "length": 1, **{f"term_freqs.{term}": 1 for term in terms}}
+            cursor = collection.find({"content_key": content_key, "terms": {"$in": terms}}, projection)
+            return [doc async for doc in cursor]
+        except Exception as e:
+            self.logger.error(f"Failed to find PDF chunks: {str(e)}")
+            raise
+
+    async def get_pdf_chunks(self, content_key: str, limit: int) -> List[Dict[str, Any]]:
+        """Get the first chunks of a content in document order."""
+        try:
+            collection = await self._get_chunks_collection()
+            cursor = collection.find({"content_key": content_key}, {"_id": 0, "chunk_index": 1, "page_number": 1, "text": 1})
+            return [doc async for doc in cursor.sort("chunk_index", ASCENDING).limit(limit)]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF chunks: {str(e)}")
+            raise
+
+    async def save_pdf_vectors(self, content_key: str, data: bytes, dim: int, idf: List[float]) -> str:
+        """
+        Store the chunk vector matrix of a content in GridFS and record it on the chunk statistics.
+        The matrix replaces any previous one, returns the ID of the new file.
+        """
+        try:
+            fs = await self._get_vector_fs()
+            file_id = await fs.upload_from_stream(content_key, data, metadata={"content_key": content_key, "dim": dim})
+
+            stats_collection = await self._get_chunk_stats_collection()
+            previous = await stats_collection.find_one_and_update(
+                {"_id": content_key}, {"$set": {"vector": {"file_id": str(file_id), "dim": dim, "idf": idf}}}, projection={"vector.file_id": 1}
+            )
+            if previous and previous.get("vector"):
+                await fs.delete(ObjectId(previous["vector"]["file_id"]))
+            return str(file_id)
+        except Exception as e:
+            self.logger.error(f"Failed to save PDF vectors: {str(e)}")
+            raise
+
+    async def get_pdf_vectors(self, file_id: str) -> bytes:
+        """Get a stored chunk vector matrix in .npy format."""
+        try:
+            fs = await self._get_vector_fs()
+            grid_out = await fs.open_download_stream(ObjectId(file_id))
+            return await grid_out.read()
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF vectors: {str(e)}")
+            raise
+
+    async def get_pdf_chunks_by_index(self, content_key: str, chunk_indexes: List[int]) -> List[Dict[str, Any]]:
+        """Get chunks of a content by their index."""
+        try:
+            collection = await self._get_chunks_collection()
+            cursor = collection.find(
+                {"content_key": content_key, "chunk_index": {"$in": chunk_indexes}}, {"_id": 0, "chunk_index": 1, "page_number": 1, "text": 1}
+            )
+            return [doc async for doc in cursor]
+        except Exception as e:
+            self.logger.error(f"Failed to get PDF chunks: {str(e)}")
+            raise
+
+    async def delete_pdf_chunks(self, content_key: str) -> None:
+        """Delete the retrieval chunks, statistics and vectors stored under a content key."""
+        try:
+            chunks_collection = await self._get_chunks_collection()
+            await chunks_collection.delete_many({"content_key": content_key})
+            stats_collection = await self._get_chunk_stats_collection()
+            stats = await stats_collection.find_one_and_delete({"_id": content_key}, projection={"vector.file_id": 1})
+            if stats and stats.get("vector"):
+                fs = await self._get_vector_fs()
+                await fs.delete(ObjectId(stats["vector"]["file_id"]))
+        except Exception as e:
+            self.logger.error(f"Failed to delete PDF chunks: {str(e)}")
+            raise
+
+    async def mark_parsed(self, pdf_id: str, page_count: int) -> bool:
+        """Mark a PDF as parsed once its pages are stored."""
+        try:
+            collection = await self._get_collection()
+            result = await collection.update_one(
+                {"_id": ObjectId(pdf_id)},
+                {
+                    "$set": {
+                        "parsed": True,
+                        "page_count": page_count,
+                        "pages_done": page_count,
+                        "parse_status": PDFParseStatus.DONE,
+                        "parse_error": None,
+                    },
+                    "$unset": {"text_content": ""},
+                },
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            self.logger.error(f"Failed to mark PDF as parsed: {str(e)}")
+            raise
+
+    async def update_parse_progress(self, pdf_id: str, pages_done: int, page_count: Optional[int] = None) -> bool:
+        """Record the parse checkpoint, pages before `pages_done` are stored and are skipped when the parse is resumed."""
+        try:
+            collection = await self._get_collection()
+            # Each checkpoint also renews the lease of the running parse
+            update = {"pages_done": pages_done, "parse_heartbeat_at": datetime.utcnow()}
+            if page_count is not None:
+                update["page_count"] = page_count
+            result = await collection.update_one({"_id": ObjectId(pdf_id)}, {"$set": update})
+            return result.matched_count > 0
+        except Exception as e:
+            self.logger.error(f"Failed to update PDF parse progress: {str(e)}")
+            raise
+
+    async def mark_parse_queued(self, pdf_id: str) -> bool:
+        """
+        Mark a PDF as queued for parsing.
+        Returns False if a parse is already queued or running so the job is not enqueued twice. A parse that made no
+        progress for PDF_PARSE_LEASE_TIMEOUT, e.g. because its worker died, is considered lost and may be queued again.
+        """
         try:
             collection = await self._get_collection()
-            result = await collection.update_one({"_id": ObjectId(pdf_id)}, {"$set": {"text_content": text_content, "parsed": True}})
+            now = datetime.utcnow()
+            result = await collection.update_one(
+                {
+                    "_id": ObjectId(pdf_id),
+                    "parsed": {"$ne": True},
+                    "$or": [
+                        {"parse_status": {"$nin": [PDFParseStatus.QUEUED, PDFParseStatus.RUNNING]}},
+                        # Parses queued before heartbeats were recorded have none
+                        {"parse_heartbeat_at": None},
+                        {"parse_heartbeat_at": {"$lt": now - timedelta(seconds=config.PDF_PARSE_LEASE_TIMEOUT)}},
+                    ],
+                },
+                {"$set": {"parse_status": PDFParseStatus.QUEUED, "parse_error": None, "parse_heartbeat_at": now}},
+            )
             return result.modified_count > 0
         except Exception as e:
-            self.logger.error(f"Failed to update PDF text: {str(e)}")
+            self.logger.error(f"Failed to mark PDF parse as queued: {str(e)}")
             raise
 
-    async def delete_pdf(self, file_id: str) -> bool:
-        """Delete a PDF file from GridFS and its metadata."""
-        fs = await self._get_fs()
+    async def update_parse_status(self, pdf_id: str, status: PDFParseStatus, error: Optional[str] = None) -> bool:
+        """Update the parse status of a PDF."""
+        try:
+            collection = await self._get_collection()
+            result = await collection.update_one(
+                {"_id": ObjectId(pdf_id)}, {"$set": {"parse_status": status, "parse_error": error, "parse_heartbeat_at": datetime.utcnow()}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            self.logger.error(f"Failed to update PDF parse status: {str(e)}")
+            raise
+
+    async def _find_parsed_copy(self, content_hash: str, exclude_pdf_id: Optional[str] = None) -> Optional[dict]:
+        """Find an upload with the same content whose pages are already stored."""
+        collection = await self._get_collection()
+        query = {"content_hash": content_hash, "parsed": True, "page_count": {"$ne": None}}
+        if exclude_pdf_id:
+            query["_id"] = {"$ne": ObjectId(exclude_pdf_id)}
+        return await collection.find_one(query, {"page_count": 1})
+
+    async def reuse_parsed_text(self, pdf_id: str, content_hash: str) -> bool:
+        """Mark a PDF as parsed if an upload with the same content already has its pages stored."""
+        try:
+            parsed_copy = await self._find_parsed_copy(content_hash, exclude_pdf_id=pdf_id)
+            if not parsed_copy:
+                return False
+            return await self.mark_parsed(pdf_id, parsed_copy["page_count"])
+        except Exception as e:
+            self.logger.error(f"Failed to reuse parsed PDF text: {str(e)}")
+            raise
+
+    async def delete_pdf(self, pdf_id: str) -> bool:
+        """Delete a PDF's metadata and release its file, the GridFS file is removed once no other upload shares it."""
         try:
-            await fs.delete(ObjectId(file_id))
-            return await self.delete(file_id)
+            collection = await self._get_collection()
+            doc = await collection.find_one_and_delete({"_id": ObjectId(pdf_id)})
+            if not doc:
+                return False
+
+            if doc.get("content_hash"):
+                await self._release_content(doc["content_hash"])
+            else:
+                # Uploaded before content deduplication, the file and pages aren't shared
+                fs = await self._get_fs()
+                await fs.delete(ObjectId(doc["file_id"]))
+                await self.delete_pdf_pages(pdf_id)
+                await self.delete_pdf_chunks(pdf_id)
+
+            # Unselect the PDF for anyone who had it selected, dropping selections left empty
+            selected_collection = await self._get_selected_pdf_collection()
+            await selected_collection.update_many({"pdf_ids": pdf_id}, {"$pull": {"pdf_ids": pdf_id}})
+            await selected_collection.delete_many({"$or": [{"pdf_id": pdf_id}, {"pdf_ids": []}]})
+            return True
         except Exception as e:
-            self.logger.error(f"Failed to delete file from GridFS: {str(e)}")
+            self.logger.error(f"Failed to delete PDF: {str(e)}")
             return False
 
     async def set_selected_pdf(self, user_id: int, pdf_id: str) -> bool:
         """Set the selected PDF for a user."""
+        return await self.set_selected_pdfs(user_id, [pdf_id])
+
+    async def set_selected_pdfs(self, user_id: int, pdf_ids: List[str]) -> bool:
+        """Set the PDFs of a user's workspace, in the order given."""
         try:
             collection = await self._get_selected_pdf_collection()
-            # Use upsert to either update existing or create new
-            await collection.update_one({"user_id": user_id}, {"$set": {"pdf_id": pdf_id, "updated_at": datetime.utcnow()}}, upsert=True)
+            # Use upsert to either update existing or create new, selections stored before workspaces only had a pdf_id
+            await collection.update_one(
+                {"user_id": user_id}, {"$set": {"pdf_ids": pdf_ids, "updated_at": datetime.utcnow()}, "$unset": {"pdf_id": ""}}, upsert=True
+            )
             return True
         except Exception as e:
-            self.logger.error(f"Failed to set selected PDF: {str(e)}")
+            self.logger.error(f"Failed to set selected PDFs: {str(e)}")
             return False
 
     async def get_selected_pdf(self, user_id: int) -> Optional[str]:
-        """Get the selected PDF ID for a user."""
+        """Get the selected PDF ID for a user, the first of their workspace."""
+        pdf_ids = await self.get_selected_pdfs(user_id)
+        return pdf_ids[0] if pdf_ids else None
+
+    async def get_selected_pdfs(self, user_id: int) -> List[str]:
+        """Get the IDs of the PDFs in a user's workspace."""
         try:
             collection = await self._get_selected_pdf_collection()
             doc = await collection.find_one({"user_id": user_id})
-            return doc["pdf_id"] if doc else None
+            if not doc:
+                return []
+            return doc.get("pdf_ids") or ([doc["pdf_id"]] if doc.get("pdf_id") else [])
         except Exception as e:
-            self.logger.error(f"Failed to get selected PDF: {str(e)}")
-            return None
+            self.logger.error(f"Failed to get selected PDFs: {str(e)}")
+            return []
@@ -1,6 +1,6 @@
 from typing import Any, Generic, List, Optional, Type, TypeVar
 
-from sqlalchemy import delete, select, update
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -32,6 +32,17 @@ class PostgresRepository(IRepository[T], Generic[T]):
             await self.session.rollback()
             raise e
 
+    async def create_many(self, objs_in: List[dict]) -> None:
+        """Create several records in a single bulk insert."""
+        if not objs_in:
+            return
+        try:
+            await self.session.execute(insert(self.model_class), objs_in)
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            raise e
+
     async def get(self, id: int) -> Optional[T]:
         """Get a single record by id."""
         query = select(self.model_class).where(self.model_class.id == id)
@@ -1,8 +1,11 @@
-from typing import List
+import uuid
+from typing import List, Optional
 
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.postgres.models.chat_history import ChatHistory
+from app.db.postgres.models.chat_session import ChatSession
 from app.repositories.postgres.base import PostgresRepository
 
 
@@ -15,3 +18,42 @@ class PostgreChatHistoryRepository(PostgresRepository[ChatHistory]):
     async def get_chat_history(self, user_id: int) -> List[ChatHistory]:
         """Get chat history for a user"""
         return await self.get_multi(user_id=user_id)
+
+    async def get_session_turns(self, session_id: uuid.UUID, after_id: int = 0) -> List[ChatHistory]:
+        """Get the turns of a session after the given chat history id, oldest first."""
+        query = (
+            select(ChatHistory)
+            .where(ChatHistory.session_id == session_id, ChatHistory.id > after_id)
+            .order_by(ChatHistory.id)
+        )
+        result = await self.session.execute(query)
+        return list(result.scalars().all())
+
+
+class PostgreChatSessionRepository(PostgresRepository[ChatSession]):
+    """PostgreSQL implementation of ChatSession repository."""
+
+    def __init__(self, session: AsyncSession):
+        super().__init__(session=session, model_class=ChatSession)
+
+    async def get_user_session(self, session_id: uuid.UUID, user_id: int) -> Optional[ChatSession]:
+        """Get a session owned by a user."""
+        return await self.filter_one(session_id=session_id, user_id=user_id)
+
+    async def update_summary(self, id: int, summary: str, summarized_until: int, previous_until: int) -> bool:
+        """
+        Replace the summary of a session.
+        Only applies if nobody compacted the session since `previous_until` was read, so concurrent compactions can't go backwards.
+        """
+        try:
+            query = (
+                update(ChatSession)
+                .where(ChatSession.id == id, ChatSession.summarized_until == previous_until)
+                .values(summary=summary, summarized_until=summarized_until)
+            )
+            result = await self.session.execute(query)
+            await self.session.commit()
+            return result.rowcount > 0
+        except Exception as e:
+            await self.session.rollback()
+            raise e
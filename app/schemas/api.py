@@ -1,4 +1,5 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+from uuid import UUID
 
 from pydantic import Field
 
@@ -11,6 +12,23 @@ class GeminiChatRequest(BaseAPISerializer):
     contents: List[Dict[str, List[Dict[str, str]]]] = Field(
         ..., description="The contents to send to the model", example=[{"parts": [{"text": "What is this document about?"}]}]
     )
+    cachedContent: Optional[str] = Field(None, description="Name of a cached content the contents follow up on")
+
+
+class GeminiCachedContentRequest(BaseAPISerializer):
+    """Request model for creating a Gemini cached content."""
+
+    model: str = Field(..., description="The model the cached content is used with, e.g. models/gemini-2.0-flash")
+    contents: List[Dict[str, List[Dict[str, str]]]] = Field(..., description="The contents to cache")
+    ttl: str = Field(..., description="How long the provider keeps the cached content, e.g. 3600s")
+
+
+class OpenAIChatRequest(BaseAPISerializer):
+    """Request model for OpenAI compatible chat completions."""
+
+    model: str = Field(..., description="The model to answer with")
+    messages: List[Dict[str, str]] = Field(..., description="The conversation, as role and content pairs")
+    stream: Optional[bool] = Field(None, description="Stream the answer as server-sent events")
 
 
 class GeminiChatResponse(BaseAPISerializer):
@@ -19,3 +37,6 @@ class GeminiChatResponse(BaseAPISerializer):
     question: str = Field(..., description="The response from the model")
     answer: str = Field(..., description="The response from the model")
     pdf_id: str = Field(..., description="The response from the model")
+    pdf_ids: List[str] = Field(default_factory=list, description="The IDs of the PDFs the question was asked about")
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache")
+    session_id: Optional[UUID] = Field(None, description="The chat session the turn belongs to")
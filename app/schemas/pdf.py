@@ -1,8 +1,21 @@
 from datetime import datetime
+from enum import Enum
 from typing import Any, Dict, List, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from app.core.config import config
+
+
+class PDFParseStatus(str, Enum):
+    """Lifecycle states of a background PDF parse job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 
 class PDFUploadRequest(BaseModel):
     """Request model for PDF upload."""
@@ -22,16 +35,43 @@ class PDFMetadata(BaseModel):
     filename: str = Field(..., description="The name of the PDF file")
     upload_date: datetime = Field(..., description="The upload date of the PDF file")
     file_id: str = Field(..., description="The file identifier")
+    content_hash: Optional[str] = Field(None, description="The SHA-256 hash of the file content")
     parsed: bool = Field(default=False, description="Whether the PDF has been parsed")
+    parse_status: Optional[PDFParseStatus] = Field(None, description="The status of the background parse job")
+    parse_error: Optional[str] = Field(None, description="The error of the last failed parse job")
+    page_count: Optional[int] = Field(None, description="The number of pages of the PDF, known once parsing started")
+    pages_done: Optional[int] = Field(None, description="The number of pages parsed so far")
     text_content: Optional[str] = Field(None, description="The extracted text content of the PDF")
 
 
+class PDFListItem(BaseModel):
+    """PDF list entry, fields that were not requested are left out."""
+
+    id: str = Field(..., description="The unique identifier of the PDF")
+    user_id: Optional[int] = Field(None, description="The ID of the user who uploaded the PDF")
+    title: Optional[str] = Field(None, description="The title of the PDF file")
+    filename: Optional[str] = Field(None, description="The name of the PDF file")
+    upload_date: Optional[datetime] = Field(None, description="The upload date of the PDF file")
+    file_id: Optional[str] = Field(None, description="The file identifier")
+    content_hash: Optional[str] = Field(None, description="The SHA-256 hash of the file content")
+    parsed: Optional[bool] = Field(None, description="Whether the PDF has been parsed")
+    parse_status: Optional[PDFParseStatus] = Field(None, description="The status of the background parse job")
+    parse_error: Optional[str] = Field(None, description="The error of the last failed parse job")
+    page_count: Optional[int] = Field(None, description="The number of pages of the PDF, known once parsing started")
+    pages_done: Optional[int] = Field(None, description="The number of pages parsed so far")
+
+
+# Fields that can be selected on the PDF list endpoint
+PDF_LIST_FIELDS = [field for field in PDFListItem.model_fields if field != "id"]
+
+
 class PDFListResponse(BaseModel):
     """Response model for PDF list."""
 
     model_config = ConfigDict(from_attributes=True)
 
-    pdfs: List[PDFMetadata] = Field(..., description="List of PDFs")
+    pdfs: List[PDFListItem] = Field(..., description="List of PDFs")
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, empty on the last page")
 
 
 class PDFParseResponse(BaseModel):
@@ -39,6 +79,18 @@ class PDFParseResponse(BaseModel):
 
     message: str = Field(..., description="Status message")
     pdf_id: str = Field(..., description="The ID of the parsed PDF")
+    status: PDFParseStatus = Field(..., description="The status of the parse job")
+
+
+class PDFParseStatusResponse(BaseModel):
+    """Response model for PDF parse status."""
+
+    pdf_id: str = Field(..., description="The ID of the PDF")
+    status: Optional[PDFParseStatus] = Field(None, description="The status of the parse job, empty if it was never queued")
+    parsed: bool = Field(..., description="Whether the PDF has been parsed")
+    pages_done: Optional[int] = Field(None, description="The number of pages parsed so far")
+    total_pages: Optional[int] = Field(None, description="The number of pages of the PDF, known once parsing started")
+    error: Optional[str] = Field(None, description="The error of the last failed parse job")
 
 
 class PDFSelectResponse(BaseModel):
@@ -48,6 +100,31 @@ class PDFSelectResponse(BaseModel):
     pdf: PDFMetadata = Field(..., description="The selected PDF metadata")
 
 
+class PDFWorkspaceRequest(BaseModel):
+    """Request model for selecting several PDFs to chat with."""
+
+    pdf_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=config.CHAT_WORKSPACE_MAX_PDFS,
+        description="The PDFs of the workspace, questions are answered from all of them",
+    )
+
+
+class PDFWorkspaceResponse(BaseModel):
+    """Response model for a workspace selection."""
+
+    message: str = Field(..., description="Status message")
+    pdfs: List[PDFMetadata] = Field(..., description="The selected PDFs metadata")
+
+
+class PDFDeleteResponse(BaseModel):
+    """Response model for PDF deletion."""
+
+    message: str = Field(..., description="Status message")
+    pdf_id: str = Field(..., description="The ID of the deleted PDF")
+
+
 class PDFChatResponse(BaseModel):
     """Response model for PDF chat."""
 
@@ -56,12 +133,38 @@ class PDFChatResponse(BaseModel):
     question: str = Field(..., description="The question")
     answer: str = Field(..., description="The answer")
     pdf_id: str = Field(..., description="The ID of the PDF")
+    pdf_ids: List[str] = Field(default_factory=list, description="The IDs of the PDFs the question was asked about")
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache")
+    session_id: Optional[UUID] = Field(None, description="The chat session the turn belongs to")
 
 
 class PDFChatRequest(BaseModel):
     """Request model for PDF chat."""
 
     question: str = Field(..., description="The question")
+    session_id: Optional[UUID] = Field(None, description="Continue this chat session, questions without one are answered on their own")
+
+
+class PDFChatBatchRequest(BaseModel):
+    """Request model for a batch of questions about the selected PDF."""
+
+    questions: List[str] = Field(..., min_length=1, description="The questions, answered independently of each other")
+
+
+class PDFChatBatchAnswer(BaseModel):
+    """Answer to one question of a batch."""
+
+    question: str = Field(..., description="The question")
+    answer: Optional[str] = Field(None, description="The answer, missing if the question failed")
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache")
+    error: Optional[str] = Field(None, description="Why the question failed")
+
+
+class PDFChatBatchResponse(BaseModel):
+    """Response model for a batch of questions, answers are in the order of the questions."""
+
+    pdf_id: str = Field(..., description="The ID of the PDF")
+    answers: List[PDFChatBatchAnswer] = Field(..., description="The answers")
 
 
 class PDFChatHistoryResponse(BaseModel):
@@ -70,3 +173,22 @@ class PDFChatHistoryResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     history: List[Dict[str, Any]] = Field(..., description="List of chat history items")
+
+
+class PDFChatTurn(BaseModel):
+    """A question and answer of a chat session."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    question: str = Field(..., description="The question")
+    answer: str = Field(..., description="The answer")
+    created_at: datetime = Field(..., description="When the question was answered")
+
+
+class PDFChatSessionResponse(BaseModel):
+    """Response model for a chat session."""
+
+    session_id: UUID = Field(..., description="The ID of the chat session")
+    pdf_id: Optional[str] = Field(None, description="The PDF selected when the session was created")
+    summary: Optional[str] = Field(None, description="Summary of the turns compacted out of the prompt")
+    turns: List[PDFChatTurn] = Field(default_factory=list, description="Turns of the session, oldest first")
@@ -1,17 +1,83 @@
+import asyncio
 import base64
-from typing import Any, Dict, Literal, Optional, TypeVar
+import json
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Literal, Optional, TypeVar
 
-import requests
+import aiohttp
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_random_exponential
 
+from app.core.config import config
 from app.core.error_codes import ErrorCode
-from app.core.exceptions import ExceptionBase
+from app.core.exceptions import ExceptionBase, UpstreamAPIException
 from app.middleware.logging import default_logger
 from app.schemas.base import BaseAPISerializer
 from app.services.base import BaseAPIService
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.concurrency_limiter import AdaptiveLimiter
+from app.services.hedging import HedgingPolicy
+from app.services.http_client import HTTPClient
 
 RequestType = TypeVar("RequestType", bound=BaseAPISerializer)
+ResultType = TypeVar("ResultType")
 AuthType = Literal["basic", "bearer", "api_key"]
 
+# Statuses worth retrying, the provider is rate limiting or briefly unavailable
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryableAPIError(Exception):
+    """A failed attempt that may succeed if it is retried."""
+
+    def __init__(self, description: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(description)
+        self.description = description
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def should_retry(exception: BaseException) -> bool:
+    """Retry retryable failures, unless the provider asks us to wait longer than we are willing to."""
+    if not isinstance(exception, RetryableAPIError):
+        return False
+    return exception.retry_after is None or exception.retry_after <= config.API_RETRY_MAX_WAIT
+
+
+def wait_retry_after(retry_state: RetryCallState) -> float:
+    """Wait as long as Retry-After asks, otherwise exponential backoff with full jitter."""
+    exception = retry_state.outcome.exception() if retry_state.outcome else None
+    if isinstance(exception, RetryableAPIError) and exception.retry_after is not None:
+        return exception.retry_after
+    return wait_random_exponential(multiplier=config.API_RETRY_BASE_WAIT, max=config.API_RETRY_MAX_WAIT)(retry_state)
+
+
+def log_retry(retry_state: RetryCallState) -> None:
+    """Log an attempt that is about to be retried."""
+    exception = retry_state.outcome.exception() if retry_state.outcome else None
+    default_logger.warning(
+        "Retrying API request",
+        attempt=retry_state.attempt_number,
+        wait=retry_state.next_action.sleep if retry_state.next_action else None,
+        status_code=getattr(exception, "status_code", None),
+        error=str(exception),
+    )
+
 
 class APIService(BaseAPIService):
     """
@@ -27,7 +93,8 @@ class APIService(BaseAPIService):
         auth_password: Optional[str] = None,
         api_key: Optional[str] = None,
         bearer_token: Optional[str] = None,
-        timeout: int = 30,
+        timeout: Optional[float] = None,
+        name: Optional[str] = None,
     ) -> None:
         """
         Initialize the API service.
@@ -39,7 +106,8 @@ class APIService(BaseAPIService):
             auth_password (Optional[str]): Password for basic auth
             api_key (Optional[str]): API key for api_key auth
             bearer_token (Optional[str]): Token for bearer auth
-            timeout (int): Request timeout in seconds
+            timeout (Optional[float]): Request timeout in seconds, defaults to API_REQUEST_TIMEOUT
+            name (Optional[str]): Upstream name of the circuit breaker, concurrency limiter and hedging policy, defaults to the base URL
             extra_headers (Optional[Dict[str, str]]): Additional headers to include
         """
         self._base_url = base_url
@@ -48,15 +116,19 @@ class APIService(BaseAPIService):
         self._auth_password = auth_password
         self._api_key = api_key
         self._bearer_token = bearer_token
-        self._timeout = timeout
+        self._timeout = timeout or config.API_REQUEST_TIMEOUT
+        self.circuit_breaker = CircuitBreaker.get(name or base_url)
+        self.limiter = AdaptiveLimiter.get(name or base_url)
+        self.hedging = HedgingPolicy.get(name or base_url)
 
-    def _make_request(
+    async def _make_request(
         self,
         method: str,
         endpoint: str,
         data: Optional[RequestType] = None,
         params: Optional[Dict[str, Any]] = None,
         extra_headers: Optional[Dict[str, str]] = None,
+        hedge: bool = False,
     ) -> Dict[str, Any]:
         """
         Make HTTP request to the API.
@@ -66,6 +138,7 @@ class APIService(BaseAPIService):
             endpoint (str): API endpoint path
             data (Optional[RequestType], optional): Request body for POST/PUT requests
             params (Optional[Dict[str, Any]], optional): Query parameters for GET requests
+            hedge (bool): Send an identical request if this one is slow, for idempotent requests when HEDGE_ENABLED is set
 
         Returns:
             Dict[str, Any]: Response data as dictionary
@@ -76,7 +149,7 @@ class APIService(BaseAPIService):
 
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         headers = self.headers(extra_headers)
-        request_data = data.model_dump() if data else {}
+        request_data = data.model_dump(exclude_none=True) if data else {}
 
         # Log outgoing request
         default_logger.info(
@@ -89,46 +162,199 @@ class APIService(BaseAPIService):
             body=request_data,
         )
 
+        session = await HTTPClient.get_session()
+
+        async def send() -> Dict[str, Any]:
+            try:
+                async with session.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    data=data.model_dump_json(exclude_none=True) if data else None,
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=self._timeout, connect=config.HTTP_CONNECT_TIMEOUT),
+                ) as response:
+                    response_data = await response.json(content_type=None) if await response.read() else {}
+
+                    # Log response
+                    default_logger.info(
+                        "API response received",
+                        method=method,
+                        url=url,
+                        path=endpoint,
+                        status_code=response.status,
+                        response=response_data,
+                    )
+
+                    if response.status >= 400:
+                        self._raise_for_status(response, response_data, method, url, endpoint)
+                    return response_data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                default_logger.error("API request failed", method=method, url=url, path=endpoint, error=str(e) or type(e).__name__)
+                raise RetryableAPIError(str(e) or type(e).__name__)
+
+        if hedge and config.HEDGE_ENABLED:
+            return await self.hedging.run(lambda: self._call(send))
+        return await self._call(send)
+
+    async def _send_limited(self, send: Callable[[], Awaitable[ResultType]], hold_slot: bool) -> ResultType:
+        """
+        Send one attempt within the upstream's concurrency limit, feeding its outcome back to the limiter.
+        With `hold_slot` the slot is kept after a success and the caller releases it, e.g. once a stream is consumed.
+        """
+        await self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            result = await send()
+        except RetryableAPIError:
+            self.limiter.release()
+            self.limiter.record_overload(started)
+            raise
+        except BaseException:
+            self.limiter.release()
+            raise
+        self.limiter.record_success(started, time.monotonic() - started)
+        if not hold_slot:
+            self.limiter.release()
+        return result
+
+    async def _call(self, send: Callable[[], Awaitable[ResultType]], hold_slot: bool = False) -> ResultType:
+        """
+        Send a request through the circuit breaker and concurrency limiter, retrying retryable failures with backoff.
+        Client errors mean the provider is up and don't count against the breaker, calls the limiter rejected never reached it.
+        """
+        self.circuit_breaker.before_call()
+        recorded = False
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                data=data.model_dump_json() if data else None,
-                params=params,
-                timeout=self._timeout,
-            )
-
-            # Log response
-            default_logger.info(
-                "API response received",
-                method=method,
-                url=url,
-                path=endpoint,
-                status_code=response.status_code,
-                response=response.json(),
-            )
-
-            response.raise_for_status()
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            error_response = response.json() if response.content else {}
-            error_message = error_response.get("error", str(e))
-
-            default_logger.error(
-                "API request failed",
-                method=method,
-                url=url,
-                path=endpoint,
-                status_code=response.status_code,
-                error=error_message,
-                response=error_response,
-            )
-
-            if error_response.get("error"):
-                raise ExceptionBase(ErrorCode.API_ERROR, description=error_message)
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(config.API_RETRY_ATTEMPTS),
+                wait=wait_retry_after,
+                retry=retry_if_exception(should_retry),
+                before_sleep=log_retry,
+                reraise=True,
+            ):
+                with attempt:
+                    result = await self._send_limited(send, hold_slot)
+            self.circuit_breaker.record_success()
+            recorded = True
+            return result
+        except RetryableAPIError as e:
+            self.circuit_breaker.record_failure()
+            recorded = True
+            raise UpstreamAPIException(e.description, upstream_status=e.status_code)
+        except ExceptionBase as e:
+            if e.code != ErrorCode.UPSTREAM_OVERLOADED.code:
+                self.circuit_breaker.record_success()
+                recorded = True
+            raise
+        except ValueError as e:
+            # The provider answered with something that isn't JSON
+            self.circuit_breaker.record_failure()
+            recorded = True
             raise ExceptionBase(ErrorCode.API_ERROR, description=str(e))
+        finally:
+            if not recorded:
+                # Cancelled midway, let the next call be the trial
+                self.circuit_breaker.release_trial()
+
+    def _raise_for_status(self, response: aiohttp.ClientResponse, response_data: Any, method: str, url: str, endpoint: str) -> None:
+        """Raise for an error response, as retryable when the status is worth another attempt."""
+        error_message = response_data.get("error") if isinstance(response_data, dict) else None
+        default_logger.error(
+            "API request failed",
+            method=method,
+            url=url,
+            path=endpoint,
+            status_code=response.status,
+            error=error_message or response.reason,
+            response=response_data,
+        )
+        description = str(error_message or f"{response.status} {response.reason}")
+        if response.status in RETRYABLE_STATUSES:
+            raise RetryableAPIError(description, status_code=response.status, retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        raise UpstreamAPIException(description, upstream_status=response.status)
+
+    async def _stream_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[RequestType] = None,
+        params: Optional[Dict[str, Any]] = None,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Make an HTTP request to a server-sent events API and yield each event's JSON data as it arrives.
+
+        Args:
+            method (str): HTTP method (GET, POST, etc.)
+            endpoint (str): API endpoint path
+            data (Optional[RequestType], optional): Request body for POST/PUT requests
+            params (Optional[Dict[str, Any]], optional): Query parameters
+
+        Yields:
+            Dict[str, Any]: Data of each event
+
+        Raises:
+            ExceptionBase: If the request fails
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        headers = self.headers({"Accept": "text/event-stream", **(extra_headers or {})})
+
+        default_logger.info("Outgoing API stream request", method=method, url=url, path=endpoint, query_params=params)
+
+        session = await HTTPClient.get_session()
+
+        async def open_stream() -> aiohttp.ClientResponse:
+            try:
+                response = await session.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    data=data.model_dump_json(exclude_none=True) if data else None,
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=None, connect=config.HTTP_CONNECT_TIMEOUT, sock_read=self._timeout),
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                default_logger.error("API stream request failed", method=method, url=url, path=endpoint, error=str(e) or type(e).__name__)
+                raise RetryableAPIError(str(e) or type(e).__name__)
+
+            if response.status >= 400:
+                try:
+                    response_data = await response.json(content_type=None) if await response.read() else {}
+                except ValueError:
+                    response_data = {}
+                finally:
+                    response.release()
+                self._raise_for_status(response, response_data, method, url, endpoint)
+            return response
+
+        # Only opening the stream is retried, a stream that fails midway has already sent text to the client
+        # The stream keeps its concurrency slot until it is consumed
+        response = await self._call(open_stream, hold_slot=True)
+        try:
+            # An event is one or more data lines ended by a blank line
+            event_data = []
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line == "data: [DONE]":
+                    # End of stream marker of OpenAI compatible APIs
+                    break
+                if line.startswith("data:"):
+                    event_data.append(line[len("data:") :].lstrip())
+                elif not line and event_data:
+                    yield json.loads("\n".join(event_data))
+                    event_data = []
+            if event_data:
+                yield json.loads("\n".join(event_data))
+
+            default_logger.info("API stream completed", method=method, url=url, path=endpoint, status_code=response.status)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            default_logger.error("API stream request failed", method=method, url=url, path=endpoint, error=str(e) or type(e).__name__)
+            raise ExceptionBase(ErrorCode.API_ERROR, description=str(e) or type(e).__name__)
+        finally:
+            response.release()
+            self.limiter.release()
 
     @property
     def base_url(self) -> str:
@@ -10,7 +10,7 @@ class BaseAPIService(ABC):
     """Base interface for API service implementations"""
 
     @abstractmethod
-    def _make_request(
+    async def _make_request(
         self,
         method: str,
         endpoint: str,
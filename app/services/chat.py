@@ -1,45 +1,356 @@
+import asyncio
 import uuid
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Set, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache.answer import AnswerCache, answer_cache_key
+from app.cache.single_flight import SingleFlight
 from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.db.postgres.models.chat_history import ChatHistory
+from app.db.postgres.models.chat_session import ChatSession
+from app.db.postgres.session import get_db_context
+from app.middleware.logging import default_logger
 from app.repositories.mongodb.pdf import PDFMetadata
-from app.repositories.postgres.chat import PostgreChatHistoryRepository
-from app.schemas.api import GeminiChatRequest, GeminiChatResponse
-from app.schemas.pdf import PDFChatHistoryResponse
-from app.services.api import APIService
+from app.repositories.postgres.chat import PostgreChatHistoryRepository, PostgreChatSessionRepository
+from app.schemas.api import GeminiChatResponse
+from app.schemas.pdf import PDFChatBatchAnswer, PDFChatHistoryResponse, PDFChatSessionResponse, PDFChatTurn
+from app.services.context_cache import GeminiContextCache
+from app.services.history_writer import ChatHistoryWriter
+from app.services.llm.base import LLMRequest
+from app.services.llm.router import LLMRouter
+from app.services.retrieval import PDFRetriever, RetrievalMode
+
+# Part of the answer cache key, bump it whenever the prompt template changes
+PROMPT_VERSION = "2"
+
+INSTRUCTION = "You are a helpful assistant that can answer questions about a PDF."
+
+WORKSPACE_INSTRUCTION = "You are a helpful assistant that can answer questions about a set of PDFs."
 
 
 class ChatService:
+    # Compactions outlive the request that scheduled them, keep a reference until they are done
+    _compactions: Set["asyncio.Task[None]"] = set()
+
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.api_service = APIService(
-            base_url=config.GEMINI_BASE_URL,
+        self.llm = LLMRouter.default()
+        self.retriever = PDFRetriever()
+        self.answer_cache = AnswerCache()
+        self.single_flight = SingleFlight("chat_answer")
+        self.context_cache = GeminiContextCache(self.llm.get("gemini"))
+
+    @staticmethod
+    def _format_turns(turns: Sequence[ChatHistory]) -> str:
+        """Format the turns of a conversation for a prompt."""
+        return "\n".join(f"User: {turn.question}\nAssistant: {turn.answer}" for turn in turns)
+
+    @staticmethod
+    def _format_chunks(chunks: Sequence[Dict[str, Any]]) -> str:
+        """Format PDF chunks or pages for a prompt."""
+        return "\n\n".join(f"[Page {chunk['page_number']}]\n{chunk['text']}" for chunk in chunks)
+
+    @staticmethod
+    def _format_workspace_chunks(chunks: Sequence[Dict[str, Any]], pdfs: Sequence[PDFMetadata]) -> str:
+        """Format chunks of several PDFs for a prompt, each labelled with its document and page so it can be cited."""
+        titles = {pdf.id: pdf.title or pdf.filename for pdf in pdfs}
+        return "\n\n".join(f"[{titles[chunk['pdf_id']]}, page {chunk['page_number']}]\n{chunk['text']}" for chunk in chunks)
+
+    @staticmethod
+    def _content_key(pdfs: Sequence[PDFMetadata]) -> str:
+        """Key of the content a question is asked about, the same for any selection order of a workspace."""
+        return pdfs[0].content_key if len(pdfs) == 1 else "+".join(sorted(pdf.content_key for pdf in pdfs))
+
+    async def _document_prefix(self, pdf: PDFMetadata) -> str:
+        """The prompt prefix of full mode, the same for every question about a document."""
+        pages = await self.retriever.retrieve(pdf, "", mode=RetrievalMode.FULL)
+        return f"{INSTRUCTION} Use the following PDF:\n{self._format_chunks(pages)}"
+
+    async def _build_inline_prompt(self, question: str, pdfs: Sequence[PDFMetadata], turns: Sequence[ChatHistory], conversation: str) -> str:
+        """Build the prompt of a question with the relevant excerpts of the PDFs."""
+        # Follow-ups like "what about the second one?" rarely name what they are about, retrieve with the previous question too
+        retrieval_query = f"{turns[-1].question}\n{question}" if turns else question
+        if len(pdfs) > 1:
+            # The best chunks of all the PDFs share one budget, rather than each document getting a slice of it
+            chunks = await self.retriever.retrieve_many(list(pdfs), retrieval_query)
+            return f"""
+        {WORKSPACE_INSTRUCTION} Use the following excerpts of the PDFs, each labelled with its document and page:
+        {self._format_workspace_chunks(chunks, pdfs)}
+
+        Cite the document and page of the excerpts your answer is based on, like (Annual report, page 3).
+
+        {conversation}User: {question}
+        Assistant:
+        """
+
+        # Unless CHAT_RETRIEVAL_MODE is full, only the chunks relevant to the question are sent and the prompt stays within budget
+        chunks = await self.retriever.retrieve(pdfs[0], retrieval_query)
+        context = self._format_chunks(chunks)
+
+        return f"""
+        {INSTRUCTION} Use the following excerpts of the PDF:
+        {context}
+
+        {conversation}User: {question}
+        Assistant:
+        """
+
+    async def _build_request(
+        self,
+        question: str,
+        pdfs: Sequence[PDFMetadata],
+        session: Optional[ChatSession] = None,
+        turns: Sequence[ChatHistory] = (),
+        user_id: Optional[str] = None,
+    ) -> LLMRequest:
+        """
+        Build the LLM request of a question about the selected PDFs, following up on the conversation of a session if any.
+        In full mode a single document is referenced from the user's cached content when the primary provider supports it.
+        """
+        conversation = ""
+        if session is not None and session.summary:
+            conversation += f"Summary of the earlier conversation:\n{session.summary}\n\n"
+        if turns:
+            conversation += f"Conversation so far:\n{self._format_turns(turns)}\n\n"
+
+        def build_inline_prompt() -> Awaitable[str]:
+            return self._build_inline_prompt(question, pdfs, turns, conversation)
+
+        if (
+            user_id is not None
+            and len(pdfs) == 1
+            and self.llm.primary().supports_context_cache
+            and RetrievalMode(config.CHAT_RETRIEVAL_MODE) == RetrievalMode.FULL
+        ):
+            name = await self.context_cache.get_handle(user_id, pdfs[0].content_key, lambda: self._document_prefix(pdfs[0]))
+            if name:
+                prompt = f"""
+        {conversation}User: {question}
+        Assistant:
+        """
+                return LLMRequest(
+                    prompt=prompt,
+                    cached_content=name,
+                    build_inline_prompt=build_inline_prompt,
+                    on_cached_content_rejected=lambda rejected: self.context_cache.invalidate(user_id, rejected),
+                )
+
+        return LLMRequest(prompt=await build_inline_prompt())
+
+    async def _get_cached_answer(self, question: str, pdfs: Sequence[PDFMetadata], use_cache: bool) -> Optional[str]:
+        """Get the cached answer of a question about the content of the PDFs."""
+        if not use_cache or not config.CHAT_CACHE_ENABLED:
+            return None
+        return await self.answer_cache.get(answer_cache_key(self._content_key(pdfs), question, PROMPT_VERSION))
+
+    async def _cache_answer(self, question: str, pdfs: Sequence[PDFMetadata], answer: str, use_cache: bool) -> None:
+        """Cache a generated answer, empty answers are never cached."""
+        if use_cache and config.CHAT_CACHE_ENABLED and answer:
+            await self.answer_cache.set(answer_cache_key(self._content_key(pdfs), question, PROMPT_VERSION), answer)
+
+    async def _generate_answer(
+        self,
+        question: str,
+        pdfs: Sequence[PDFMetadata],
+        use_cache: bool,
+        session: Optional[ChatSession] = None,
+        turns: Sequence[ChatHistory] = (),
+        user_id: Optional[str] = None,
+    ) -> str:
+        """Ask the LLM a question about the PDFs and cache the answer."""
+        request = await self._build_request(question, pdfs, session, turns, user_id)
+        answer = await self.llm.generate(request, hedge=True)
+        await self._cache_answer(question, pdfs, answer, use_cache)
+        return answer
+
+    async def create_session(self, user_id: str, pdf_id: Optional[str] = None) -> PDFChatSessionResponse:
+        """Start a chat session, its turns are sent along with each follow-up question."""
+        session = await PostgreChatSessionRepository(self.db).create({"user_id": int(user_id), "pdf_id": pdf_id})
+        default_logger.info("Chat session created", user_id=user_id, session_id=str(session.session_id), pdf_id=pdf_id)
+        return PDFChatSessionResponse(session_id=session.session_id, pdf_id=session.pdf_id)
+
+    async def get_session(self, session_id: uuid.UUID, user_id: str) -> PDFChatSessionResponse:
+        """Get a chat session of a user with all of its turns."""
+        session = await PostgreChatSessionRepository(self.db).get_user_session(session_id, int(user_id))
+        if session is None:
+            raise ExceptionBase(ErrorCode.CHAT_SESSION_NOT_FOUND)
+        turns = await PostgreChatHistoryRepository(self.db).get_session_turns(session.session_id)
+        return PDFChatSessionResponse(
+            session_id=session.session_id,
+            pdf_id=session.pdf_id,
+            summary=session.summary,
+            turns=[PDFChatTurn.model_validate(turn) for turn in turns],
         )
 
-    async def chat_pdf(self, question: str, pdf: PDFMetadata, user_id: str) -> GeminiChatResponse:
-        # TODO: add log
+    async def _load_session(
+        self, db: AsyncSession, session_id: Optional[uuid.UUID], user_id: str
+    ) -> Tuple[Optional[ChatSession], List[ChatHistory]]:
+        """
+        Load a session and the turns not compacted into its summary yet, in a single query.
+        There are at most CHAT_SESSION_WINDOW_TURNS + CHAT_SESSION_COMPACT_EVERY of them, so the prompt stays bounded.
+        """
+        if session_id is None:
+            return None, []
+        session = await PostgreChatSessionRepository(db).get_user_session(session_id, int(user_id))
+        if session is None:
+            raise ExceptionBase(ErrorCode.CHAT_SESSION_NOT_FOUND)
+        turns = await PostgreChatHistoryRepository(db).get_session_turns(session.session_id, after_id=session.summarized_until)
+        return session, turns
+
+    def _schedule_compaction(self, session: Optional[ChatSession], turns: List[ChatHistory]) -> None:
+        """Fold the turns older than the window into the summary once enough of them piled up, without holding up the answer."""
+        if session is None or len(turns) <= config.CHAT_SESSION_WINDOW_TURNS + config.CHAT_SESSION_COMPACT_EVERY:
+            return
+        task = asyncio.create_task(
+            self._compact_session(session.id, session.summary, session.summarized_until, turns[: -config.CHAT_SESSION_WINDOW_TURNS])
+        )
+        self._compactions.add(task)
+        task.add_done_callback(self._compactions.discard)
+
+    async def _compact_session(self, session_id: int, summary: Optional[str], summarized_until: int, turns: List[ChatHistory]) -> None:
+        """Summarize the previous summary and the given turns into a new summary of the session."""
+        previous = f"Summary so far:\n{summary}\n\n" if summary else ""
         prompt = f"""
-        You are a helpful assistant that can answer questions about the following PDF:
-        {pdf.text_content}
-        User: {question}
-        Assistant:
+        Summarize the following conversation about a PDF in at most {config.CHAT_SESSION_SUMMARY_WORDS} words.
+        Keep the facts, names and numbers a follow-up question could refer to.
+        {previous}Conversation:
+        {self._format_turns(turns)}
+        Summary:
+        """
+        try:
+            new_summary = (await self.llm.generate(LLMRequest(prompt=prompt))).strip()
+            if not new_summary:
+                return
+            async with get_db_context() as db:
+                applied = await PostgreChatSessionRepository(db).update_summary(session_id, new_summary, turns[-1].id, summarized_until)
+            default_logger.info("Chat session compacted", session_id=session_id, turns=len(turns), applied=applied)
+        except Exception as e:
+            # The turns stay in the prompt and the next question tries again
+            default_logger.warning("Chat session compaction failed", session_id=session_id, error=str(e))
+
+    @staticmethod
+    def _queue_turn(row: Dict[str, Any]) -> bool:
+        """
+        Queue a stand-alone turn to be written behind the response, returns False if the caller has to write it.
+        Turns of a session are written right away, the next follow-up reads them back and compaction needs their ID.
+        """
+        return row["session_id"] is None and ChatHistoryWriter.enqueue(row)
+
+    async def _answer(self, question: str, pdfs: Sequence[PDFMetadata], user_id: str, use_cache: bool) -> Tuple[str, bool]:
+        """Answer a stand-alone question from the cache, an identical call in flight or Gemini, and tell whether it was cached."""
+        answer = await self._get_cached_answer(question, pdfs, use_cache)
+        if answer is not None:
+            return answer, True
+        if use_cache and config.CHAT_SINGLE_FLIGHT_ENABLED:
+            # Identical questions in flight, in this process or another worker, share one Gemini call
+            key = answer_cache_key(self._content_key(pdfs), question, PROMPT_VERSION)
+            return await self.single_flight.do(key, lambda: self._generate_answer(question, pdfs, use_cache, user_id=user_id)), False
+        return await self._generate_answer(question, pdfs, use_cache, user_id=user_id), False
+
+    async def chat_pdf(
+        self, question: str, pdfs: Sequence[PDFMetadata], user_id: str, use_cache: bool = True, session_id: Optional[uuid.UUID] = None
+    ) -> GeminiChatResponse:
         """
-        request = GeminiChatRequest(contents=[{"parts": [{"text": prompt}]}])
-        response = self.api_service._make_request(
-            method="POST",
-            endpoint=f"{config.GEMINI_ENDPOINT}?key={config.GEMINI_API_KEY}",
-            data=request,
+        Answer a question about the selected PDFs and save it to the chat history, as a turn of the given session if any.
+        Answers are cached by document content and normalized question, `use_cache` bypasses the cache and request coalescing.
+        """
+        # TODO: add log
+        session, turns = await self._load_session(self.db, session_id, user_id)
+        if turns or (session and session.summary):
+            # The answer depends on the conversation, only stand-alone questions are cached or shared
+            answer, cached = await self._generate_answer(question, pdfs, False, session, turns, user_id), False
+        else:
+            answer, cached = await self._answer(question, pdfs, user_id, use_cache)
+
+        row = {"user_id": int(user_id), "question": question, "answer": answer, "session_id": session.session_id if session else None}
+        if not self._queue_turn(row):
+            turn = await PostgreChatHistoryRepository(self.db).create(row)
+            self._schedule_compaction(session, turns + [turn])
+        return GeminiChatResponse(
+            question=question,
+            answer=answer,
+            pdf_id=pdfs[0].id,
+            pdf_ids=[pdf.id for pdf in pdfs],
+            cached=cached,
+            session_id=session.session_id if session else None,
         )
 
-        # Extract the answer from Gemini response
-        answer = response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-        await PostgreChatHistoryRepository(self.db).create(
-            {"user_id": int(user_id), "question": question, "answer": answer, "session_id": str(uuid.uuid4())}
+    async def chat_pdf_batch(
+        self, questions: List[str], pdfs: Sequence[PDFMetadata], user_id: str, use_cache: bool = True
+    ) -> List[PDFChatBatchAnswer]:
+        """
+        Answer several stand-alone questions about the selected PDFs, at most CHAT_BATCH_CONCURRENCY at a time.
+        Answers are returned in the order of the questions, a failed question doesn't fail the others.
+        The answered questions are saved to the chat history in a single bulk insert.
+        """
+        if len(questions) > config.CHAT_BATCH_MAX_QUESTIONS:
+            raise ExceptionBase(ErrorCode.INVALID_INPUT, description=f"At most {config.CHAT_BATCH_MAX_QUESTIONS} questions per batch")
+
+        semaphore = asyncio.Semaphore(config.CHAT_BATCH_CONCURRENCY)
+
+        async def answer_one(question: str) -> PDFChatBatchAnswer:
+            async with semaphore:
+                try:
+                    answer, cached = await self._answer(question, pdfs, user_id, use_cache)
+                except ExceptionBase as e:
+                    default_logger.warning("Batch question failed", user_id=user_id, pdf_id=pdfs[0].id, error=e.description)
+                    return PDFChatBatchAnswer(question=question, error=e.description)
+            return PDFChatBatchAnswer(question=question, answer=answer, cached=cached)
+
+        answers = await asyncio.gather(*(answer_one(question) for question in questions))
+
+        await PostgreChatHistoryRepository(self.db).create_many(
+            [
+                {"user_id": int(user_id), "question": item.question, "answer": item.answer, "session_id": None}
+                for item in answers
+                if item.answer is not None
+            ]
+        )
+        default_logger.info(
+            "Chat batch answered",
+            user_id=user_id,
+            pdf_id=pdfs[0].id,
+            questions=len(questions),
+            failed=sum(item.answer is None for item in answers),
         )
-        return GeminiChatResponse(question=question, answer=answer, pdf_id=pdf.id)
+        return answers
+
+    async def chat_pdf_stream(
+        self, question: str, pdfs: Sequence[PDFMetadata], user_id: str, use_cache: bool = True, session_id: Optional[uuid.UUID] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer to a question as Gemini generates it, yielding the text deltas.
+        A cached answer is sent as a single delta. The full answer is saved to the chat history once the stream completes.
+        """
+        session, turns = await self._load_session(self.db, session_id, user_id)
+        use_cache = use_cache and not turns and not (session and session.summary)
+
+        answer = await self._get_cached_answer(question, pdfs, use_cache)
+        if answer is not None:
+            yield answer
+        else:
+            parts = []
+            request = await self._build_request(question, pdfs, session, turns, user_id)
+            async for text in self.llm.stream(request):
+                parts.append(text)
+                yield text
+            answer = "".join(parts)
+            await self._cache_answer(question, pdfs, answer, use_cache)
+
+        row = {"user_id": int(user_id), "question": question, "answer": answer, "session_id": session.session_id if session else None}
+        if not self._queue_turn(row):
+            # The request scoped session is closed once streaming starts, save with a session of our own
+            async with get_db_context() as db:
+                turn = await PostgreChatHistoryRepository(db).create(row)
+            self._schedule_compaction(session, turns + [turn])
+        default_logger.info("Streamed chat answer saved", user_id=user_id, pdf_id=pdfs[0].id, answer_length=len(answer))
 
     async def chat_history(self, user_id: str) -> PDFChatHistoryResponse:
+        # Include the turns of this process still waiting to be written
+        await ChatHistoryWriter.flush()
         history = await PostgreChatHistoryRepository(self.db).get_chat_history(user_id)
         formatted_history = [
             {"user_id": item.user_id, "question": item.question, "answer": item.answer, "session_id": item.session_id} for item in history
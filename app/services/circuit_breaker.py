@@ -0,0 +1,93 @@
+import time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.middleware.logging import default_logger
+
+
+class CircuitState(str, Enum):
+    """State of a circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream is unhealthy.
+    After `failure_threshold` consecutive failures the circuit opens and calls are rejected for `recovery_timeout` seconds,
+    then a single trial call decides whether it closes again. Breakers are shared per upstream within a process.
+    """
+
+    _breakers: Dict[str, "CircuitBreaker"] = {}
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @classmethod
+    def get(cls, name: str) -> "CircuitBreaker":
+        """Get the breaker of an upstream, creating it on first use."""
+        if name not in cls._breakers:
+            cls._breakers[name] = cls(
+                name, failure_threshold=config.CIRCUIT_BREAKER_FAILURE_THRESHOLD, recovery_timeout=config.CIRCUIT_BREAKER_RECOVERY_TIMEOUT
+            )
+        return cls._breakers[name]
+
+    @classmethod
+    def snapshot_all(cls) -> Dict[str, Dict[str, Any]]:
+        """State of every breaker of the process."""
+        return {name: breaker.snapshot() for name, breaker in cls._breakers.items()}
+
+    def before_call(self) -> None:
+        """Let a call through or raise UPSTREAM_UNAVAILABLE while the circuit is open."""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                raise ExceptionBase(ErrorCode.UPSTREAM_UNAVAILABLE)
+            self.state = CircuitState.HALF_OPEN
+            default_logger.info("Circuit half open", upstream=self.name)
+
+        if self.state == CircuitState.HALF_OPEN:
+            # Only one trial call at a time, the rest keep failing fast until it succeeds
+            if self.trial_in_flight:
+                raise ExceptionBase(ErrorCode.UPSTREAM_UNAVAILABLE)
+            self.trial_in_flight = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        if self.state != CircuitState.CLOSED:
+            default_logger.info("Circuit closed", upstream=self.name)
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit at the threshold or when the trial call fails."""
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CircuitState.OPEN:
+                default_logger.warning("Circuit opened", upstream=self.name, failures=self.failures)
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """Give up the trial call without a verdict, e.g. when the caller was cancelled."""
+        self.trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State of the breaker for health checks."""
+        retry_in = None
+        if self.state == CircuitState.OPEN:
+            retry_in = max(self.recovery_timeout - (time.monotonic() - self.opened_at), 0)
+        return {"state": self.state.value, "failures": self.failures, "retry_in": retry_in}
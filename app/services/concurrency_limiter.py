@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.core.metrics import UPSTREAM_CONCURRENCY_LIMIT, UPSTREAM_IN_FLIGHT, UPSTREAM_QUEUE_DEPTH, UPSTREAM_REJECTED
+from app.middleware.logging import default_logger
+
+# Weight of the latest call in the moving average of latencies
+LATENCY_EWMA_ALPHA = 0.1
+
+
+class AdaptiveLimiter:
+    """
+    Limit the calls in flight to an upstream, adapting the limit AIMD style.
+    Each call that succeeds without being slow grows the limit by 1 / limit, about one per round of calls.
+    A 429, 5xx, timeout or slow call multiplies it by `backoff`, at most once per round: calls started before the last
+    decrease don't decrease it again. A call is slow past `latency_threshold`, or past `latency_tolerance` times the
+    moving average of successful latencies once `latency_min_samples` calls have been seen. Calls over the limit wait
+    in a bounded FIFO queue until a slot frees up or their deadline passes. Limiters are shared per upstream within a process.
+    """
+
+    _limiters: Dict[str, "AdaptiveLimiter"] = {}
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        backoff: float,
+        latency_threshold: float,
+        queue_size: int,
+        queue_timeout: float,
+        latency_tolerance: float = 3.0,
+        latency_min_samples: int = 10,
+    ):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_threshold = latency_threshold
+        self.latency_tolerance = latency_tolerance
+        self.latency_min_samples = latency_min_samples
+        self.latency_average = 0.0
+        self.latency_samples = 0
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._update_metrics()
+
+    @classmethod
+    def get(cls, name: str) -> "AdaptiveLimiter":
+        """Get the limiter of an upstream, creating it on first use."""
+        if name not in cls._limiters:
+            cls._limiters[name] = cls(
+                name,
+                initial_limit=config.CONCURRENCY_LIMIT_INITIAL,
+                min_limit=config.CONCURRENCY_LIMIT_MIN,
+                max_limit=config.CONCURRENCY_LIMIT_MAX,
+                backoff=config.CONCURRENCY_LIMIT_BACKOFF,
+                latency_threshold=config.CONCURRENCY_LIMIT_LATENCY_THRESHOLD,
+                queue_size=config.CONCURRENCY_QUEUE_SIZE,
+                queue_timeout=config.CONCURRENCY_QUEUE_TIMEOUT,
+                latency_tolerance=config.CONCURRENCY_LIMIT_LATENCY_TOLERANCE,
+                latency_min_samples=config.CONCURRENCY_LIMIT_LATENCY_MIN_SAMPLES,
+            )
+        return cls._limiters[name]
+
+    @classmethod
+    def snapshot_all(cls) -> Dict[str, Dict[str, Any]]:
+        """State of every limiter of the process."""
+        return {name: limiter.snapshot() for name, limiter in cls._limiters.items()}
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if none is free. Raises UPSTREAM_OVERLOADED if the queue is full or the wait times out."""
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self._update_metrics()
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            UPSTREAM_REJECTED.labels(upstream=self.name, reason="queue_full").inc()
+            raise ExceptionBase(ErrorCode.UPSTREAM_OVERLOADED)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_metrics()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_metrics()
+            if isinstance(e, asyncio.TimeoutError):
+                UPSTREAM_REJECTED.labels(upstream=self.name, reason="timeout").inc()
+                raise ExceptionBase(ErrorCode.UPSTREAM_OVERLOADED)
+            raise
+
+    def release(self) -> None:
+        """Give a slot back, handing it to the longest waiting call if any."""
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._update_metrics()
+
+    def record_success(self, started: float, latency: float) -> None:
+        """Grow the limit after a call that succeeded, or shrink it if the call was slow."""
+        slow = self._is_slow(latency)
+        if self.latency_samples:
+            self.latency_average += LATENCY_EWMA_ALPHA * (latency - self.latency_average)
+        else:
+            self.latency_average = latency
+        self.latency_samples += 1
+        if slow:
+            self.record_overload(started)
+            return
+        self.limit = min(self.limit + 1 / self.limit, float(self.max_limit))
+        self._wake_waiters()
+
+    def _is_slow(self, latency: float) -> bool:
+        if latency > self.latency_threshold:
+            return True
+        return self.latency_samples >= self.latency_min_samples and latency > self.latency_tolerance * self.latency_average
+
+    def record_overload(self, started: float) -> None:
+        """Shrink the limit after a call that hit a 429, 5xx or timeout, once for the calls of a round."""
+        if started < self.last_decrease:
+            return
+        previous = int(self.limit)
+        self.limit = max(self.limit * self.backoff, float(self.min_limit))
+        self.last_decrease = time.monotonic()
+        if int(self.limit) != previous:
+            default_logger.warning("Concurrency limit decreased", upstream=self.name, limit=int(self.limit), in_flight=self.in_flight)
+        self._update_metrics()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State of the limiter for health checks."""
+        return {"limit": int(self.limit), "in_flight": self.in_flight, "queued": len(self._waiters)}
+
+    def _update_metrics(self) -> None:
+        UPSTREAM_CONCURRENCY_LIMIT.labels(upstream=self.name).set(int(self.limit))
+        UPSTREAM_IN_FLIGHT.labels(upstream=self.name).set(self.in_flight)
+        UPSTREAM_QUEUE_DEPTH.labels(upstream=self.name).set(len(self._waiters))
@@ -0,0 +1,139 @@
+import json
+from typing import Awaitable, Callable, Optional
+
+from app.cache.service import AsyncCacheService
+from app.cache.single_flight import SingleFlight
+from app.core.config import config
+from app.core.exceptions import ExceptionBase
+from app.middleware.logging import default_logger
+from app.schemas.api import GeminiCachedContentRequest
+from app.services.api import APIService
+from app.services.text import estimate_tokens
+
+
+class GeminiContextCache:
+    """
+    Provider side caching of the document prefix of chat prompts.
+    The first question of a user about a document caches the document at Gemini, later questions reference the cached
+    content instead of resending it. A user's cached content lives as long as their selection: it is deleted when they
+    select another PDF and otherwise expires at the provider after GEMINI_CONTEXT_CACHE_TTL.
+    When caching isn't available the caller gets no handle and sends the document inline.
+    """
+
+    def __init__(self, api_service: Optional[APIService] = None):
+        self.api_service = api_service or APIService(base_url=config.GEMINI_BASE_URL, name="gemini")
+        self.redis = AsyncCacheService()
+        self.single_flight = SingleFlight("gemini_context")
+
+    @staticmethod
+    def _handle_key(user_id: str) -> str:
+        return f":gemini_context:{user_id}"
+
+    @staticmethod
+    def _unavailable_key(content_key: str) -> str:
+        return f":gemini_context:unavailable:{content_key}"
+
+    async def get_handle(self, user_id: str, content_key: str, build_prefix: Callable[[], Awaitable[str]]) -> Optional[str]:
+        """
+        Get the name of the cached content of a user's document, caching the prefix built by `build_prefix` on first use.
+        Returns None when the document should be sent inline.
+        """
+        if not config.GEMINI_CONTEXT_CACHE_ENABLED:
+            return None
+        try:
+            handle = await self._get_stored_handle(user_id)
+            if handle and handle["content_key"] == content_key:
+                return handle["name"]
+            if await self.redis.get(self._unavailable_key(content_key)):
+                return None
+        except Exception as e:
+            default_logger.warning("Context cache lookup failed", user_id=user_id, error=str(e))
+            return None
+
+        # Questions asked while the document is being cached wait for the same cached content
+        name = await self.single_flight.do(f"{user_id}:{content_key}", lambda: self._create_handle(user_id, content_key, build_prefix))
+        return name or None
+
+    async def _get_stored_handle(self, user_id: str) -> Optional[dict]:
+        stored = await self.redis.get(self._handle_key(user_id))
+        return json.loads(stored) if stored else None
+
+    async def _create_handle(self, user_id: str, content_key: str, build_prefix: Callable[[], Awaitable[str]]) -> str:
+        """Cache a document at the provider and remember it as the user's, an empty name means it can't be cached."""
+        prefix = await build_prefix()
+        if estimate_tokens(prefix) < config.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            await self._mark_unavailable(content_key)
+            return ""
+
+        try:
+            response = await self.api_service._make_request(
+                method="POST",
+                endpoint=f"{config.GEMINI_CACHED_CONTENTS_ENDPOINT}?key={config.GEMINI_API_KEY}",
+                data=GeminiCachedContentRequest(
+                    model=config.GEMINI_MODEL, contents=[{"parts": [{"text": prefix}]}], ttl=f"{config.GEMINI_CONTEXT_CACHE_TTL}s"
+                ),
+            )
+        except ExceptionBase as e:
+            default_logger.warning("Context cache creation failed, sending the document inline", content_key=content_key, error=e.description)
+            await self._mark_unavailable(content_key)
+            return ""
+
+        name = response.get("name", "")
+        if not name:
+            await self._mark_unavailable(content_key)
+            return ""
+
+        try:
+            previous = await self._get_stored_handle(user_id)
+            # Forget the handle a little before the provider does so it is never referenced once expired
+            await self.redis.set(
+                self._handle_key(user_id),
+                json.dumps({"name": name, "content_key": content_key}),
+                ex=max(config.GEMINI_CONTEXT_CACHE_TTL - 60, 1),
+            )
+        except Exception as e:
+            default_logger.warning("Context cache handle not stored", user_id=user_id, error=str(e))
+            previous = None
+        if previous and previous["name"] != name:
+            await self._delete_cached_content(previous["name"])
+
+        default_logger.info("Document cached at the provider", user_id=user_id, content_key=content_key, name=name)
+        return name
+
+    async def _mark_unavailable(self, content_key: str) -> None:
+        try:
+            await self.redis.set(self._unavailable_key(content_key), "1", ex=config.GEMINI_CONTEXT_CACHE_RETRY_AFTER)
+        except Exception as e:
+            default_logger.warning("Context cache state not stored", content_key=content_key, error=str(e))
+
+    async def _delete_cached_content(self, name: str) -> None:
+        try:
+            await self.api_service._make_request(
+                method="DELETE", endpoint=f"{config.GEMINI_CACHED_CONTENTS_ENDPOINT.rsplit('/', 1)[0]}/{name}?key={config.GEMINI_API_KEY}"
+            )
+        except ExceptionBase as e:
+            # It expires at the provider anyway
+            default_logger.warning("Cached content not deleted", name=name, error=e.description)
+
+    async def invalidate(self, user_id: str, name: str) -> None:
+        """Forget a handle the provider rejected, e.g. because it expired early."""
+        try:
+            handle = await self._get_stored_handle(user_id)
+            if handle and handle["name"] == name:
+                await self.redis.delete(self._handle_key(user_id))
+        except Exception as e:
+            default_logger.warning("Context cache handle not invalidated", user_id=user_id, error=str(e))
+
+    async def release(self, user_id: str, keep_content_key: Optional[str] = None) -> None:
+        """Delete a user's cached content once they select another document, unless it is the one in `keep_content_key`."""
+        if not config.GEMINI_CONTEXT_CACHE_ENABLED:
+            return
+        try:
+            handle = await self._get_stored_handle(user_id)
+            if not handle or handle["content_key"] == keep_content_key:
+                return
+            await self.redis.delete(self._handle_key(user_id))
+        except Exception as e:
+            default_logger.warning("Context cache release failed", user_id=user_id, error=str(e))
+            return
+        await self._delete_cached_content(handle["name"])
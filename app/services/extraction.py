@@ -0,0 +1,124 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+from app.core.config import config
+from app.middleware.logging import default_logger
+
+# (page_number, text, error) - page numbers are 1-based, error is set when the page could not be extracted
+PageText = Tuple[int, Optional[str], Optional[str]]
+
+
+def count_pages(path: str) -> int:
+    """Count the pages of a staged PDF file. Runs inside a worker process."""
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[PageText]:
+    """
+    Extract the text of the pages in [start, end) of a staged PDF file. Runs inside a worker process.
+    The file is parsed once per range and each worker gets at most one range of a batch. Nothing is kept afterwards, the
+    staging path may be reused by another PDF once the parse is done.
+    Errors are returned per page instead of raised so one broken page doesn't fail the whole range.
+    """
+    pdf_reader = PyPDF2.PdfReader(path)
+    pages = []
+    for index in range(start, end):
+        try:
+            pages.append((index + 1, pdf_reader.pages[index].extract_text(), None))
+        except Exception as e:
+            pages.append((index + 1, None, str(e)))
+    return pages
+
+
+def split_page_ranges(start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+    """Split the pages in [start, end) into at most `parts` contiguous ranges of similar size."""
+    size = math.ceil((end - start) / max(parts, 1)) if end > start else 0
+    return [(range_start, min(range_start + size, end)) for range_start in range(start, end, size)] if size else []
+
+
+class PDFTextExtractor:
+    """
+    CPU-bound PDF text extraction off the event loop.
+    Page ranges are spread across a process pool shared by the whole process and merged back in page order. The file is
+    staged on disk once per parse so workers read it from there instead of each task being sent a copy.
+    A daemonic process, such as a Celery prefork child, can't start worker processes: there extraction runs in a single
+    thread of the process instead. The Celery worker runs with the solo pool so parses get the process pool.
+    """
+
+    _executor: Optional[Executor] = None
+
+    @staticmethod
+    def in_daemon_process() -> bool:
+        """Whether the current process is daemonic and so not allowed to have children."""
+        return multiprocessing.current_process().daemon
+
+    @classmethod
+    def max_workers(cls) -> int:
+        """Number of worker processes, defaults to the cores available to this process."""
+        if cls.in_daemon_process():
+            return 1
+        if config.PDF_EXTRACT_WORKERS:
+            return config.PDF_EXTRACT_WORKERS
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+
+    @classmethod
+    def get_executor(cls) -> Executor:
+        """Get the shared process pool, creating it on first use, or a single thread in a daemonic process."""
+        if cls._executor is None:
+            if cls.in_daemon_process():
+                default_logger.warning("Daemonic process can't start extraction workers, extracting in-process")
+                cls._executor = ThreadPoolExecutor(max_workers=1)
+            else:
+                cls._executor = ProcessPoolExecutor(max_workers=cls.max_workers())
+        return cls._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Shut the shared pool down."""
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True, cancel_futures=True)
+            cls._executor = None
+
+    @staticmethod
+    @contextmanager
+    def staged(file_content: bytes) -> Iterator[str]:
+        """Write a PDF to a temporary file for the workers to read, removed once done."""
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(file_content)
+            yield path
+        finally:
+            os.unlink(path)
+
+    async def count_pages(self, path: str) -> int:
+        """Count the pages of a staged PDF file in the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_executor(), count_pages, path)
+
+    async def extract(self, path: str, start: int = 0, end: Optional[int] = None) -> List[PageText]:
+        """Extract the text of the pages in [start, end) of a staged PDF file in parallel, ordered by page number."""
+        if end is None:
+            end = await self.count_pages(path)
+
+        # At most one range per worker
+        loop = asyncio.get_running_loop()
+        executor = self.get_executor()
+        batches = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, extract_page_range, path, range_start, range_end)
+                for range_start, range_end in split_page_ranges(start, end, self.max_workers())
+            )
+        )
+        return [page for batch in batches for page in batch]
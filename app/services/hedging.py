@@ -0,0 +1,103 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core.config import config
+from app.core.metrics import UPSTREAM_HEDGES
+from app.middleware.logging import default_logger
+
+ResultType = TypeVar("ResultType")
+
+# Unused budget that may pile up for a burst of hedges, in hedges
+BUDGET_BURST = 10.0
+
+
+class HedgingPolicy:
+    """
+    Cut tail latency by hedging slow requests.
+    If a request hasn't answered after the `percentile` of recent latencies, an identical request is sent, the first to
+    succeed wins and the other is cancelled. Each request earns `budget_percent` / 100 of a hedge and a hedge spends one,
+    so hedges stay within that share of the traffic. Policies are shared per upstream within a process.
+    Every run records its latency from the start of the first request, hedged or not, so a primary that lost to its
+    hedge still counts as slow instead of dropping out of the percentile.
+    """
+
+    _policies: Dict[str, "HedgingPolicy"] = {}
+
+    def __init__(self, name: str, percentile: float, min_samples: int, window: int, budget_percent: float):
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget_percent = budget_percent
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.tokens = 0.0
+
+    @classmethod
+    def get(cls, name: str) -> "HedgingPolicy":
+        """Get the policy of an upstream, creating it on first use."""
+        if name not in cls._policies:
+            cls._policies[name] = cls(
+                name,
+                percentile=config.HEDGE_PERCENTILE,
+                min_samples=config.HEDGE_MIN_SAMPLES,
+                window=config.HEDGE_LATENCY_WINDOW,
+                budget_percent=config.HEDGE_BUDGET_PERCENT,
+            )
+        return cls._policies[name]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait for a request before hedging it, None until enough latencies were recorded."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(math.ceil(self.percentile / 100 * len(ordered)) - 1, 0)]
+
+    def record_latency(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+    def _spend_budget(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def run(self, call: Callable[[], Awaitable[ResultType]]) -> ResultType:
+        """Run `call`, running it a second time concurrently if it is slow and the budget allows."""
+        self.tokens = min(self.tokens + self.budget_percent / 100, BUDGET_BURST)
+        delay = self.hedge_delay()
+        started = time.monotonic()
+        primary = asyncio.ensure_future(call())
+        tasks = {primary}
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            if not self._spend_budget():
+                UPSTREAM_HEDGES.labels(upstream=self.name, outcome="over_budget").inc()
+                return await primary
+
+            default_logger.info("Hedging slow request", upstream=self.name, delay=round(delay, 3))
+            UPSTREAM_HEDGES.labels(upstream=self.name, outcome="sent").inc()
+            hedge = asyncio.ensure_future(call())
+            tasks.add(hedge)
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                # The first success wins, a failure only counts once both requests failed
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if succeeded[0] is hedge:
+                        UPSTREAM_HEDGES.labels(upstream=self.name, outcome="won").inc()
+                    return succeeded[0].result()
+                if not tasks:
+                    return primary.result()
+        finally:
+            self.record_latency(time.monotonic() - started)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
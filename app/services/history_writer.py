@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core.config import config
+from app.core.metrics import CHAT_HISTORY_ROWS
+from app.db.postgres.session import get_db_context
+from app.middleware.logging import default_logger
+from app.repositories.postgres.chat import PostgreChatHistoryRepository
+
+# Attempts at inserting a batch before its rows are dropped, and the backoff between them in seconds
+WRITE_ATTEMPTS = 3
+WRITE_BACKOFF = 0.5
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind of chat history rows.
+    Rows are queued in process and inserted by a background task in multi-row INSERTs of up to CHAT_HISTORY_BATCH_SIZE rows,
+    a row waits at most CHAT_HISTORY_FLUSH_INTERVAL for its batch to fill up. The writer is started in the app lifespan and
+    drained on shutdown. Outside the app (Celery workers, scripts) or once the queue is full, callers write rows themselves.
+    """
+
+    queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+    task: Optional["asyncio.Task[None]"] = None
+    _batch_ready: Optional[asyncio.Event] = None
+    _progress: Optional[asyncio.Condition] = None
+    # Rows queued and rows processed so far, rows are processed in order so `_processed` is the watermark of a flush
+    _queued = 0
+    _processed = 0
+    # Rows up to this one are waited for, their batches are written without waiting to fill up
+    _flush_target = 0
+
+    @classmethod
+    async def start(cls) -> None:
+        """Start the background writer."""
+        if not config.CHAT_HISTORY_WRITE_BEHIND or cls.task is not None:
+            return
+        cls.queue = asyncio.Queue(maxsize=config.CHAT_HISTORY_QUEUE_SIZE)
+        cls._batch_ready = asyncio.Event()
+        cls._progress = asyncio.Condition()
+        cls._queued = cls._processed = cls._flush_target = 0
+        cls.task = asyncio.create_task(cls._run(cls.queue, cls._batch_ready))
+        default_logger.info("Chat history writer started", batch_size=config.CHAT_HISTORY_BATCH_SIZE)
+
+    @classmethod
+    def enqueue(cls, row: Dict[str, Any]) -> bool:
+        """Queue a row to be written, returns False if the caller has to write it as the writer isn't running or is full."""
+        if cls.queue is None:
+            return False
+        try:
+            # Stamped now, the row may be inserted a little later
+            cls.queue.put_nowait({**row, "created_at": row.get("created_at") or datetime.now(timezone.utc)})
+        except asyncio.QueueFull:
+            CHAT_HISTORY_ROWS.labels(outcome="queue_full").inc()
+            return False
+        cls._queued += 1
+        if cls.queue.qsize() >= config.CHAT_HISTORY_BATCH_SIZE:
+            cls._batch_ready.set()
+        return True
+
+    @classmethod
+    async def flush(cls) -> None:
+        """Wait until the rows queued so far are written, e.g. before reading the history back. Rows queued later aren't waited for."""
+        if cls.task is None:
+            return
+        await cls._wait_for(cls._queued)
+
+    @classmethod
+    async def _wait_for(cls, target: int) -> None:
+        cls._flush_target = max(cls._flush_target, target)
+        cls._batch_ready.set()
+        async with cls._progress:
+            await cls._progress.wait_for(lambda: cls._processed >= target)
+
+    @classmethod
+    async def close(cls) -> None:
+        """Write the queued rows and stop the writer, rows queued from now on are written by their callers."""
+        if cls.task is None:
+            return
+        cls.queue = None
+        await cls._wait_for(cls._queued)
+        task, cls.task = cls.task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        default_logger.info("Chat history writer stopped")
+
+    @classmethod
+    async def _run(cls, queue: "asyncio.Queue[Dict[str, Any]]", batch_ready: asyncio.Event) -> None:
+        while True:
+            rows = [await queue.get()]
+            if queue.qsize() < config.CHAT_HISTORY_BATCH_SIZE - 1 and cls._processed + 1 > cls._flush_target:
+                try:
+                    await asyncio.wait_for(batch_ready.wait(), config.CHAT_HISTORY_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            batch_ready.clear()
+            while len(rows) < config.CHAT_HISTORY_BATCH_SIZE and not queue.empty():
+                rows.append(queue.get_nowait())
+            await cls._write(rows)
+            async with cls._progress:
+                cls._processed += len(rows)
+                cls._progress.notify_all()
+            if queue.qsize() >= config.CHAT_HISTORY_BATCH_SIZE:
+                batch_ready.set()
+
+    @staticmethod
+    async def _write(rows: List[Dict[str, Any]]) -> None:
+        """Insert a batch of rows, retrying a few times before giving up on them."""
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                async with get_db_context() as db:
+                    await PostgreChatHistoryRepository(db).create_many(rows)
+                CHAT_HISTORY_ROWS.labels(outcome="written").inc(len(rows))
+                return
+            except Exception as e:
+                if attempt == WRITE_ATTEMPTS:
+                    CHAT_HISTORY_ROWS.labels(outcome="dropped").inc(len(rows))
+                    default_logger.error("Chat history rows dropped", rows=len(rows), error=str(e))
+                    return
+                default_logger.warning("Chat history write failed, retrying", rows=len(rows), attempt=attempt, error=str(e))
+                await asyncio.sleep(WRITE_BACKOFF * attempt)
@@ -0,0 +1,47 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """
+    Shared aiohttp session for outgoing API calls.
+    One keep-alive connection pool per process, opened in the app lifespan and reused by every request.
+    """
+
+    session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    async def start(cls) -> aiohttp.ClientSession:
+        """Open the shared session."""
+        if cls.session is None or cls.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.HTTP_POOL_SIZE,
+                limit_per_host=config.HTTP_POOL_SIZE_PER_HOST,
+                keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+            cls.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            logger.info("HTTP client session opened")
+        return cls.session
+
+    @classmethod
+    async def get_session(cls) -> aiohttp.ClientSession:
+        """Get the shared session, opening it on first use outside the app (Celery workers, scripts)."""
+        if cls.session is None or cls.session.closed:
+            return await cls.start()
+        return cls.session
+
+    @classmethod
+    async def close(cls):
+        """Close the shared session and its pooled connections."""
+        if cls.session:
+            await cls.session.close()
+            cls.session = None
+            logger.info("HTTP client session closed")
@@ -0,0 +1,114 @@
+import time
+from abc import abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.core.config import config
+from app.core.exceptions import ExceptionBase
+from app.middleware.logging import default_logger
+from app.services.api import APIService
+from app.services.circuit_breaker import CircuitState
+
+# Statuses of a request whose cached content expired, was deleted or doesn't belong to the caller
+CACHED_CONTENT_REJECTED_STATUSES = {400, 403, 404}
+
+
+@dataclass
+class LLMRequest:
+    """
+    A prompt for an LLM provider.
+    With `cached_content` the prompt follows up on a prefix cached at the provider, providers that can't use it, or
+    that reject it, are sent the prompt built by `build_inline_prompt` with the prefix inline instead.
+    """
+
+    prompt: str
+    cached_content: Optional[str] = None
+    build_inline_prompt: Optional[Callable[[], Awaitable[str]]] = None
+    on_cached_content_rejected: Optional[Callable[[str], Awaitable[None]]] = None
+    _inline_prompt: Optional[str] = field(default=None, repr=False)
+
+    async def inline_prompt(self) -> str:
+        """The prompt with nothing left at the provider, built once."""
+        if self.cached_content is None:
+            return self.prompt
+        if self._inline_prompt is None:
+            self._inline_prompt = await self.build_inline_prompt()
+        return self._inline_prompt
+
+
+class LLMProvider(APIService):
+    """
+    Base of chat completion providers.
+    Providers are tried in order of `priority`, lowest first. A provider is healthy unless its circuit is open or it
+    recently missed its latency SLO, unhealthy providers are only used once the healthy ones failed.
+    Subclasses implement `_generate` and `_stream` for a plain prompt.
+    """
+
+    supports_context_cache = False
+
+    def __init__(self, name: str, priority: int, latency_slo: float, base_url: str, **kwargs: Any) -> None:
+        super().__init__(base_url=base_url, name=name, **kwargs)
+        self.name = name
+        self.priority = priority
+        self.latency_slo = latency_slo
+        self.degraded_until = 0.0
+
+    @abstractmethod
+    async def _generate(self, prompt: str, cached_content: Optional[str] = None, hedge: bool = False) -> str:
+        """Generate the answer to a prompt."""
+
+    @abstractmethod
+    def _stream(self, prompt: str, cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream the text deltas of the answer to a prompt."""
+
+    @property
+    def healthy(self) -> bool:
+        return self.circuit_breaker.state != CircuitState.OPEN and time.monotonic() >= self.degraded_until
+
+    def mark_slow(self) -> None:
+        """Demote the provider for LLM_DEGRADED_COOLDOWN after it missed its latency SLO."""
+        self.degraded_until = time.monotonic() + config.LLM_DEGRADED_COOLDOWN
+        default_logger.warning("LLM provider missed its latency SLO", provider=self.name, latency_slo=self.latency_slo)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State of the provider for health checks."""
+        return {"priority": self.priority, "healthy": self.healthy, "latency_slo": self.latency_slo, "circuit": self.circuit_breaker.state.value}
+
+    async def _cached_content_rejected(self, request: LLMRequest, error: ExceptionBase) -> bool:
+        """
+        Whether a request failed because the provider rejected its cached content, which is then forgotten.
+        Only client errors count, sending the whole document to a provider that is throttling or failing would add to its load.
+        """
+        if getattr(error, "upstream_status", None) not in CACHED_CONTENT_REJECTED_STATUSES:
+            return False
+        # The cached content may have expired or been deleted early, don't reference it again
+        default_logger.warning("Cached content rejected, sending the prompt inline", provider=self.name, error=error.description)
+        if request.on_cached_content_rejected is not None:
+            await request.on_cached_content_rejected(request.cached_content)
+        return True
+
+    async def generate(self, request: LLMRequest, hedge: bool = False) -> str:
+        """Generate the answer to a request, with its cached content if the provider supports it."""
+        if request.cached_content is not None and self.supports_context_cache:
+            try:
+                return await self._generate(request.prompt, request.cached_content, hedge)
+            except ExceptionBase as e:
+                if not await self._cached_content_rejected(request, e):
+                    raise
+        return await self._generate(await request.inline_prompt(), hedge=hedge)
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """Stream the answer to a request, falling back to the inline prompt if its cached content is rejected upfront."""
+        if request.cached_content is not None and self.supports_context_cache:
+            started = False
+            try:
+                async for text in self._stream(request.prompt, request.cached_content):
+                    started = True
+                    yield text
+                return
+            except ExceptionBase as e:
+                # Text already sent can't be taken back, only a stream that failed to open is retried
+                if started or not await self._cached_content_rejected(request, e):
+                    raise
+        async for text in self._stream(await request.inline_prompt()):
+            yield text
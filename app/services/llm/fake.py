@@ -0,0 +1,33 @@
+import re
+from typing import AsyncIterator, Optional
+
+from app.core.config import config
+from app.services.llm.base import LLMProvider
+
+QUESTION_PATTERN = re.compile(r"^\s*User:\s*(.*)$", re.MULTILINE)
+
+
+class FakeProvider(LLMProvider):
+    """Answers locally without calling any API, for development and tests."""
+
+    def __init__(self, name: str = "fake", priority: int = 0, latency_slo: float = 1, answer: str = "") -> None:
+        super().__init__(name=name, priority=priority, latency_slo=latency_slo, base_url="fake://")
+        self.answer = answer
+
+    @classmethod
+    def from_config(cls, priority: int) -> "FakeProvider":
+        return cls(priority=priority, answer=config.FAKE_LLM_ANSWER)
+
+    def _answer(self, prompt: str) -> str:
+        if self.answer:
+            return self.answer
+        questions = QUESTION_PATTERN.findall(prompt)
+        return f"This is a fake answer to: {questions[-1] if questions else prompt.strip()}"
+
+    async def _generate(self, prompt: str, cached_content: Optional[str] = None, hedge: bool = False) -> str:
+        return self._answer(prompt)
+
+    async def _stream(self, prompt: str, cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        words = self._answer(prompt).split(" ")
+        for index, word in enumerate(words):
+            yield word if index == len(words) - 1 else f"{word} "
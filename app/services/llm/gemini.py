@@ -0,0 +1,39 @@
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import config
+from app.schemas.api import GeminiChatRequest
+from app.services.llm.base import LLMProvider
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini generateContent API, the only provider that can reference context cached with GeminiContextCache."""
+
+    supports_context_cache = True
+
+    @classmethod
+    def from_config(cls, priority: int) -> "GeminiProvider":
+        return cls(name="gemini", priority=priority, latency_slo=config.GEMINI_LATENCY_SLO, base_url=config.GEMINI_BASE_URL)
+
+    @staticmethod
+    def _extract_text(response: Dict[str, Any]) -> str:
+        """Extract the answer text from a Gemini response or stream event."""
+        return response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+
+    async def _generate(self, prompt: str, cached_content: Optional[str] = None, hedge: bool = False) -> str:
+        response = await self._make_request(
+            method="POST",
+            endpoint=f"{config.GEMINI_ENDPOINT}?key={config.GEMINI_API_KEY}",
+            data=GeminiChatRequest(cachedContent=cached_content, contents=[{"parts": [{"text": prompt}]}]),
+            hedge=hedge,
+        )
+        return self._extract_text(response)
+
+    async def _stream(self, prompt: str, cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        async for event in self._stream_request(
+            method="POST",
+            endpoint=f"{config.GEMINI_STREAM_ENDPOINT}?alt=sse&key={config.GEMINI_API_KEY}",
+            data=GeminiChatRequest(cachedContent=cached_content, contents=[{"parts": [{"text": prompt}]}]),
+        ):
+            text = self._extract_text(event)
+            if text:
+                yield text
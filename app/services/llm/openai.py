@@ -0,0 +1,49 @@
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import config
+from app.schemas.api import OpenAIChatRequest
+from app.services.llm.base import LLMProvider
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any API compatible with the OpenAI chat completions API."""
+
+    def __init__(self, name: str, priority: int, latency_slo: float, base_url: str, api_key: str, model: str) -> None:
+        super().__init__(name=name, priority=priority, latency_slo=latency_slo, base_url=base_url, auth_type="bearer", bearer_token=api_key)
+        self.model = model
+
+    @classmethod
+    def from_config(cls, priority: int) -> "OpenAICompatibleProvider":
+        return cls(
+            name="openai",
+            priority=priority,
+            latency_slo=config.OPENAI_LATENCY_SLO,
+            base_url=config.OPENAI_BASE_URL,
+            api_key=config.OPENAI_API_KEY,
+            model=config.OPENAI_MODEL,
+        )
+
+    @staticmethod
+    def _extract_text(response: Dict[str, Any], key: str) -> str:
+        """Extract the answer text from a completion (`key` message) or a stream chunk (`key` delta)."""
+        choices = response.get("choices") or [{}]
+        return choices[0].get(key, {}).get("content") or ""
+
+    async def _generate(self, prompt: str, cached_content: Optional[str] = None, hedge: bool = False) -> str:
+        response = await self._make_request(
+            method="POST",
+            endpoint="/chat/completions",
+            data=OpenAIChatRequest(model=self.model, messages=[{"role": "user", "content": prompt}]),
+            hedge=hedge,
+        )
+        return self._extract_text(response, "message")
+
+    async def _stream(self, prompt: str, cached_content: Optional[str] = None) -> AsyncIterator[str]:
+        async for event in self._stream_request(
+            method="POST",
+            endpoint="/chat/completions",
+            data=OpenAIChatRequest(model=self.model, messages=[{"role": "user", "content": prompt}], stream=True),
+        ):
+            text = self._extract_text(event, "delta")
+            if text:
+                yield text
@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.core.metrics import LLM_FAILOVERS
+from app.middleware.logging import default_logger
+from app.services.llm.base import LLMProvider, LLMRequest
+from app.services.llm.fake import FakeProvider
+from app.services.llm.gemini import GeminiProvider
+from app.services.llm.openai import OpenAICompatibleProvider
+
+# Providers that can be listed in LLM_PROVIDERS
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    "gemini": GeminiProvider,
+    "openai": OpenAICompatibleProvider,
+    "fake": FakeProvider,
+}
+
+
+def providers_from_config() -> List[LLMProvider]:
+    """Build the providers listed in LLM_PROVIDERS, the first one has the highest priority."""
+    names = [name.strip() for name in config.LLM_PROVIDERS.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROVIDERS]
+    if unknown or not names:
+        raise ValueError(f"Unknown LLM providers: {', '.join(unknown)}" if unknown else "No LLM provider configured")
+    return [PROVIDERS[name].from_config(priority) for priority, name in enumerate(names)]
+
+
+class LLMRouter:
+    """
+    Send requests to the best available LLM provider, failing over to the next one when it errors or misses its SLO.
+    A provider that misses its latency SLO keeps running while the next one is tried, the first answer wins.
+    The router built from the config is shared within a process so the health state of its providers outlives requests.
+    """
+
+    _default: Optional["LLMRouter"] = None
+
+    def __init__(self, providers: Optional[List[LLMProvider]] = None):
+        self.providers = sorted(providers if providers is not None else providers_from_config(), key=lambda provider: provider.priority)
+
+    @classmethod
+    def default(cls) -> "LLMRouter":
+        """Get the router of the configured providers, creating it on first use."""
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    @classmethod
+    def snapshot_default(cls) -> Dict[str, Dict[str, Any]]:
+        """State of the configured providers, empty until the process used them."""
+        return cls._default.snapshot() if cls._default is not None else {}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """State of the providers for health checks."""
+        return {provider.name: provider.snapshot() for provider in self.providers}
+
+    def get(self, name: str) -> Optional[LLMProvider]:
+        """Get a configured provider by name."""
+        return next((provider for provider in self.providers if provider.name == name), None)
+
+    def candidates(self) -> List[LLMProvider]:
+        """Providers in the order they are tried, healthy ones first."""
+        return sorted(self.providers, key=lambda provider: (not provider.healthy, provider.priority))
+
+    def primary(self) -> LLMProvider:
+        """The provider a request goes to first."""
+        return self.candidates()[0]
+
+    @staticmethod
+    def _failed_over(provider: LLMProvider, reason: str, error: Optional[str] = None) -> None:
+        LLM_FAILOVERS.labels(provider=provider.name, reason=reason).inc()
+        default_logger.warning("Failing over from LLM provider", provider=provider.name, reason=reason, error=error)
+
+    async def _wait_for_answer(
+        self, pending: Dict["asyncio.Task[str]", LLMProvider], timeout: Optional[float]
+    ) -> Tuple[Optional[str], Optional[ExceptionBase]]:
+        """
+        Wait until one of the pending calls answers, all of them failed or the timeout passes.
+        Failed calls are removed from `pending`, the answer is None unless a call succeeded.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        error = None
+        while pending:
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            answer = None
+            for task in done:
+                provider = pending.pop(task)
+                if task.exception() is None:
+                    answer = task.result()
+                else:
+                    error = task.exception()
+                    self._failed_over(provider, "error", getattr(error, "description", str(error)))
+            if answer is not None:
+                return answer, error
+        return None, error
+
+    async def generate(self, request: LLMRequest, hedge: bool = False) -> str:
+        """Generate the answer to a request with the first provider that answers in time."""
+        candidates = self.candidates()
+        pending: Dict["asyncio.Task[str]", LLMProvider] = {}
+        last_error: Optional[BaseException] = None
+        try:
+            for index, provider in enumerate(candidates):
+                pending[asyncio.ensure_future(provider.generate(request, hedge=hedge))] = provider
+                # The last provider gets all the time it needs, the others only their SLO before the next one is tried
+                timeout = None if index == len(candidates) - 1 else provider.latency_slo
+                answer, error = await self._wait_for_answer(pending, timeout)
+                last_error = error or last_error
+                if answer is not None:
+                    return answer
+                if provider in pending.values():
+                    provider.mark_slow()
+                    self._failed_over(provider, "slow")
+
+            # Providers that missed their SLO may still answer
+            answer, error = await self._wait_for_answer(pending, None)
+            if answer is not None:
+                return answer
+            raise error or last_error or ExceptionBase(ErrorCode.UPSTREAM_UNAVAILABLE)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        """
+        Stream the answer to a request from the first provider that starts answering in time.
+        Once text was sent the provider can't be switched, failover only happens before the first delta.
+        """
+        candidates = self.candidates()
+        last_error: Optional[ExceptionBase] = None
+        for index, provider in enumerate(candidates):
+            deltas = provider.stream(request)
+            timeout = None if index == len(candidates) - 1 else provider.latency_slo
+            try:
+                first_text = await asyncio.wait_for(deltas.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                provider.mark_slow()
+                self._failed_over(provider, "slow")
+                await deltas.aclose()
+                continue
+            except ExceptionBase as e:
+                last_error = e
+                self._failed_over(provider, "error", e.description)
+                await deltas.aclose()
+                continue
+
+            yield first_text
+            async for text in deltas:
+                yield text
+            return
+
+        raise last_error or ExceptionBase(ErrorCode.UPSTREAM_UNAVAILABLE)
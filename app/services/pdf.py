@@ -1,25 +1,46 @@
-import io
-from typing import List, Optional
+import asyncio
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import PyPDF2
+from bson import ObjectId
 from fastapi import UploadFile
+from motor.motor_asyncio import AsyncIOMotorGridOut
 
+from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
 from app.middleware.logging import default_logger
 from app.repositories.mongodb.pdf import PDFMetadata, PDFRepository
+from app.schemas.pdf import PDF_LIST_FIELDS, PDFParseStatus
+from app.services.context_cache import GeminiContextCache
+from app.services.extraction import PDFTextExtractor
+from app.services.retrieval import PDFRetriever
+from app.tasks.celery_config import celery_app
+
+PDF_MAGIC_BYTES = b"%PDF-"
 
 
 class PDFService:
     def __init__(self):
         self.pdf_repository = PDFRepository()
+        self.text_extractor = PDFTextExtractor()
+        self.retriever = PDFRetriever(self.pdf_repository)
+        self.context_cache = GeminiContextCache()
 
     async def upload_pdf(self, title: str, filename: str, file: UploadFile, user_id: int) -> PDFMetadata:
-        """Upload a PDF file to MongoDB GridFS and store its metadata."""
+        """Stream a PDF file into MongoDB GridFS and store its metadata."""
         try:
-            # Read file content
-            file_content = await file.read()
+            # Reject uploads whose declared size is already over the limit
+            if file.size is not None and file.size > config.PDF_MAX_UPLOAD_SIZE:
+                raise ExceptionBase(ErrorCode.FILE_TOO_LARGE)
 
             # Upload to MongoDB
-            metadata = await self.pdf_repository.upload_pdf(user_id=user_id, filename=filename, title=title, file_content=file_content)
+            metadata = await self.pdf_repository.upload_pdf(
+                user_id=user_id, filename=filename, title=title, chunks=self._read_upload_chunks(file)
+            )
 
             default_logger.info("PDF uploaded successfully", user_id=user_id, filename=filename, title=title, pdf_id=metadata.id)
 
@@ -28,6 +49,25 @@ class PDFService:
             default_logger.error("Failed to upload PDF", user_id=user_id, filename=filename, title=title, error=str(e))
             raise
 
+    async def _read_upload_chunks(self, file: UploadFile) -> AsyncIterator[bytes]:
+        """
+        Yield the uploaded file in fixed-size chunks.
+        Raises before the offending chunk is stored if the content is not a PDF or exceeds the size limit.
+        """
+        total_size = 0
+        while chunk := await file.read(config.PDF_UPLOAD_CHUNK_SIZE):
+            if total_size == 0 and not chunk.startswith(PDF_MAGIC_BYTES):
+                raise ExceptionBase(ErrorCode.INVALID_FILE_TYPE)
+
+            total_size += len(chunk)
+            if total_size > config.PDF_MAX_UPLOAD_SIZE:
+                raise ExceptionBase(ErrorCode.FILE_TOO_LARGE)
+
+            yield chunk
+
+        if total_size == 0:
+            raise ExceptionBase(ErrorCode.INVALID_FILE_TYPE, description="The uploaded file is empty")
+
     async def get_user_pdfs(self, user_id: int) -> List[PDFMetadata]:
         """Get all PDFs uploaded by a specific user."""
         try:
@@ -38,6 +78,94 @@ class PDFService:
             default_logger.error("Failed to get user PDFs", user_id=user_id, error=str(e))
             raise
 
+    async def get_user_pdf(self, pdf_id: str, user_id: int, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Get the parse state of a PDF and the requested fields, or None if it doesn't exist or belongs to another user."""
+        return await self.pdf_repository.get_user_pdf(pdf_id, user_id, fields=fields)
+
+    async def open_pdf_file(self, file_id: str) -> AsyncIOMotorGridOut:
+        """Open the stored file of a PDF for streaming."""
+        return await self.pdf_repository.open_pdf_stream(file_id)
+
+    @staticmethod
+    def parse_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+        """
+        Parse a single `bytes=` Range header into an inclusive (start, end) byte range.
+        Returns None when the whole file should be sent, malformed and multi-range headers are ignored.
+        """
+        if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+            return None
+
+        start, _, end = range_header[len("bytes=") :].strip().partition("-")
+        try:
+            if not start:
+                # Suffix range, the last N bytes
+                suffix_length = int(end)
+                if suffix_length <= 0:
+                    raise ExceptionBase(ErrorCode.RANGE_NOT_SATISFIABLE)
+                return max(length - suffix_length, 0), length - 1
+            range_start, range_end = int(start), int(end) if end else length - 1
+        except ValueError:
+            return None
+
+        if end and range_start > range_end:
+            return None
+        if range_start >= length:
+            raise ExceptionBase(ErrorCode.RANGE_NOT_SATISFIABLE)
+        return range_start, min(range_end, length - 1)
+
+    @staticmethod
+    async def iter_pdf_file(grid_out: AsyncIOMotorGridOut, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes in [start, end] of a stored file, one GridFS chunk at a time."""
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(grid_out.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def list_user_pdfs(
+        self, user_id: int, limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of a user's PDFs, newest first, and the cursor of the next page.
+        The page size is capped by PDF_LIST_MAX_PAGE_SIZE and only the requested fields are loaded.
+        """
+        limit = min(limit or config.PDF_LIST_PAGE_SIZE, config.PDF_LIST_MAX_PAGE_SIZE)
+        if fields:
+            unknown_fields = sorted(set(fields) - set(PDF_LIST_FIELDS))
+            if unknown_fields:
+                raise ExceptionBase(ErrorCode.INVALID_INPUT, description=f"Unknown fields: {', '.join(unknown_fields)}")
+
+        after = self._decode_cursor(cursor) if cursor else None
+        pdfs, has_more = await self.pdf_repository.get_user_pdfs_page(user_id, limit=limit, after=after, fields=fields)
+        next_cursor = self._encode_cursor(pdfs[-1]["upload_date"], pdfs[-1]["id"]) if has_more else None
+
+        # upload_date is always read for the cursor, only return it when it was asked for
+        if fields and "upload_date" not in fields:
+            for pdf in pdfs:
+                pdf.pop("upload_date", None)
+
+        default_logger.info("Retrieved user PDFs page", user_id=user_id, pdf_count=len(pdfs), has_more=has_more)
+        return pdfs, next_cursor
+
+    @staticmethod
+    def _encode_cursor(upload_date: datetime, pdf_id: str) -> str:
+        """Encode the position of the last listed PDF into an opaque cursor."""
+        return base64.urlsafe_b64encode(f"{upload_date.isoformat()}|{pdf_id}".encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """Decode a list cursor back into the (upload_date, pdf_id) it points after."""
+        try:
+            upload_date, pdf_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            if not ObjectId.is_valid(pdf_id):
+                raise ValueError("Invalid PDF ID")
+            return datetime.fromisoformat(upload_date), pdf_id
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            raise ExceptionBase(ErrorCode.INVALID_INPUT, description="Invalid cursor")
+
     async def parse_pdf(self, pdf_id: str) -> bool:
         """Extract and save text content from a PDF."""
         try:
@@ -47,43 +175,65 @@ class PDFService:
                 default_logger.error("PDF metadata not found", pdf_id=pdf_id)
                 return False
 
+            # Skip extraction when a copy with the same content has already been parsed
+            if metadata.content_hash and await self.pdf_repository.reuse_parsed_text(pdf_id, metadata.content_hash):
+                default_logger.info("Reused parsed text of identical PDF", pdf_id=pdf_id, content_hash=metadata.content_hash)
+                return True
+
             # Get PDF file content
             file_content = await self.pdf_repository.get_pdf_file(metadata.file_id)
             if not file_content:
                 default_logger.error("PDF file content not found", pdf_id=pdf_id, file_id=metadata.file_id)
                 return False
 
-            # Parse PDF content
-            pdf_file = io.BytesIO(file_content)
+            # Parse PDF content in the extraction process pool, one checkpointed batch at a time
             try:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                if not pdf_reader.pages:
-                    default_logger.error("PDF has no pages", pdf_id=pdf_id)
-                    return False
+                # Staged on disk once, workers read the file from there
+                with self.text_extractor.staged(file_content) as path:
+                    page_count = metadata.page_count or await self.text_extractor.count_pages(path)
+                    if not page_count:
+                        default_logger.error("PDF has no pages", pdf_id=pdf_id)
+                        return False
+
+                    # Resume after the last page batch a previous attempt completed
+                    pages_done = metadata.pages_done or 0
+                    if pages_done:
+                        default_logger.info("Resuming PDF parse", pdf_id=pdf_id, pages_done=pages_done, page_count=page_count)
+                    await self.pdf_repository.update_parse_progress(pdf_id, pages_done=pages_done, page_count=page_count)
+
+                    for batch_start in range(pages_done, page_count, config.PDF_PARSE_BATCH_SIZE):
+                        batch_end = min(batch_start + config.PDF_PARSE_BATCH_SIZE, page_count)
+                        pages = await self.text_extractor.extract(path, batch_start, batch_end)
+
+                        page_texts = []
+                        for page_number, page_text, page_error in pages:
+                            if page_error:
+                                default_logger.error("Error extracting text from page", pdf_id=pdf_id, page_number=page_number, error=page_error)
+                            elif page_text and page_text.strip():
+                                page_texts.append((page_number, page_text))
+                            else:
+                                default_logger.warning("No text extracted from page", pdf_id=pdf_id, page_number=page_number)
+
+                        # Store the page texts apart from the metadata document and record the checkpoint
+                        await self.pdf_repository.save_pdf_pages(metadata.content_key, page_texts)
+                        await self.pdf_repository.update_parse_progress(pdf_id, pages_done=batch_end)
 
-                text_content = ""
-                for i, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_content += page_text + "\n"
-                        else:
-                            default_logger.warning("No text extracted from page", pdf_id=pdf_id, page_number=i + 1)
-                    except Exception as page_error:
-                        default_logger.error("Error extracting text from page", pdf_id=pdf_id, page_number=i + 1, error=str(page_error))
-                        continue
-
-                if not text_content.strip():
+                if not await self.pdf_repository.count_pdf_pages(metadata.content_key):
                     default_logger.error("No text content extracted from PDF", pdf_id=pdf_id)
                     return False
 
-                # Update metadata with parsed text
-                success = await self.pdf_repository.update_pdf_text(pdf_id, text_content)
+                # Build the retrieval index, chat indexes the PDF on its first question if this fails
+                try:
+                    await self.retriever.index_pdf(metadata)
+                except Exception as index_error:
+                    default_logger.error("Failed to build PDF retrieval index", pdf_id=pdf_id, error=str(index_error))
+
+                success = await self.pdf_repository.mark_parsed(pdf_id, page_count=page_count)
                 if not success:
                     default_logger.error("Failed to update PDF text content in database", pdf_id=pdf_id)
                     return False
 
-                default_logger.info("PDF parsed successfully", pdf_id=pdf_id, page_count=len(pdf_reader.pages))
+                default_logger.info("PDF parsed successfully", pdf_id=pdf_id, page_count=page_count)
                 return True
 
             except PyPDF2.PdfReadError as pdf_error:
@@ -97,33 +247,81 @@ class PDFService:
             default_logger.error("Failed to parse PDF", pdf_id=pdf_id, error=str(e))
             return False
 
-    async def select_pdf(self, pdf_id: str, user_id: int) -> Optional[PDFMetadata]:
-        """Select a PDF for chat."""
+    async def queue_parse(self, pdf_id: str) -> Optional[PDFParseStatus]:
+        """Queue a background parse job for a PDF unless one is already queued or running."""
+        if await self.pdf_repository.mark_parse_queued(pdf_id):
+            try:
+                # Publishing to the broker is blocking, keep it off the event loop
+                await asyncio.to_thread(celery_app.send_task, "parse_pdf", args=[pdf_id])
+            except Exception as e:
+                default_logger.error("Failed to queue PDF parse", pdf_id=pdf_id, error=str(e))
+                await self.pdf_repository.update_parse_status(pdf_id, PDFParseStatus.FAILED, error="Failed to queue parse job")
+                raise
+            default_logger.info("PDF parse queued", pdf_id=pdf_id)
+            return PDFParseStatus.QUEUED
+
         metadata = await self.pdf_repository.get_pdf_metadata(pdf_id)
-        if not metadata:
-            default_logger.warning("PDF not found for selection", pdf_id=pdf_id, user_id=user_id)
+        return metadata.parse_status if metadata else None
+
+    async def run_parse(self, pdf_id: str) -> bool:
+        """Run a parse job and record its status on the PDF metadata."""
+        await self.pdf_repository.update_parse_status(pdf_id, PDFParseStatus.RUNNING)
+        success = await self.parse_pdf(pdf_id)
+        if not success:
+            await self.pdf_repository.update_parse_status(pdf_id, PDFParseStatus.FAILED, error="Failed to parse PDF file")
+        return success
+
+    async def select_pdf(self, pdf_id: str, user_id: int) -> Optional[PDFMetadata]:
+        """Select a PDF for chat, queueing a parse job if it hasn't been parsed yet."""
+        selected = await self.select_pdfs([pdf_id], user_id)
+        return selected[0] if selected else None
+
+    async def select_pdfs(self, pdf_ids: List[str], user_id: int) -> Optional[List[PDFMetadata]]:
+        """
+        Select a workspace of PDFs to chat with together, queueing parse jobs for those that haven't been parsed yet.
+        Returns None if a PDF doesn't exist or the selection couldn't be stored.
+        """
+        pdf_ids = list(dict.fromkeys(pdf_ids))
+        if len(pdf_ids) > config.CHAT_WORKSPACE_MAX_PDFS:
+            raise ExceptionBase(ErrorCode.INVALID_INPUT, description=f"At most {config.CHAT_WORKSPACE_MAX_PDFS} PDFs can be selected")
+
+        pdfs = await asyncio.gather(*(self.pdf_repository.get_pdf_metadata(pdf_id) for pdf_id in pdf_ids))
+        missing = [pdf_id for pdf_id, metadata in zip(pdf_ids, pdfs) if not metadata]
+        if missing:
+            default_logger.warning("PDF not found for selection", pdf_ids=missing, user_id=user_id)
             return None
 
-        # Check if PDF is parsed
-        if not metadata.parsed:
-            success = await self.parse_pdf(pdf_id)
-            if not success:
-                default_logger.error("Failed to parse PDF during selection", pdf_id=pdf_id, user_id=user_id)
-                return None
-            # Get updated metadata
-            metadata = await self.pdf_repository.get_pdf_metadata(pdf_id)
+        # Check if PDFs are parsed
+        for metadata in pdfs:
+            if not metadata.parsed:
+                metadata.parse_status = await self.queue_parse(metadata.id)
 
-        # Store selected PDF in MongoDB
-        success = await self.pdf_repository.set_selected_pdf(user_id, pdf_id)
+        # Store selected PDFs in MongoDB
+        success = await self.pdf_repository.set_selected_pdfs(user_id, pdf_ids)
         if not success:
-            default_logger.error("Failed to store selected PDF", pdf_id=pdf_id, user_id=user_id)
+            default_logger.error("Failed to store selected PDFs", pdf_ids=pdf_ids, user_id=user_id)
             return None
 
-        default_logger.info("PDF selected successfully", pdf_id=pdf_id, user_id=user_id)
-        return metadata
+        # The document the user chatted with before is no longer needed at the provider, workspaces aren't cached there
+        await self.context_cache.release(str(user_id), keep_content_key=pdfs[0].content_key if len(pdfs) == 1 else None)
 
-    async def get_selected_pdf(self, user_id: int) -> Optional[PDFMetadata]:
-        """Get currently selected PDF for a specific user."""
+        default_logger.info("PDFs selected successfully", pdf_ids=pdf_ids, user_id=user_id)
+        return list(pdfs)
+
+    async def delete_pdf(self, pdf_id: str) -> bool:
+        """Delete a PDF, its stored file is kept while other uploads share the same content."""
+        success = await self.pdf_repository.delete_pdf(pdf_id)
+        if success:
+            default_logger.info("PDF deleted successfully", pdf_id=pdf_id)
+        else:
+            default_logger.error("Failed to delete PDF", pdf_id=pdf_id)
+        return success
+
+    async def get_selected_pdf(self, user_id: int, with_text: bool = False) -> Optional[PDFMetadata]:
+        """
+        Get currently selected PDF for a specific user.
+        The extracted text is only loaded when `with_text` is set.
+        """
         pdf_id = await self.pdf_repository.get_selected_pdf(user_id)
         if not pdf_id:
             default_logger.info("No PDF selected for user", user_id=user_id)
@@ -131,5 +329,18 @@ class PDFService:
 
         metadata = await self.pdf_repository.get_pdf_metadata(pdf_id)
         if metadata:
+            if with_text and metadata.parsed:
+                metadata.text_content = await self.pdf_repository.get_pdf_text(metadata)
             default_logger.info("Retrieved selected PDF", user_id=user_id, pdf_id=pdf_id)
         return metadata
+
+    async def get_selected_pdfs(self, user_id: int) -> List[PDFMetadata]:
+        """Get the PDFs of a user's workspace, in the order they were selected. PDFs deleted since are left out."""
+        pdf_ids = await self.pdf_repository.get_selected_pdfs(user_id)
+        if not pdf_ids:
+            default_logger.info("No PDF selected for user", user_id=user_id)
+            return []
+
+        pdfs = await asyncio.gather(*(self.pdf_repository.get_pdf_metadata(pdf_id) for pdf_id in pdf_ids))
+        default_logger.info("Retrieved selected PDFs", user_id=user_id, pdf_ids=pdf_ids)
+        return [metadata for metadata in pdfs if metadata]
@@ -0,0 +1,317 @@
+import asyncio
+import math
+import os
+from collections import Counter
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import config
+from app.middleware.logging import default_logger
+from app.repositories.mongodb.pdf import PDFMetadata, PDFRepository
+from app.services import vectors
+from app.services.text import CHARS_PER_TOKEN, estimate_tokens, tokenize
+
+# BM25 parameters, the usual defaults
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant, the usual default
+RRF_K = 60
+
+
+class RetrievalMode(str, Enum):
+    """How the document context of a question is chosen."""
+
+    BM25 = "bm25"
+    VECTOR = "vector"
+    FULL = "full"
+
+
+def chunk_pages(pages: List[Tuple[int, str]], chunk_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    """
+    Split page texts into overlapping chunks of about `chunk_tokens` tokens.
+    Chunks never span pages so every chunk can be cited by its page number.
+    """
+    chunk_chars = max(chunk_tokens, 1) * CHARS_PER_TOKEN
+    overlap_chars = min(max(overlap_tokens, 0), chunk_tokens // 2) * CHARS_PER_TOKEN
+    chunks = []
+    for page_number, text in pages:
+        words = text.split()
+        start = 0
+        while start < len(words):
+            # Take words until the chunk is full, always at least one
+            end, length = start, 0
+            while end < len(words) and (end == start or length + len(words[end]) + 1 <= chunk_chars):
+                length += len(words[end]) + 1
+                end += 1
+            chunks.append({"chunk_index": len(chunks), "page_number": page_number, "text": " ".join(words[start:end])})
+            if end == len(words):
+                break
+
+            # Step back over the overlap, but always move forward
+            next_start, overlap = end, 0
+            while next_start - 1 > start and overlap + len(words[next_start - 1]) + 1 <= overlap_chars:
+                overlap += len(words[next_start - 1]) + 1
+                next_start -= 1
+            start = next_start
+    return chunks
+
+
+def build_index(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add the term frequencies to each chunk and return the corpus statistics BM25 needs.
+    The chunks are the postings of the inverted index, they are looked up by the terms they contain.
+    """
+    doc_freq: Counter = Counter()
+    total_length = 0
+    for chunk in chunks:
+        term_freqs = Counter(tokenize(chunk["text"]))
+        chunk["term_freqs"] = dict(term_freqs)
+        chunk["terms"] = list(term_freqs)
+        chunk["length"] = sum(term_freqs.values())
+        total_length += chunk["length"]
+        doc_freq.update(term_freqs.keys())
+    return {
+        "chunk_count": len(chunks),
+        "avg_length": total_length / len(chunks) if chunks else 0.0,
+        "doc_freq": dict(doc_freq),
+    }
+
+
+def bm25_score(query_terms: List[str], chunk: Dict[str, Any], stats: Dict[str, Any]) -> float:
+    """Okapi BM25 score of a chunk for the query terms."""
+    chunk_count = stats["chunk_count"]
+    length_norm = 1 - BM25_B + BM25_B * chunk.get("length", 0) / (stats["avg_length"] or 1)
+    score = 0.0
+    for term in query_terms:
+        term_freq = chunk.get("term_freqs", {}).get(term, 0)
+        if not term_freq:
+            continue
+        doc_freq = stats["doc_freq"].get(term, 0)
+        idf = math.log(1 + (chunk_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        score += idf * term_freq * (BM25_K1 + 1) / (term_freq + BM25_K1 * length_norm)
+    return score
+
+
+def fuse_rankings(rankings: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merge the rankings of several documents by reciprocal rank fusion, weighted by how relevant each document is.
+    Scores of different documents aren't directly comparable, BM25 statistics are per document, so chunks are merged by
+    rank. Each document's ranks are weighted by its best `score` relative to the best of all documents, so a document that
+    only matches in passing doesn't get as many chunks in as the one the question is about.
+    """
+    best_scores = [max((chunk.get("score", 0.0) for chunk in chunks), default=0.0) for chunks in rankings]
+    top_score = max(best_scores, default=0.0)
+    scored = []
+    for document, chunks in enumerate(rankings):
+        weight = best_scores[document] / top_score if top_score > 0 else 1.0
+        scored.extend((weight / (RRF_K + rank), document, rank, chunk) for rank, chunk in enumerate(chunks))
+    return [chunk for _, _, _, chunk in sorted(scored, key=lambda item: (-item[0], item[1], item[2]))]
+
+
+def select_within_budget(chunks: List[Dict[str, Any]], top_k: int, token_budget: int) -> List[Dict[str, Any]]:
+    """Take chunks in the given order until `top_k` or the token budget is reached, returned in document order."""
+    selected, used_tokens = [], 0
+    for chunk in chunks:
+        if len(selected) >= top_k:
+            break
+        tokens = estimate_tokens(chunk["text"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used_tokens += tokens
+    return sorted(selected, key=lambda chunk: (chunk.get("document_index", 0), chunk["chunk_index"]))
+
+
+class PDFRetriever:
+    """
+    Retrieval over the chunks of a parsed PDF, with BM25 over an inverted index or cosine search over hashed TF-IDF vectors.
+    The index is built when the PDF is parsed and stored next to its pages, keyed by the same content key.
+    """
+
+    # Indexing in progress in this process by content key, concurrent first questions about a PDF share one
+    _indexing: Dict[str, "asyncio.Task[int]"] = {}
+
+    def __init__(self, pdf_repository: Optional[PDFRepository] = None):
+        self.pdf_repository = pdf_repository or PDFRepository()
+
+    async def index_pdf(self, pdf: PDFMetadata) -> int:
+        """Chunk the extracted pages of a PDF and store its BM25 index and vectors, returns the number of chunks."""
+        key = pdf.content_key
+        task = self._indexing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._index_pdf(pdf))
+            self._indexing[key] = task
+            task.add_done_callback(lambda _: self._indexing.pop(key, None))
+        # A caller that goes away doesn't cancel the indexing for the others
+        return await asyncio.shield(task)
+
+    async def _index_pdf(self, pdf: PDFMetadata) -> int:
+        pages = await self.pdf_repository.get_pdf_pages(pdf)
+        chunks = chunk_pages(pages, config.PDF_CHUNK_TOKENS, config.PDF_CHUNK_OVERLAP_TOKENS)
+        stats = build_index(chunks)
+        await self.pdf_repository.save_pdf_chunks(pdf.content_key, chunks, stats)
+
+        matrix, idf = await asyncio.to_thread(vectors.build_vectors, [chunk["text"] for chunk in chunks], config.PDF_VECTOR_DIM)
+        await self.pdf_repository.save_pdf_vectors(pdf.content_key, vectors.to_bytes(matrix), config.PDF_VECTOR_DIM, idf.tolist())
+        default_logger.info("PDF retrieval index built", pdf_id=pdf.id, content_key=pdf.content_key, chunk_count=len(chunks))
+        return len(chunks)
+
+    async def retrieve(
+        self,
+        pdf: PDFMetadata,
+        question: str,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        mode: Optional[RetrievalMode] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the chunks most relevant to a question that fit in the token budget, in document order.
+        In full mode every page is returned as is. PDFs parsed before retrieval existed are indexed on their first question.
+        """
+        top_k = top_k or config.CHAT_RETRIEVAL_TOP_K
+        token_budget = token_budget or config.CHAT_CONTEXT_TOKEN_BUDGET
+        mode = RetrievalMode(mode or config.CHAT_RETRIEVAL_MODE)
+        if mode == RetrievalMode.FULL:
+            pages = await self.pdf_repository.get_pdf_pages(pdf)
+            return [{"chunk_index": index, "page_number": page_number, "text": text} for index, (page_number, text) in enumerate(pages)]
+
+        chunks = await self._rank(pdf, question, top_k, mode)
+        selected = select_within_budget(chunks, top_k, token_budget)
+        default_logger.info("Retrieved PDF chunks", pdf_id=pdf.id, mode=mode.value, candidates=len(chunks), selected=len(selected))
+        return selected
+
+    async def retrieve_many(
+        self,
+        pdfs: List[PDFMetadata],
+        question: str,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        mode: Optional[RetrievalMode] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the chunks of several PDFs most relevant to a question, within one token budget.
+        The PDFs are ranked in parallel and their rankings fused, each chunk carries the `pdf_id` and `document_index` it
+        comes from. Chunks are returned grouped by PDF, in document order. Whole documents don't fit a shared budget, full
+        mode ranks with BM25. PDFs that don't match the question contribute nothing, unless none of them does.
+        """
+        top_k = top_k or config.CHAT_RETRIEVAL_TOP_K
+        token_budget = token_budget or config.CHAT_CONTEXT_TOKEN_BUDGET
+        mode = RetrievalMode(mode or config.CHAT_RETRIEVAL_MODE)
+        if mode == RetrievalMode.FULL:
+            mode = RetrievalMode.BM25
+
+        rankings = await asyncio.gather(*(self._rank(pdf, question, top_k, mode, fallback=False) for pdf in pdfs))
+        if not any(rankings):
+            # Nothing matches the question, fall back to the start of each document
+            rankings = await asyncio.gather(*(self.pdf_repository.get_pdf_chunks(pdf.content_key, limit=top_k) for pdf in pdfs))
+        for document_index, (pdf, chunks) in enumerate(zip(pdfs, rankings)):
+            for chunk in chunks:
+                chunk.update(pdf_id=pdf.id, document_index=document_index)
+
+        selected = select_within_budget(fuse_rankings(rankings), top_k, token_budget)
+        default_logger.info(
+            "Retrieved chunks of PDFs",
+            pdf_ids=[pdf.id for pdf in pdfs],
+            mode=mode.value,
+            candidates=sum(len(chunks) for chunks in rankings),
+            selected=len(selected),
+        )
+        return selected
+
+    async def _rank(self, pdf: PDFMetadata, question: str, top_k: int, mode: RetrievalMode, fallback: bool = True) -> List[Dict[str, Any]]:
+        """
+        Candidate chunks of a PDF for a question, best first, with their `score`. PDFs parsed before retrieval existed are
+        indexed here. Without `fallback` a PDF that doesn't match the question has no candidates.
+        """
+        query_terms = list(dict.fromkeys(tokenize(question)))
+        stats = await self.pdf_repository.get_chunk_stats(pdf.content_key, query_terms)
+        if stats is None or (mode == RetrievalMode.VECTOR and not stats.get("vector")):
+            await self.index_pdf(pdf)
+            stats = await self.pdf_repository.get_chunk_stats(pdf.content_key, query_terms)
+        if not stats or not stats["chunk_count"]:
+            return []
+
+        if mode == RetrievalMode.VECTOR:
+            chunks = await self._rank_by_vector(pdf, question, stats["vector"], top_k)
+        else:
+            chunks = await self._rank_by_bm25(pdf, query_terms, stats)
+        if not chunks and fallback:
+            # Nothing matches the question, fall back to the start of the document
+            chunks = await self.pdf_repository.get_pdf_chunks(pdf.content_key, limit=top_k)
+        return chunks
+
+    async def _rank_by_bm25(self, pdf: PDFMetadata, query_terms: List[str], stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Chunks containing a query term, best BM25 score first."""
+        if not query_terms:
+            return []
+        candidates = await self.pdf_repository.find_pdf_chunks(pdf.content_key, query_terms)
+        for chunk in candidates:
+            chunk["score"] = bm25_score(query_terms, chunk, stats)
+        ranked = sorted(candidates, key=lambda chunk: (-chunk["score"], chunk["chunk_index"]))
+        return [chunk for chunk in ranked if chunk["score"] > 0]
+
+    async def _rank_by_vector(self, pdf: PDFMetadata, question: str, vector: Dict[str, Any], top_k: int) -> List[Dict[str, Any]]:
+        """Chunks most similar to the question by cosine similarity, best first."""
+        matrix = await self._load_matrix(pdf.content_key, vector["file_id"])
+        query = vectors.query_vector(question, np.asarray(vector["idf"], dtype=np.float32))
+        # Take more than top_k so chunks skipped for the token budget can be replaced
+        best = vectors.top_k_cosine(matrix, query, top_k * 2)
+        if not best:
+            return []
+        chunks = await self.pdf_repository.get_pdf_chunks_by_index(pdf.content_key, [index for index, _ in best])
+        scores = dict(best)
+        for chunk in chunks:
+            chunk["score"] = scores[chunk["chunk_index"]]
+        return sorted(chunks, key=lambda chunk: -chunk["score"])
+
+    async def _load_matrix(self, content_key: str, file_id: str) -> np.ndarray:
+        """
+        Memory-map the chunk vector matrix of a content from the local cache, downloading it from GridFS on a miss.
+        Files are named after the GridFS file ID, a rebuilt matrix never collides with a cached one.
+        """
+        path = Path(config.PDF_VECTOR_CACHE_DIR) / f"{content_key}-{file_id}.npy"
+        try:
+            # Mark the matrix as recently used for the cache size cap
+            os.utime(path)
+        except FileNotFoundError:
+            data = await self.pdf_repository.get_pdf_vectors(file_id)
+            await asyncio.to_thread(self._write_cache_file, path, data)
+            await asyncio.to_thread(self._prune_cache, content_key, path)
+        return np.load(path, mmap_mode="r")
+
+    @staticmethod
+    def _prune_cache(content_key: str, keep: Path) -> None:
+        """
+        Remove the matrices of a content other than `keep`, left over from a previous index, then the least recently used
+        ones while the cache is over its size cap. Matrices of deleted PDFs age out through the cap.
+        """
+        cache_dir = keep.parent
+        for path in cache_dir.glob(f"{content_key}-*.npy"):
+            if path != keep:
+                path.unlink(missing_ok=True)
+
+        files = []
+        for path in cache_dir.glob("*.npy"):
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda file: file[0].st_mtime):
+            if total <= config.PDF_VECTOR_CACHE_MAX_BYTES:
+                break
+            if path != keep:
+                path.unlink(missing_ok=True)
+                total -= stat.st_size
+
+    @staticmethod
+    def _write_cache_file(path: Path, data: bytes) -> None:
+        """Write a cache file atomically, concurrent readers never see a partial matrix."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
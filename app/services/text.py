@@ -0,0 +1,22 @@
+import math
+import re
+from typing import List
+
+# Rough characters per token of English text, used to keep prompts within budget without a tokenizer
+CHARS_PER_TOKEN = 4
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by can could did do does for from had has have he her his how i if in into is it its of on or our she so "
+    "than that the their them then there these they this to was we were what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word terms of a text, stopwords and single characters are dropped."""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of model tokens in a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
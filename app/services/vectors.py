@@ -0,0 +1,66 @@
+import io
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.text import tokenize
+
+# Character trigrams of each term are hashed next to the term itself, so word forms that share a stem
+# ("grow", "growth", "grew") land partly in the same dimensions and paraphrases still score
+TRIGRAM_SIZE = 3
+
+
+def feature_bucket(feature: str, dim: int) -> int:
+    """Stable hash bucket of a feature, Python's hash() is salted per process."""
+    return zlib.crc32(feature.encode("utf-8")) % dim
+
+
+def term_counts(text: str, dim: int) -> np.ndarray:
+    """Hashed counts of the terms and term trigrams of a text."""
+    counts = np.zeros(dim, dtype=np.float32)
+    buckets = []
+    for term in tokenize(text):
+        padded = f"<{term}>"
+        buckets.append(feature_bucket(f"w:{term}", dim))
+        buckets.extend(feature_bucket(padded[i : i + TRIGRAM_SIZE], dim) for i in range(len(padded) - TRIGRAM_SIZE + 1))
+    np.add.at(counts, buckets, 1)
+    return counts
+
+
+def weigh(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """Sublinear TF-IDF weighting of count rows, L2 normalized so a dot product is the cosine similarity."""
+    weights = np.log1p(counts) * idf
+    norms = np.linalg.norm(weights, axis=-1, keepdims=True)
+    return (weights / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def build_vectors(texts: List[str], dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed TF-IDF vectors of the chunk texts as a (chunks, dim) float32 matrix, with the IDF weights queries need."""
+    counts = np.vstack([term_counts(text, dim) for text in texts]) if texts else np.zeros((0, dim), dtype=np.float32)
+    doc_freq = np.count_nonzero(counts, axis=0)
+    idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+    return weigh(counts, idf), idf
+
+
+def query_vector(text: str, idf: np.ndarray) -> np.ndarray:
+    """Vector of a question in the space of a PDF's chunk matrix."""
+    return weigh(term_counts(text, len(idf)), idf)
+
+
+def top_k_cosine(matrix: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """Indexes and scores of the `k` rows most similar to the query, best first, rows with no overlap are dropped."""
+    if not len(matrix) or k <= 0:
+        return []
+    scores = matrix @ query
+    k = min(k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [(int(index), float(scores[index])) for index in best if scores[index] > 0]
+
+
+def to_bytes(matrix: np.ndarray) -> bytes:
+    """Serialize a matrix in .npy format, the stored file can be memory-mapped as is."""
+    buffer = io.BytesIO()
+    np.save(buffer, matrix, allow_pickle=False)
+    return buffer.getvalue()
@@ -20,6 +20,9 @@ celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
     task_routes={
-        # "task-name": {"queue": f"{queue_prefix}_{env_suffix}"},
+        "parse_pdf": {"queue": config.QUEUE_NAME},
     },
+    # Prefork children are daemonic and can't start the text extraction process pool, a solo worker runs parses in its
+    # main process and spreads each one across all cores instead. Scale out with more workers.
+    worker_pool="solo",
 )
@@ -0,0 +1,28 @@
+import asyncio
+
+from celery.signals import worker_process_shutdown
+
+from app.db.mongodb.mongodb import MongoDB
+from app.services.extraction import PDFTextExtractor
+from app.services.pdf import PDFService
+from app.tasks.celery_config import celery_app
+
+
+async def _parse_pdf(pdf_id: str) -> bool:
+    try:
+        return await PDFService().run_parse(pdf_id)
+    finally:
+        # Motor clients are bound to the event loop that created them and every task runs on a new loop
+        await MongoDB.close()
+
+
+@celery_app.task(name="parse_pdf")
+def parse_pdf_task(pdf_id: str) -> bool:
+    """Extract and save the text content of a PDF in the background."""
+    return asyncio.run(_parse_pdf(pdf_id))
+
+
+@worker_process_shutdown.connect
+def shutdown_text_extractor(**kwargs) -> None:
+    """Stop the text extraction process pool together with the worker process."""
+    PDFTextExtractor.shutdown()
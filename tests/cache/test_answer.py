@@ -0,0 +1,79 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.cache.answer import AnswerCache, answer_cache_key, normalize_question
+from app.cache.lru import TTLCache
+
+
+@pytest.fixture
+def answer_cache():
+    AnswerCache._local = None
+    cache = AnswerCache()
+    cache.redis.get = AsyncMock(return_value=None)
+    cache.redis.set = AsyncMock()
+    yield cache
+    AnswerCache._local = None
+
+
+class TestTTLCache:
+    def test_evicts_least_recently_used(self):
+        # Arrange
+        cache = TTLCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        # Act
+        cache.set("c", 3)
+
+        # Assert
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_expires_entries(self):
+        # Arrange
+        cache = TTLCache(max_entries=2, ttl=60)
+        with patch("app.cache.lru.time.monotonic", return_value=100):
+            cache.set("a", 1)
+
+        # Act & Assert
+        with patch("app.cache.lru.time.monotonic", return_value=161):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestAnswerCache:
+    def test_key_ignores_question_formatting(self):
+        assert normalize_question("  What is the   DEADLINE?? ") == "what is the deadline"
+        assert answer_cache_key("hash", "What is the deadline?", "1") == answer_cache_key("hash", "what is the deadline", "1")
+        assert answer_cache_key("hash", "What is the deadline?", "1") != answer_cache_key("hash", "What is the deadline?", "2")
+        assert answer_cache_key("hash", "What is the deadline?", "1") != answer_cache_key("other", "What is the deadline?", "1")
+
+    @pytest.mark.asyncio
+    async def test_redis_hit_fills_local_cache(self, answer_cache):
+        # Arrange
+        answer_cache.redis.get.return_value = "cached answer"
+
+        # Act
+        first = await answer_cache.get("key")
+        second = await answer_cache.get("key")
+
+        # Assert
+        assert first == second == "cached answer"
+        answer_cache.redis.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_redis_errors_are_misses(self, answer_cache):
+        # Arrange
+        answer_cache.redis.get.side_effect = ConnectionError("redis down")
+        answer_cache.redis.set.side_effect = ConnectionError("redis down")
+
+        # Act
+        missed = await answer_cache.get("key")
+        await answer_cache.set("key", "answer")
+
+        # Assert
+        assert missed is None
+        assert await answer_cache.get("key") == "answer"
@@ -0,0 +1,134 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.cache.single_flight import SingleFlight, lock_ttl
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete_if_equal(self, key, value):
+        if self.values.get(key) == value:
+            del self.values[key]
+            return True
+        return False
+
+
+@pytest.fixture
+def single_flight():
+    flight = SingleFlight("test")
+    flight.redis = FakeRedis()
+    return flight
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_call(self, single_flight):
+        # Arrange
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        # Act
+        results = await asyncio.gather(*(single_flight.do("key", fn) for _ in range(5)))
+
+        # Assert
+        assert results == ["answer"] * 5
+        assert len(calls) == 1
+        assert single_flight.redis.values == {":test:result:key": "answer"}
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared_and_not_cached(self, single_flight):
+        # Arrange
+        fn = AsyncMock(side_effect=ValueError("upstream failed"))
+
+        # Act
+        results = await asyncio.gather(single_flight.do("key", fn), single_flight.do("key", fn), return_exceptions=True)
+
+        # Assert
+        assert all(isinstance(result, ValueError) for result in results)
+        fn.assert_called_once()
+        assert single_flight.redis.values == {}
+        assert SingleFlight._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_waits_for_result_of_other_worker(self, single_flight):
+        # Arrange
+        single_flight.redis.values[":test:lock:key"] = "other-worker"
+        fn = AsyncMock(return_value="own answer")
+
+        async def publish():
+            await asyncio.sleep(0.02)
+            single_flight.redis.values[":test:result:key"] = "shared answer"
+            del single_flight.redis.values[":test:lock:key"]
+
+        # Act
+        with patch("app.cache.single_flight.config.CHAT_SINGLE_FLIGHT_POLL_INTERVAL", 0.005):
+            result, _ = await asyncio.gather(single_flight.do("key", fn), publish())
+
+        # Assert
+        assert result == "shared answer"
+        fn.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_calls_itself_when_other_worker_gives_up(self, single_flight):
+        # Arrange
+        single_flight.redis.values[":test:lock:key"] = "other-worker"
+        fn = AsyncMock(return_value="own answer")
+
+        async def give_up():
+            await asyncio.sleep(0.02)
+            del single_flight.redis.values[":test:lock:key"]
+
+        # Act
+        with patch("app.cache.single_flight.config.CHAT_SINGLE_FLIGHT_POLL_INTERVAL", 0.005):
+            result, _ = await asyncio.gather(single_flight.do("key", fn), give_up())
+
+        # Assert
+        assert result == "own answer"
+        fn.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_runs_without_redis(self, single_flight):
+        # Arrange
+        single_flight.redis.set = AsyncMock(side_effect=ConnectionError("redis down"))
+
+        # Act
+        result = await single_flight.do("key", AsyncMock(return_value="answer"))
+
+        # Assert
+        assert result == "answer"
+
+    def test_lock_ttl_covers_retries_queueing_and_failover(self):
+        # Act
+        with patch.multiple(
+            "app.cache.single_flight.config",
+            CHAT_SINGLE_FLIGHT_LOCK_TTL=None,
+            LLM_PROVIDERS="gemini,openai",
+            GEMINI_LATENCY_SLO=20,
+            API_RETRY_ATTEMPTS=3,
+            API_REQUEST_TIMEOUT=30,
+            API_RETRY_MAX_WAIT=10,
+            CONCURRENCY_QUEUE_TIMEOUT=10,
+        ):
+            derived = lock_ttl()
+
+        # Assert
+        assert derived == 20 + 3 * (10 + 30) + 2 * 10
+        with patch("app.cache.single_flight.config.CHAT_SINGLE_FLIGHT_LOCK_TTL", 60):
+            assert lock_ttl() == 60
@@ -0,0 +1,65 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.db.mongodb.indexes import MONGO_INDEXES, MongoIndex, ensure_indexes, get_missing_indexes
+
+
+@pytest.fixture
+def mock_database():
+    collections = {}
+
+    def get_collection(name):
+        if name not in collections:
+            collection = MagicMock()
+            collection.create_index = AsyncMock()
+            collection.index_information = AsyncMock(return_value={"_id_": {"key": [("_id", 1)]}})
+            collections[name] = collection
+        return collections[name]
+
+    database = MagicMock()
+    database.__getitem__.side_effect = get_collection
+    with patch("app.db.mongodb.indexes.MongoDB.get_database", AsyncMock(return_value=database)):
+        yield get_collection
+
+
+class TestMongoIndexes:
+    def test_index_name_matches_mongodb_default(self):
+        index = MongoIndex(collection="pdf_metadata", keys=[("user_id", 1), ("upload_date", -1)])
+        assert index.name == "user_id_1_upload_date_-1"
+
+    @pytest.mark.asyncio
+    async def test_ensure_indexes_creates_registered_indexes(self, mock_database):
+        # Act
+        failed = await ensure_indexes()
+
+        # Assert
+        assert failed == []
+        mock_database("selected_pdfs").create_index.assert_called_once_with([("user_id", 1)], name="user_id_1", unique=True)
+        assert mock_database("pdf_metadata").create_index.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_ensure_indexes_reports_failures(self, mock_database):
+        # Arrange
+        mock_database("selected_pdfs").create_index.side_effect = Exception("duplicate key")
+
+        # Act
+        failed = await ensure_indexes()
+
+        # Assert
+        assert failed == ["user_id_1"]
+
+    @pytest.mark.asyncio
+    async def test_get_missing_indexes(self, mock_database):
+        # Arrange
+        mock_database("selected_pdfs").index_information.return_value = {
+            "_id_": {"key": [("_id", 1)]},
+            "user_id_1": {"key": [("user_id", 1)], "unique": True},
+        }
+
+        # Act
+        missing = await get_missing_indexes()
+
+        # Assert
+        assert "selected_pdfs" not in [index["collection"] for index in missing]
+        assert len(missing) == len(MONGO_INDEXES) - 1
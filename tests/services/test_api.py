@@ -0,0 +1,190 @@
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.config import config
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.schemas.api import GeminiChatRequest
+from app.services.api import APIService, parse_retry_after
+from app.services.circuit_breaker import CircuitBreaker, CircuitState
+from app.services.concurrency_limiter import AdaptiveLimiter
+from app.services.http_client import HTTPClient
+
+
+@pytest_asyncio.fixture
+async def api_server():
+    peers = set()
+    calls = {"flaky": 0, "unavailable": 0, "throttled": 0}
+
+    async def generate(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        return web.json_response({"echo": body["contents"][0]["parts"][0]["text"]})
+
+    async def stream(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for text in ["Hel", "lo"]:
+            await response.write(f'data: {{"text": "{text}"}}\r\n\r\n'.encode())
+        return response
+
+    async def failing(request):
+        return web.json_response({"error": "invalid request"}, status=400)
+
+    async def flaky(request):
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            return web.json_response({"error": "overloaded"}, status=503, headers={"Retry-After": "0"})
+        return web.json_response({"ok": True})
+
+    async def unavailable(request):
+        calls["unavailable"] += 1
+        return web.json_response({"error": "unavailable"}, status=503)
+
+    async def throttled(request):
+        calls["throttled"] += 1
+        return web.json_response({"error": "quota exceeded"}, status=429, headers={"Retry-After": "120"})
+
+    app = web.Application()
+    app.router.add_post("/generate", generate)
+    app.router.add_post("/stream", stream)
+    app.router.add_post("/failing", failing)
+    app.router.add_post("/flaky", flaky)
+    app.router.add_post("/unavailable", unavailable)
+    app.router.add_post("/throttled", throttled)
+    server = TestServer(app)
+    await server.start_server()
+    with patch("app.services.api.config.API_RETRY_BASE_WAIT", 0.001):
+        yield server, peers, calls
+    await server.close()
+    await HTTPClient.close()
+    CircuitBreaker._breakers.clear()
+    AdaptiveLimiter._limiters.clear()
+
+
+class TestAPIService:
+    @pytest.mark.asyncio
+    async def test_make_request_reuses_pooled_connection(self, api_server):
+        # Arrange
+        server, peers, _ = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+        request = GeminiChatRequest(contents=[{"parts": [{"text": "hello"}]}])
+
+        # Act
+        responses = [await service._make_request(method="POST", endpoint="/generate", data=request) for _ in range(3)]
+
+        # Assert
+        assert responses == [{"echo": "hello"}] * 3
+        assert len(peers) == 1
+
+    @pytest.mark.asyncio
+    async def test_make_request_raises_api_error(self, api_server):
+        # Arrange
+        server, _, _ = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await service._make_request(method="POST", endpoint="/failing", data=GeminiChatRequest(contents=[]))
+        assert exc_info.value.code == ErrorCode.API_ERROR.code
+        assert exc_info.value.description == "invalid request"
+
+    @pytest.mark.asyncio
+    async def test_stream_request_yields_events(self, api_server):
+        # Arrange
+        server, _, _ = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+
+        # Act
+        events = [event async for event in service._stream_request(method="POST", endpoint="/stream")]
+
+        # Assert
+        assert events == [{"text": "Hel"}, {"text": "lo"}]
+
+    @pytest.mark.asyncio
+    async def test_requests_keep_connect_timeout(self, api_server):
+        # Arrange
+        server, _, _ = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+        session = await HTTPClient.get_session()
+
+        # Act
+        with patch.object(session, "request", wraps=session.request) as spy:
+            await service._make_request(method="POST", endpoint="/generate", data=GeminiChatRequest(contents=[{"parts": [{"text": "hi"}]}]))
+            [event async for event in service._stream_request(method="POST", endpoint="/stream")]
+
+        # Assert
+        timeouts = [call.kwargs["timeout"] for call in spy.call_args_list]
+        assert [timeout.connect for timeout in timeouts] == [config.HTTP_CONNECT_TIMEOUT] * 2
+
+    @pytest.mark.asyncio
+    async def test_make_request_retries_retryable_status(self, api_server):
+        # Arrange
+        server, _, calls = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+
+        # Act
+        response = await service._make_request(method="POST", endpoint="/flaky")
+
+        # Assert
+        assert response == {"ok": True}
+        assert calls["flaky"] == 3
+        assert service.circuit_breaker.state == CircuitState.CLOSED
+
+    @pytest.mark.asyncio
+    async def test_make_request_does_not_wait_past_max_retry_after(self, api_server):
+        # Arrange
+        server, _, calls = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"))
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await service._make_request(method="POST", endpoint="/throttled")
+        assert exc_info.value.code == ErrorCode.API_ERROR.code
+        assert calls["throttled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_opens_and_fails_fast(self, api_server):
+        # Arrange
+        server, _, calls = api_server
+        with patch("app.services.circuit_breaker.config.CIRCUIT_BREAKER_FAILURE_THRESHOLD", 2):
+            service = APIService(base_url=str(server.make_url("")).rstrip("/"), name="test-upstream")
+
+        # Act
+        for _ in range(2):
+            with pytest.raises(ExceptionBase):
+                await service._make_request(method="POST", endpoint="/unavailable")
+        with pytest.raises(ExceptionBase) as exc_info:
+            await service._make_request(method="POST", endpoint="/unavailable")
+
+        # Assert
+        assert exc_info.value.code == ErrorCode.UPSTREAM_UNAVAILABLE.code
+        assert calls["unavailable"] == 6
+        assert CircuitBreaker.snapshot_all()["test-upstream"]["state"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_overloaded_upstream_shrinks_concurrency_limit(self, api_server):
+        # Arrange
+        server, _, _ = api_server
+        service = APIService(base_url=str(server.make_url("")).rstrip("/"), name="test-upstream")
+        initial_limit = service.limiter.snapshot()["limit"]
+
+        # Act
+        response = await service._make_request(method="POST", endpoint="/flaky")
+        events = [event async for event in service._stream_request(method="POST", endpoint="/stream")]
+
+        # Assert
+        assert response == {"ok": True}
+        assert len(events) == 2
+        assert service.limiter.snapshot()["limit"] < initial_limit
+        assert service.limiter.snapshot()["in_flight"] == 0
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after("3") == 3.0
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert parse_retry_after("soon") is None
+        assert parse_retry_after(None) is None
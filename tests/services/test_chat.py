@@ -0,0 +1,257 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.services.chat import ChatService
+from app.services.llm.router import LLMRouter
+
+
+def gemini_event(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+@pytest.fixture
+def mock_chat_history_repository():
+    with patch("app.services.chat.PostgreChatHistoryRepository") as mock:
+        mock.return_value.create = AsyncMock()
+        yield mock.return_value
+
+
+@pytest.fixture
+def mock_chat_session_repository():
+    with patch("app.services.chat.PostgreChatSessionRepository") as mock:
+        mock.return_value.update_summary = AsyncMock(return_value=True)
+        yield mock.return_value
+
+
+def chat_turn(id, question, answer):
+    return MagicMock(id=id, question=question, answer=answer)
+
+
+@pytest.fixture
+def chat_service():
+    # Providers are shared within a process, start every test with fresh ones
+    LLMRouter._default = None
+    service = ChatService(db=MagicMock())
+    service.retriever = MagicMock(retrieve=AsyncMock(return_value=[{"chunk_index": 0, "page_number": 1, "text": "context"}]))
+    service.answer_cache = MagicMock(get=AsyncMock(return_value=None), set=AsyncMock())
+    return service
+
+
+@asynccontextmanager
+async def fake_db_context():
+    yield MagicMock()
+
+
+class TestChatService:
+    @pytest.mark.asyncio
+    async def test_chat_pdf_stream_yields_deltas_and_saves_answer(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        async def stream_request(**kwargs):
+            for text in ["The answer", " is 42."]:
+                yield gemini_event(text)
+
+        chat_service.llm.providers[0]._stream_request = stream_request
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        with patch("app.services.chat.get_db_context", fake_db_context):
+            deltas = [text async for text in chat_service.chat_pdf_stream("What is the answer?", [pdf], "1")]
+
+        # Assert
+        assert deltas == ["The answer", " is 42."]
+        saved = mock_chat_history_repository.create.call_args.args[0]
+        assert saved["answer"] == "The answer is 42."
+        assert saved["user_id"] == 1
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_serves_cached_answer_and_saves_history(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        chat_service.answer_cache.get.return_value = "cached answer"
+        chat_service.llm.providers[0]._make_request = AsyncMock()
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        response = await chat_service.chat_pdf("Summarize this", [pdf], "1")
+
+        # Assert
+        assert response.answer == "cached answer"
+        assert response.cached is True
+        chat_service.llm.providers[0]._make_request.assert_not_called()
+        assert mock_chat_history_repository.create.call_args.args[0]["answer"] == "cached answer"
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_bypasses_cache_when_opted_out(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        chat_service.llm.providers[0]._make_request = AsyncMock(return_value=gemini_event("fresh answer"))
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        response = await chat_service.chat_pdf("Summarize this", [pdf], "1", use_cache=False)
+
+        # Assert
+        assert response.answer == "fresh answer"
+        assert response.cached is False
+        chat_service.answer_cache.get.assert_not_called()
+        chat_service.answer_cache.set.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_coalesces_identical_questions(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        async def make_request(**kwargs):
+            await asyncio.sleep(0.01)
+            return gemini_event("shared answer")
+
+        chat_service.llm.providers[0]._make_request = AsyncMock(side_effect=make_request)
+        chat_service.single_flight.redis = MagicMock(set=AsyncMock(side_effect=ConnectionError("redis down")))
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        responses = await asyncio.gather(chat_service.chat_pdf("What is the deadline?", [pdf], "1"), chat_service.chat_pdf("what is the deadline", [pdf], "2"))
+
+        # Assert
+        assert [response.answer for response in responses] == ["shared answer", "shared answer"]
+        chat_service.llm.providers[0]._make_request.assert_called_once()
+        assert mock_chat_history_repository.create.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_queues_stand_alone_turn(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        chat_service.answer_cache.get.return_value = "cached answer"
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        with patch("app.services.chat.ChatHistoryWriter.enqueue", return_value=True) as mock_enqueue:
+            response = await chat_service.chat_pdf("Summarize this", [pdf], "1")
+
+        # Assert
+        assert response.answer == "cached answer"
+        assert mock_enqueue.call_args.args[0] == {"user_id": 1, "question": "Summarize this", "answer": "cached answer", "session_id": None}
+        mock_chat_history_repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_follows_up_on_session(self, chat_service, mock_chat_history_repository, mock_chat_session_repository):
+        # Arrange
+        session = MagicMock(id=1, session_id=uuid.uuid4(), summary="The user asked about the contract.", summarized_until=3)
+        mock_chat_session_repository.get_user_session = AsyncMock(return_value=session)
+        mock_chat_history_repository.get_session_turns = AsyncMock(return_value=[chat_turn(4, "Who signed it?", "Alice and Bob.")])
+        chat_service.llm.providers[0]._make_request = AsyncMock(return_value=gemini_event("On March 3rd."))
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        response = await chat_service.chat_pdf("When did they sign?", [pdf], "1", session_id=session.session_id)
+
+        # Assert
+        assert response.session_id == session.session_id
+        mock_chat_history_repository.get_session_turns.assert_called_once_with(session.session_id, after_id=3)
+        prompt = chat_service.llm.providers[0]._make_request.call_args.kwargs["data"].contents[0]["parts"][0]["text"]
+        assert "The user asked about the contract." in prompt
+        assert "User: Who signed it?\nAssistant: Alice and Bob." in prompt
+        chat_service.retriever.retrieve.assert_called_once_with(pdf, "Who signed it?\nWhen did they sign?")
+        chat_service.answer_cache.get.assert_not_called()
+        assert mock_chat_history_repository.create.call_args.args[0]["session_id"] == session.session_id
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_rejects_unknown_session(self, chat_service, mock_chat_history_repository, mock_chat_session_repository):
+        # Arrange
+        mock_chat_session_repository.get_user_session = AsyncMock(return_value=None)
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await chat_service.chat_pdf("When did they sign?", [pdf], "1", session_id=uuid.uuid4())
+        assert exc_info.value.code == ErrorCode.CHAT_SESSION_NOT_FOUND.code
+        mock_chat_history_repository.create.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_compacts_turns_beyond_window(self, chat_service, mock_chat_history_repository, mock_chat_session_repository):
+        # Arrange
+        session = MagicMock(id=1, session_id=uuid.uuid4(), summary=None, summarized_until=0)
+        turns = [chat_turn(id, f"question {id}", f"answer {id}") for id in range(1, 5)]
+        mock_chat_session_repository.get_user_session = AsyncMock(return_value=session)
+        mock_chat_history_repository.get_session_turns = AsyncMock(return_value=turns)
+        mock_chat_history_repository.create.return_value = chat_turn(5, "question 5", "answer 5")
+        chat_service.llm.providers[0]._make_request = AsyncMock(side_effect=[gemini_event("answer 5"), gemini_event("They discussed questions 1 to 3.")])
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        with patch("app.services.chat.config.CHAT_SESSION_WINDOW_TURNS", 2), patch("app.services.chat.config.CHAT_SESSION_COMPACT_EVERY", 2), patch(
+            "app.services.chat.get_db_context", fake_db_context
+        ):
+            await chat_service.chat_pdf("question 5", [pdf], "1", session_id=session.session_id)
+            await asyncio.gather(*ChatService._compactions)
+
+        # Assert
+        summary_prompt = chat_service.llm.providers[0]._make_request.call_args.kwargs["data"].contents[0]["parts"][0]["text"]
+        assert "question 3" in summary_prompt
+        assert "question 4" not in summary_prompt
+        mock_chat_session_repository.update_summary.assert_called_once_with(1, "They discussed questions 1 to 3.", 3, 0)
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_cites_documents_of_workspace(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        pdfs = [MagicMock(id="report", title="Annual report", content_key="a"), MagicMock(id="memo", title="Memo", content_key="b")]
+        chat_service.retriever.retrieve_many = AsyncMock(
+            return_value=[
+                {"pdf_id": "report", "document_index": 0, "chunk_index": 3, "page_number": 2, "text": "Revenue grew 10%."},
+                {"pdf_id": "memo", "document_index": 1, "chunk_index": 0, "page_number": 1, "text": "The target is 12%."},
+            ]
+        )
+
+        # Act
+        chat_service.llm.providers[0]._make_request = AsyncMock(return_value=gemini_event("10%, short of 12%."))
+        response = await chat_service.chat_pdf("Did revenue hit the target?", pdfs, "1", use_cache=False)
+
+        # Assert
+        assert response.pdf_ids == ["report", "memo"]
+        chat_service.retriever.retrieve_many.assert_called_once_with(pdfs, "Did revenue hit the target?")
+        chat_service.retriever.retrieve.assert_not_called()
+        prompt = chat_service.llm.providers[0]._make_request.call_args.kwargs["data"].contents[0]["parts"][0]["text"]
+        assert "[Annual report, page 2]\nRevenue grew 10%." in prompt
+        assert "[Memo, page 1]\nThe target is 12%." in prompt
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_batch_bounds_concurrency_and_bulk_saves(self, chat_service, mock_chat_history_repository):
+        # Arrange
+        running = {"now": 0, "max": 0}
+
+        async def make_request(**kwargs):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            text = kwargs["data"].contents[0]["parts"][0]["text"]
+            if "question 3" in text:
+                raise ExceptionBase(ErrorCode.API_ERROR, description="quota exceeded")
+            return gemini_event(f"answer {text.split('User: question ')[1][0]}")
+
+        chat_service.llm.providers[0]._make_request = AsyncMock(side_effect=make_request)
+        mock_chat_history_repository.create_many = AsyncMock()
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+        questions = [f"question {index}" for index in range(6)]
+
+        # Act
+        with patch("app.services.chat.config.CHAT_BATCH_CONCURRENCY", 2):
+            answers = await chat_service.chat_pdf_batch(questions, [pdf], "1", use_cache=False)
+
+        # Assert
+        assert [item.answer for item in answers] == ["answer 0", "answer 1", "answer 2", None, "answer 4", "answer 5"]
+        assert answers[3].error == "quota exceeded"
+        assert running["max"] == 2
+        saved = mock_chat_history_repository.create_many.call_args.args[0]
+        assert [row["question"] for row in saved] == ["question 0", "question 1", "question 2", "question 4", "question 5"]
+
+    @pytest.mark.asyncio
+    async def test_chat_pdf_batch_rejects_too_many_questions(self, chat_service):
+        # Arrange
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act & Assert
+        with patch("app.services.chat.config.CHAT_BATCH_MAX_QUESTIONS", 2), pytest.raises(ExceptionBase) as exc_info:
+            await chat_service.chat_pdf_batch(["a", "b", "c"], [pdf], "1")
+        assert exc_info.value.code == ErrorCode.INVALID_INPUT.code
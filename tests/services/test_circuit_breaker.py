@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.services.circuit_breaker import CircuitBreaker, CircuitState
+
+
+class TestCircuitBreaker:
+    def test_half_open_allows_one_trial_call(self):
+        # Arrange
+        breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=30)
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=100):
+            breaker.before_call()
+            breaker.record_failure()
+
+        # Act & Assert
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=110):
+            with pytest.raises(ExceptionBase) as exc_info:
+                breaker.before_call()
+            assert exc_info.value.code == ErrorCode.UPSTREAM_UNAVAILABLE.code
+
+        with patch("app.services.circuit_breaker.time.monotonic", return_value=131):
+            breaker.before_call()
+            assert breaker.state == CircuitState.HALF_OPEN
+            with pytest.raises(ExceptionBase):
+                breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+        breaker.before_call()
+
+    def test_failed_trial_reopens_circuit(self):
+        # Arrange
+        breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=30)
+        breaker.state = CircuitState.HALF_OPEN
+
+        # Act
+        breaker.before_call()
+        breaker.record_failure()
+
+        # Assert
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.snapshot()["retry_in"] > 0
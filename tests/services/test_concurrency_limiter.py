@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.services.concurrency_limiter import AdaptiveLimiter
+
+
+def make_limiter(**overrides):
+    settings = {
+        "initial_limit": 2,
+        "min_limit": 1,
+        "max_limit": 4,
+        "backoff": 0.5,
+        "latency_threshold": 1.0,
+        "queue_size": 1,
+        "queue_timeout": 0.05,
+    }
+    settings.update(overrides)
+    return AdaptiveLimiter("test", **settings)
+
+
+class TestAdaptiveLimiter:
+    @pytest.mark.asyncio
+    async def test_waiting_call_gets_released_slot(self):
+        # Arrange
+        limiter = make_limiter(queue_timeout=1.0)
+        await limiter.acquire()
+        await limiter.acquire()
+
+        # Act
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        queued = limiter.snapshot()["queued"]
+        limiter.release()
+        await waiting
+
+        # Assert
+        assert queued == 1
+        assert limiter.snapshot() == {"limit": 2, "in_flight": 2, "queued": 0}
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_is_full_or_wait_times_out(self):
+        # Arrange
+        limiter = make_limiter()
+        await limiter.acquire()
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await limiter.acquire()
+        assert exc_info.value.code == ErrorCode.UPSTREAM_OVERLOADED.code
+
+        with pytest.raises(ExceptionBase) as exc_info:
+            await waiting
+        assert exc_info.value.code == ErrorCode.UPSTREAM_OVERLOADED.code
+        assert limiter.snapshot() == {"limit": 2, "in_flight": 2, "queued": 0}
+
+    def test_limit_grows_additively_and_shrinks_multiplicatively(self):
+        # Arrange
+        limiter = make_limiter()
+
+        # Act
+        for _ in range(4):
+            limiter.record_success(started=0, latency=0.1)
+        grown = int(limiter.limit)
+        limiter.record_overload(started=limiter.last_decrease)
+        # Calls started before the decrease hit the same congestion and don't decrease it again
+        limiter.record_overload(started=limiter.last_decrease - 1)
+        limiter.record_success(started=limiter.last_decrease, latency=5.0)
+
+        # Assert
+        assert grown == 3
+        assert int(limiter.limit) == 1
+        limiter.record_overload(started=limiter.last_decrease)
+        assert limiter.limit == 1.0
+
+    def test_call_much_slower_than_usual_shrinks_limit(self):
+        # Arrange
+        limiter = make_limiter(latency_threshold=30.0, latency_tolerance=3.0, latency_min_samples=5)
+        for _ in range(5):
+            limiter.record_success(started=0, latency=0.2)
+        grown = int(limiter.limit)
+
+        # Act
+        limiter.record_success(started=limiter.last_decrease, latency=2.0)
+
+        # Assert
+        assert grown == 3
+        assert int(limiter.limit) == 1
+        assert 0.2 < limiter.latency_average < 2.0
+
+    def test_slow_calls_before_enough_samples_only_use_threshold(self):
+        # Arrange
+        limiter = make_limiter(latency_threshold=30.0, latency_tolerance=3.0, latency_min_samples=5)
+        limiter.record_success(started=0, latency=0.2)
+
+        # Act
+        limiter.record_success(started=limiter.last_decrease, latency=2.0)
+
+        # Assert
+        assert limiter.limit > 2
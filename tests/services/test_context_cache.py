@@ -0,0 +1,181 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.exceptions import ExceptionBase
+from app.services.chat import ChatService
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.concurrency_limiter import AdaptiveLimiter
+from app.services.context_cache import GeminiContextCache
+from app.services.http_client import HTTPClient
+from app.services.llm.gemini import GeminiProvider
+from app.services.llm.router import LLMRouter
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def delete_if_equal(self, key, value):
+        if self.values.get(key) == value:
+            del self.values[key]
+
+
+@pytest_asyncio.fixture
+async def gemini_server():
+    state = {"cached": {}, "created": 0, "deleted": [], "requests": [], "reject_create": False, "unavailable": False}
+
+    async def create_cached_content(request):
+        body = await request.json()
+        if state["reject_create"]:
+            return web.json_response({"error": "Cached content is too small"}, status=400)
+        state["created"] += 1
+        name = f"cachedContents/c{state['created']}"
+        state["cached"][name] = body["contents"][0]["parts"][0]["text"]
+        return web.json_response({"name": name, "model": body["model"]})
+
+    async def delete_cached_content(request):
+        name = f"cachedContents/{request.match_info['id']}"
+        state["cached"].pop(name, None)
+        state["deleted"].append(name)
+        return web.json_response({})
+
+    async def generate(request):
+        body = await request.json()
+        state["requests"].append(body)
+        if state["unavailable"]:
+            return web.json_response({"error": "The model is overloaded"}, status=503)
+        name = body.get("cachedContent")
+        if name is not None and name not in state["cached"]:
+            return web.json_response({"error": "CachedContent not found"}, status=403)
+        answer = "from cache" if name else "inline"
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": answer}]}}]})
+
+    app = web.Application()
+    app.router.add_post("/v1beta/cachedContents", create_cached_content)
+    app.router.add_delete("/v1beta/cachedContents/{id}", delete_cached_content)
+    app.router.add_post("/v1beta/models/gemini-2.0-flash:generateContent", generate)
+    server = TestServer(app)
+    await server.start_server()
+    with patch("app.services.chat.config.CHAT_RETRIEVAL_MODE", "full"), patch("app.services.api.config.API_RETRY_BASE_WAIT", 0.001), patch(
+        "app.services.context_cache.config.GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1
+    ), patch("app.services.chat.PostgreChatHistoryRepository") as mock_repository:
+        mock_repository.return_value.create = AsyncMock()
+        yield server, state
+    await server.close()
+    await HTTPClient.close()
+    CircuitBreaker._breakers.clear()
+    AdaptiveLimiter._limiters.clear()
+
+
+@pytest.fixture
+def chat_service(gemini_server):
+    server, _ = gemini_server
+    service = ChatService(db=MagicMock())
+    gemini = GeminiProvider(name="gemini-test", priority=0, latency_slo=5, base_url=str(server.make_url("")).rstrip("/"))
+    service.llm = LLMRouter([gemini])
+    service.retriever = MagicMock(retrieve=AsyncMock(return_value=[{"chunk_index": 0, "page_number": 1, "text": "The deadline is May 1st."}]))
+    service.context_cache = GeminiContextCache(gemini)
+    service.context_cache.redis = FakeRedis()
+    service.context_cache.single_flight.redis = service.context_cache.redis
+    return service
+
+
+class TestGeminiContextCache:
+    @pytest.mark.asyncio
+    async def test_questions_reference_cached_document(self, gemini_server, chat_service):
+        # Arrange
+        _, state = gemini_server
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        first = await chat_service.chat_pdf("What is the deadline?", [pdf], "1", use_cache=False)
+        second = await chat_service.chat_pdf("Who decides?", [pdf], "1", use_cache=False)
+
+        # Assert
+        assert [first.answer, second.answer] == ["from cache", "from cache"]
+        assert state["created"] == 1
+        assert "The deadline is May 1st." in state["cached"]["cachedContents/c1"]
+        assert all(body["cachedContent"] == "cachedContents/c1" for body in state["requests"])
+        assert all("May 1st" not in body["contents"][0]["parts"][0]["text"] for body in state["requests"])
+
+    @pytest.mark.asyncio
+    async def test_falls_back_inline_when_caching_is_unavailable(self, gemini_server, chat_service):
+        # Arrange
+        _, state = gemini_server
+        state["reject_create"] = True
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        responses = [await chat_service.chat_pdf(question, [pdf], "1", use_cache=False) for question in ["First?", "Second?"]]
+
+        # Assert
+        assert [response.answer for response in responses] == ["inline", "inline"]
+        assert all("cachedContent" not in body for body in state["requests"])
+        assert "May 1st" in state["requests"][0]["contents"][0]["parts"][0]["text"]
+        # The failure is remembered, the second question doesn't try to cache the document again
+        assert chat_service.context_cache.redis.values[":gemini_context:unavailable:hash"] == "1"
+
+    @pytest.mark.asyncio
+    async def test_rejected_handle_is_dropped_and_answered_inline(self, gemini_server, chat_service):
+        # Arrange
+        _, state = gemini_server
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+        await chat_service.chat_pdf("What is the deadline?", [pdf], "1", use_cache=False)
+        state["cached"].clear()
+
+        # Act
+        response = await chat_service.chat_pdf("Who decides?", [pdf], "1", use_cache=False)
+
+        # Assert
+        assert response.answer == "inline"
+        assert ":gemini_context:1" not in chat_service.context_cache.redis.values
+
+    @pytest.mark.asyncio
+    async def test_provider_errors_keep_handle_and_are_not_resent_inline(self, gemini_server, chat_service):
+        # Arrange
+        _, state = gemini_server
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+        await chat_service.chat_pdf("What is the deadline?", [pdf], "1", use_cache=False)
+        state["unavailable"] = True
+        state["requests"].clear()
+
+        # Act
+        with pytest.raises(ExceptionBase):
+            await chat_service.chat_pdf("Who decides?", [pdf], "1", use_cache=False)
+
+        # Assert
+        assert state["requests"] and all(body.get("cachedContent") == "cachedContents/c1" for body in state["requests"])
+        assert ":gemini_context:1" in chat_service.context_cache.redis.values
+
+    @pytest.mark.asyncio
+    async def test_release_deletes_cached_content_of_previous_selection(self, gemini_server, chat_service):
+        # Arrange
+        _, state = gemini_server
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+        await chat_service.chat_pdf("What is the deadline?", [pdf], "1", use_cache=False)
+
+        # Act
+        await chat_service.context_cache.release("1", keep_content_key="hash")
+        kept = list(state["cached"])
+        await chat_service.context_cache.release("1", keep_content_key="other-hash")
+
+        # Assert
+        assert kept == ["cachedContents/c1"]
+        assert state["deleted"] == ["cachedContents/c1"]
+        assert ":gemini_context:1" not in chat_service.context_cache.redis.values
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.services.extraction import PDFTextExtractor, extract_page_range, split_page_ranges
+from app.tasks.celery_config import celery_app
+
+
+@pytest.fixture
+def text_extractor():
+    yield PDFTextExtractor()
+    PDFTextExtractor.shutdown()
+
+
+class TestPDFTextExtractor:
+    def test_split_page_ranges(self):
+        assert split_page_ranges(0, 10, 4) == [(0, 3), (3, 6), (6, 9), (9, 10)]
+        assert split_page_ranges(0, 2, 8) == [(0, 1), (1, 2)]
+        assert split_page_ranges(5, 5, 4) == []
+
+    def test_extract_page_range_keeps_page_numbers(self, pdf_factory):
+        # Arrange
+        file_content = pdf_factory(["first page", "second page", "third page"])
+
+        # Act
+        with PDFTextExtractor.staged(file_content) as path:
+            pages = extract_page_range(path, 1, 3)
+
+        # Assert
+        assert pages == [(2, "second page", None), (3, "third page", None)]
+        assert not os.path.exists(path)
+
+    def test_extract_page_range_reads_the_file_behind_a_reused_path(self, pdf_factory, tmp_path):
+        # Arrange
+        path = tmp_path / "staged.pdf"
+        path.write_bytes(pdf_factory(["first document"]))
+        extract_page_range(str(path), 0, 1)
+
+        # Act
+        path.write_bytes(pdf_factory(["second document"]))
+        pages = extract_page_range(str(path), 0, 1)
+
+        # Assert
+        assert pages == [(1, "second document", None)]
+
+    @pytest.mark.asyncio
+    async def test_extract_merges_ranges_in_page_order(self, text_extractor, pdf_factory):
+        # Arrange
+        page_texts = [f"page {number}" for number in range(1, 12)]
+        file_content = pdf_factory(page_texts)
+
+        # Act
+        with text_extractor.staged(file_content) as path:
+            pages = await text_extractor.extract(path)
+
+        # Assert
+        assert [page_number for page_number, _, _ in pages] == list(range(1, 12))
+        assert [text for _, text, _ in pages] == page_texts
+        assert all(error is None for _, _, error in pages)
+
+    @pytest.mark.asyncio
+    async def test_extract_in_process_when_daemonic(self, text_extractor, pdf_factory):
+        # Arrange
+        page_texts = ["first page", "second page", "third page"]
+        file_content = pdf_factory(page_texts)
+
+        # Act
+        with patch.object(PDFTextExtractor, "in_daemon_process", return_value=True), text_extractor.staged(file_content) as path:
+            pages = await text_extractor.extract(path)
+            max_workers = PDFTextExtractor.max_workers()
+
+        # Assert
+        assert isinstance(PDFTextExtractor._executor, ThreadPoolExecutor)
+        assert max_workers == 1
+        assert [text for _, text, _ in pages] == page_texts
+
+    @pytest.mark.asyncio
+    async def test_parse_worker_spreads_ranges_across_processes(self, text_extractor, pdf_factory):
+        # Arrange
+        page_texts = [f"page {number}" for number in range(1, 7)]
+        file_content = pdf_factory(page_texts)
+
+        # Act
+        with patch("app.services.extraction.config.PDF_EXTRACT_WORKERS", 2), text_extractor.staged(file_content) as path:
+            pages = await text_extractor.extract(path, 0, len(page_texts))
+
+        # Assert
+        # The solo Celery pool runs parses in the worker's main process, which isn't daemonic and gets the process pool
+        assert celery_app.conf.worker_pool == "solo"
+        assert not PDFTextExtractor.in_daemon_process()
+        assert isinstance(PDFTextExtractor._executor, ProcessPoolExecutor)
+        assert len(PDFTextExtractor._executor._processes) == 2
+        assert [text for _, text, _ in pages] == page_texts
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.services.hedging import HedgingPolicy
+
+
+def make_policy(budget_percent=100.0, percentile=50):
+    policy = HedgingPolicy("test", percentile=percentile, min_samples=4, window=10, budget_percent=budget_percent)
+    for latency in [0.01, 0.01, 0.02, 0.5]:
+        policy.record_latency(latency)
+    return policy
+
+
+class TestHedgingPolicy:
+    def test_hedge_delay_is_percentile_of_recent_latencies(self):
+        # Arrange
+        policy = make_policy()
+
+        # Act & Assert
+        assert policy.hedge_delay() == 0.01
+        assert HedgingPolicy("test", percentile=95, min_samples=4, window=10, budget_percent=5).hedge_delay() is None
+
+    @pytest.mark.asyncio
+    async def test_slow_request_is_hedged_and_loser_cancelled(self):
+        # Arrange
+        policy = make_policy()
+        calls = []
+
+        async def call():
+            calls.append(len(calls))
+            try:
+                await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+            except asyncio.CancelledError:
+                calls.append("cancelled")
+                raise
+            return f"answer {len(calls)}"
+
+        # Act
+        result = await policy.run(call)
+        await asyncio.sleep(0)
+
+        # Assert
+        assert result == "answer 2"
+        assert calls == [0, 1, "cancelled"]
+        # The run is recorded from the start of the cancelled primary, not as the fast hedge alone
+        assert len(policy.latencies) == 5
+        assert policy.latencies[-1] >= 0.02
+
+    @pytest.mark.asyncio
+    async def test_failed_request_waits_for_the_other(self):
+        # Arrange
+        policy = make_policy()
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                await asyncio.sleep(0.05)
+                return "slow answer"
+            raise ConnectionError("hedge failed")
+
+        # Act
+        result = await policy.run(call)
+
+        # Assert
+        assert result == "slow answer"
+        assert len(attempts) == 2
+
+    @pytest.mark.asyncio
+    async def test_hedges_stay_within_budget(self):
+        # Arrange
+        policy = make_policy(budget_percent=50.0, percentile=25)
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            await asyncio.sleep(0.03)
+            return "answer"
+
+        # Act
+        for _ in range(4):
+            await policy.run(call)
+
+        # Assert
+        assert len(attempts) == 4 + 2
@@ -0,0 +1,99 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+
+from app.services.history_writer import ChatHistoryWriter
+
+
+@asynccontextmanager
+async def fake_db_context():
+    yield MagicMock()
+
+
+@pytest.fixture
+def mock_chat_history_repository():
+    with patch("app.services.history_writer.PostgreChatHistoryRepository") as mock, patch(
+        "app.services.history_writer.get_db_context", fake_db_context
+    ):
+        mock.return_value.create_many = AsyncMock()
+        yield mock.return_value
+
+
+@pytest_asyncio.fixture
+async def writer(mock_chat_history_repository):
+    with patch("app.services.history_writer.config.CHAT_HISTORY_BATCH_SIZE", 3), patch(
+        "app.services.history_writer.config.CHAT_HISTORY_FLUSH_INTERVAL", 0.05
+    ), patch("app.services.history_writer.config.CHAT_HISTORY_QUEUE_SIZE", 5):
+        await ChatHistoryWriter.start()
+        yield ChatHistoryWriter
+        await ChatHistoryWriter.close()
+
+
+def history_row(index):
+    return {"user_id": 1, "question": f"question {index}", "answer": f"answer {index}", "session_id": None}
+
+
+class TestChatHistoryWriter:
+    @pytest.mark.asyncio
+    async def test_writes_queued_rows_in_batches(self, writer, mock_chat_history_repository):
+        # Arrange
+        queued = [writer.enqueue(history_row(index)) for index in range(5)]
+
+        # Act
+        await writer.flush()
+
+        # Assert
+        assert queued == [True] * 5
+        batches = [call.args[0] for call in mock_chat_history_repository.create_many.call_args_list]
+        assert [len(batch) for batch in batches] == [3, 2]
+        assert [row["question"] for batch in batches for row in batch] == [f"question {index}" for index in range(5)]
+        assert all(row["created_at"] is not None for batch in batches for row in batch)
+
+    @pytest.mark.asyncio
+    async def test_flush_does_not_wait_for_rows_queued_after_it(self, writer, mock_chat_history_repository):
+        # Arrange
+        queued_while_flushing = []
+
+        async def create_many(rows):
+            # Steady traffic, every write sees another row queued
+            await asyncio.sleep(0.01)
+            queued_while_flushing.append(writer.enqueue(history_row(len(queued_while_flushing) + 1)))
+
+        mock_chat_history_repository.create_many.side_effect = create_many
+        writer.enqueue(history_row(0))
+
+        # Act
+        await asyncio.wait_for(writer.flush(), 1)
+
+        # Assert
+        assert queued_while_flushing and all(queued_while_flushing)
+        first_batch = mock_chat_history_repository.create_many.call_args_list[0].args[0]
+        assert [row["question"] for row in first_batch] == ["question 0"]
+
+    @pytest.mark.asyncio
+    async def test_caller_writes_when_queue_is_full_or_writer_stopped(self, writer, mock_chat_history_repository):
+        # Act
+        queued = [writer.enqueue(history_row(index)) for index in range(7)]
+        await writer.close()
+        after_close = writer.enqueue(history_row(7))
+
+        # Assert
+        assert queued == [True] * 5 + [False] * 2
+        assert after_close is False
+        assert sum(len(call.args[0]) for call in mock_chat_history_repository.create_many.call_args_list) == 5
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried(self, writer, mock_chat_history_repository):
+        # Arrange
+        mock_chat_history_repository.create_many.side_effect = [Exception("connection reset"), None]
+        writer.enqueue(history_row(0))
+
+        # Act
+        with patch("app.services.history_writer.WRITE_BACKOFF", 0):
+            await writer.flush()
+
+        # Assert
+        assert mock_chat_history_repository.create_many.call_count == 2
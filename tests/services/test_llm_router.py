@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.concurrency_limiter import AdaptiveLimiter
+from app.services.http_client import HTTPClient
+from app.services.llm.base import LLMRequest
+from app.services.llm.fake import FakeProvider
+from app.services.llm.openai import OpenAICompatibleProvider
+from app.services.llm.router import LLMRouter
+
+
+class FailingProvider(FakeProvider):
+    async def _generate(self, prompt, cached_content=None, hedge=False):
+        raise ExceptionBase(ErrorCode.API_ERROR, description="provider down")
+
+    async def _stream(self, prompt, cached_content=None):
+        raise ExceptionBase(ErrorCode.API_ERROR, description="provider down")
+        yield
+
+
+class SlowProvider(FakeProvider):
+    async def _generate(self, prompt, cached_content=None, hedge=False):
+        await asyncio.sleep(1)
+        return "slow answer"
+
+
+@pytest.fixture(autouse=True)
+def clear_registries():
+    yield
+    CircuitBreaker._breakers.clear()
+    AdaptiveLimiter._limiters.clear()
+
+
+@pytest_asyncio.fixture
+async def openai_server():
+    requests = []
+
+    async def completions(request):
+        body = await request.json()
+        requests.append(body)
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for text in ["Hel", "lo"]:
+                await response.write(f'data: {{"choices": [{{"delta": {{"content": "{text}"}}}}]}}\n\n'.encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+        return web.json_response({"choices": [{"message": {"role": "assistant", "content": "Hello"}}]})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app)
+    await server.start_server()
+    yield server, requests
+    await server.close()
+    await HTTPClient.close()
+
+
+class TestLLMRouter:
+    @pytest.mark.asyncio
+    async def test_fails_over_when_primary_errors(self):
+        # Arrange
+        router = LLMRouter([FakeProvider(name="backup", priority=1, answer="backup answer"), FailingProvider(name="primary", priority=0)])
+
+        # Act
+        answer = await router.generate(LLMRequest(prompt="User: hi"))
+        deltas = [text async for text in router.stream(LLMRequest(prompt="User: hi"))]
+
+        # Assert
+        assert answer == "backup answer"
+        assert "".join(deltas) == "backup answer"
+
+    @pytest.mark.asyncio
+    async def test_fails_over_when_primary_misses_its_slo(self):
+        # Arrange
+        slow = SlowProvider(name="primary", priority=0, latency_slo=0.01)
+        router = LLMRouter([slow, FakeProvider(name="backup", priority=1, answer="fast answer")])
+
+        # Act
+        answer = await router.generate(LLMRequest(prompt="User: hi"))
+
+        # Assert
+        assert answer == "fast answer"
+        assert slow.healthy is False
+        assert router.primary().name == "backup"
+
+    @pytest.mark.asyncio
+    async def test_raises_when_every_provider_fails(self):
+        # Arrange
+        router = LLMRouter([FailingProvider(name="primary", priority=0), FailingProvider(name="backup", priority=1)])
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await router.generate(LLMRequest(prompt="User: hi"))
+        assert exc_info.value.description == "provider down"
+
+    @pytest.mark.asyncio
+    async def test_uses_inline_prompt_for_providers_without_context_cache(self):
+        # Arrange
+        async def build_inline_prompt():
+            return "Document text\nUser: inline question"
+
+        router = LLMRouter([FakeProvider(name="fake", priority=0)])
+        request = LLMRequest(prompt="User: question", cached_content="cachedContents/c1", build_inline_prompt=build_inline_prompt)
+
+        # Act
+        answer = await router.generate(request)
+
+        # Assert
+        assert answer == "This is a fake answer to: inline question"
+
+    @pytest.mark.asyncio
+    async def test_openai_compatible_provider(self, openai_server):
+        # Arrange
+        server, requests = openai_server
+        provider = OpenAICompatibleProvider(
+            name="openai-test", priority=0, latency_slo=5, base_url=str(server.make_url("/v1")), api_key="key", model="test-model"
+        )
+
+        # Act
+        answer = await provider.generate(LLMRequest(prompt="Say hello"))
+        deltas = [text async for text in provider.stream(LLMRequest(prompt="Say hello"))]
+
+        # Assert
+        assert answer == "Hello"
+        assert deltas == ["Hel", "lo"]
+        assert requests[0] == {"model": "test-model", "messages": [{"role": "user", "content": "Say hello"}]}
+
+    @pytest.mark.asyncio
+    async def test_snapshot_reports_provider_health(self):
+        # Arrange
+        slow = SlowProvider(name="primary", priority=0, latency_slo=0.01)
+        router = LLMRouter([slow, FakeProvider(name="backup", priority=1)])
+
+        # Act
+        await router.generate(LLMRequest(prompt="User: hi"))
+        snapshot = router.snapshot()
+
+        # Assert
+        assert snapshot["primary"]["healthy"] is False
+        assert snapshot["backup"] == {"priority": 1, "healthy": True, "latency_slo": 1, "circuit": "closed"}
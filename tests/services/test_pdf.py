@@ -0,0 +1,295 @@
+import io
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.error_codes import ErrorCode
+from app.core.exceptions import ExceptionBase
+from app.schemas.pdf import PDFParseStatus
+from app.services.extraction import PDFTextExtractor
+from app.services.pdf import PDFService
+
+PDF_CONTENT = b"%PDF-1.4\n" + b"0" * 64
+
+
+@pytest.fixture
+def mock_pdf_repository():
+    with patch("app.services.pdf.PDFRepository") as mock:
+        instance = mock.return_value
+        instance.upload_pdf = AsyncMock()
+        instance.get_pdf_metadata = AsyncMock()
+        instance.mark_parse_queued = AsyncMock()
+        instance.update_parse_status = AsyncMock()
+        instance.reuse_parsed_text = AsyncMock()
+        instance.get_pdf_file = AsyncMock()
+        instance.save_pdf_pages = AsyncMock()
+        instance.mark_parsed = AsyncMock()
+        instance.get_user_pdfs_page = AsyncMock()
+        instance.update_parse_progress = AsyncMock()
+        instance.count_pdf_pages = AsyncMock()
+        yield instance
+
+
+@pytest.fixture
+def mock_celery_app():
+    with patch("app.services.pdf.celery_app") as mock:
+        yield mock
+
+
+@pytest.fixture
+def pdf_service(mock_pdf_repository):
+    yield PDFService()
+    PDFTextExtractor.shutdown()
+
+
+def consume_chunks(received: list):
+    async def upload_pdf(user_id, filename, title, chunks):
+        async for chunk in chunks:
+            received.append(chunk)
+        return MagicMock(id="pdf-id")
+
+    return upload_pdf
+
+
+class TestPDFService:
+    @pytest.mark.asyncio
+    async def test_upload_pdf_streams_chunks(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        received = []
+        mock_pdf_repository.upload_pdf.side_effect = consume_chunks(received)
+        file = UploadFile(file=io.BytesIO(PDF_CONTENT), filename="test.pdf")
+
+        # Act
+        with patch("app.services.pdf.config.PDF_UPLOAD_CHUNK_SIZE", 16):
+            metadata = await pdf_service.upload_pdf(title="Test", filename="test.pdf", file=file, user_id=1)
+
+        # Assert
+        assert metadata.id == "pdf-id"
+        assert len(received) > 1
+        assert b"".join(received) == PDF_CONTENT
+
+    @pytest.mark.asyncio
+    async def test_upload_pdf_rejects_invalid_magic_bytes(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        received = []
+        mock_pdf_repository.upload_pdf.side_effect = consume_chunks(received)
+        file = UploadFile(file=io.BytesIO(b"not a pdf"), filename="test.pdf")
+
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await pdf_service.upload_pdf(title="Test", filename="test.pdf", file=file, user_id=1)
+        assert exc_info.value.code == ErrorCode.INVALID_FILE_TYPE.code
+        assert received == []
+
+    @pytest.mark.asyncio
+    async def test_upload_pdf_rejects_oversized_file(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        received = []
+        mock_pdf_repository.upload_pdf.side_effect = consume_chunks(received)
+        file = UploadFile(file=io.BytesIO(PDF_CONTENT), filename="test.pdf")
+
+        # Act & Assert
+        with patch("app.services.pdf.config.PDF_UPLOAD_CHUNK_SIZE", 16), patch("app.services.pdf.config.PDF_MAX_UPLOAD_SIZE", 40):
+            with pytest.raises(ExceptionBase) as exc_info:
+                await pdf_service.upload_pdf(title="Test", filename="test.pdf", file=file, user_id=1)
+        assert exc_info.value.code == ErrorCode.FILE_TOO_LARGE.code
+        assert sum(len(chunk) for chunk in received) <= 40
+
+    @pytest.mark.asyncio
+    async def test_upload_pdf_rejects_declared_oversized_file(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        file = UploadFile(file=io.BytesIO(PDF_CONTENT), filename="test.pdf", size=len(PDF_CONTENT))
+
+        # Act & Assert
+        with patch("app.services.pdf.config.PDF_MAX_UPLOAD_SIZE", 10):
+            with pytest.raises(ExceptionBase) as exc_info:
+                await pdf_service.upload_pdf(title="Test", filename="test.pdf", file=file, user_id=1)
+        assert exc_info.value.code == ErrorCode.FILE_TOO_LARGE.code
+        mock_pdf_repository.upload_pdf.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_queue_parse_sends_task(self, pdf_service, mock_pdf_repository, mock_celery_app):
+        # Arrange
+        mock_pdf_repository.mark_parse_queued.return_value = True
+
+        # Act
+        status = await pdf_service.queue_parse("pdf-id")
+
+        # Assert
+        assert status == PDFParseStatus.QUEUED
+        mock_celery_app.send_task.assert_called_once_with("parse_pdf", args=["pdf-id"])
+
+    @pytest.mark.asyncio
+    async def test_queue_parse_skips_already_queued(self, pdf_service, mock_pdf_repository, mock_celery_app):
+        # Arrange
+        mock_pdf_repository.mark_parse_queued.return_value = False
+        mock_pdf_repository.get_pdf_metadata.return_value = MagicMock(parse_status=PDFParseStatus.RUNNING)
+
+        # Act
+        status = await pdf_service.queue_parse("pdf-id")
+
+        # Assert
+        assert status == PDFParseStatus.RUNNING
+        mock_celery_app.send_task.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_run_parse_records_failure(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        with patch.object(pdf_service, "parse_pdf", AsyncMock(return_value=False)):
+            # Act
+            success = await pdf_service.run_parse("pdf-id")
+
+        # Assert
+        assert success is False
+        mock_pdf_repository.update_parse_status.assert_any_call("pdf-id", PDFParseStatus.RUNNING)
+        mock_pdf_repository.update_parse_status.assert_called_with("pdf-id", PDFParseStatus.FAILED, error="Failed to parse PDF file")
+
+    @pytest.mark.asyncio
+    async def test_parse_pdf_reuses_text_of_identical_pdf(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        mock_pdf_repository.get_pdf_metadata.return_value = MagicMock(file_id="file-id", content_hash="hash")
+        mock_pdf_repository.reuse_parsed_text.return_value = True
+
+        # Act
+        success = await pdf_service.parse_pdf("pdf-id")
+
+        # Assert
+        assert success is True
+        mock_pdf_repository.reuse_parsed_text.assert_called_once_with("pdf-id", "hash")
+        mock_pdf_repository.get_pdf_file.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_parse_pdf_extracts_text_in_checkpointed_batches(self, pdf_service, mock_pdf_repository, pdf_factory):
+        # Arrange
+        mock_pdf_repository.get_pdf_metadata.return_value = MagicMock(
+            file_id="file-id", content_hash="hash", content_key="hash", page_count=None, pages_done=None
+        )
+        mock_pdf_repository.reuse_parsed_text.return_value = False
+        mock_pdf_repository.get_pdf_file.return_value = pdf_factory(["first page", "second page", "third page"])
+        mock_pdf_repository.count_pdf_pages.return_value = 3
+        mock_pdf_repository.mark_parsed.return_value = True
+
+        # Act
+        with patch("app.services.pdf.config.PDF_PARSE_BATCH_SIZE", 2):
+            success = await pdf_service.parse_pdf("pdf-id")
+
+        # Assert
+        assert success is True
+        assert [call.args for call in mock_pdf_repository.save_pdf_pages.call_args_list] == [
+            ("hash", [(1, "first page"), (2, "second page")]),
+            ("hash", [(3, "third page")]),
+        ]
+        assert [call.kwargs for call in mock_pdf_repository.update_parse_progress.call_args_list] == [
+            {"pages_done": 0, "page_count": 3},
+            {"pages_done": 2},
+            {"pages_done": 3},
+        ]
+        mock_pdf_repository.mark_parsed.assert_called_once_with("pdf-id", page_count=3)
+
+    @pytest.mark.asyncio
+    async def test_parse_pdf_resumes_from_checkpoint(self, pdf_service, mock_pdf_repository, pdf_factory):
+        # Arrange
+        mock_pdf_repository.get_pdf_metadata.return_value = MagicMock(
+            file_id="file-id", content_hash="hash", content_key="hash", page_count=3, pages_done=2
+        )
+        mock_pdf_repository.reuse_parsed_text.return_value = False
+        mock_pdf_repository.get_pdf_file.return_value = pdf_factory(["first page", "second page", "third page"])
+        mock_pdf_repository.count_pdf_pages.return_value = 3
+        mock_pdf_repository.mark_parsed.return_value = True
+
+        # Act
+        success = await pdf_service.parse_pdf("pdf-id")
+
+        # Assert
+        assert success is True
+        mock_pdf_repository.save_pdf_pages.assert_called_once_with("hash", [(3, "third page")])
+        mock_pdf_repository.mark_parsed.assert_called_once_with("pdf-id", page_count=3)
+
+    @pytest.mark.asyncio
+    async def test_parse_pdf_fails_without_text(self, pdf_service, mock_pdf_repository, pdf_factory):
+        # Arrange
+        mock_pdf_repository.get_pdf_metadata.return_value = MagicMock(
+            file_id="file-id", content_hash="hash", content_key="hash", page_count=None, pages_done=None
+        )
+        mock_pdf_repository.reuse_parsed_text.return_value = False
+        mock_pdf_repository.get_pdf_file.return_value = pdf_factory([" "])
+        mock_pdf_repository.count_pdf_pages.return_value = 0
+
+        # Act
+        success = await pdf_service.parse_pdf("pdf-id")
+
+        # Assert
+        assert success is False
+        mock_pdf_repository.mark_parsed.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_list_user_pdfs_returns_cursor_of_next_page(self, pdf_service, mock_pdf_repository):
+        # Arrange
+        upload_date = datetime(2025, 6, 1, 12, 30)
+        mock_pdf_repository.get_user_pdfs_page.return_value = (
+            [{"id": "665b1e6f8f1b2c3d4e5f6a7b", "title": "Test", "upload_date": upload_date}],
+            True,
+        )
+
+        # Act
+        with patch("app.services.pdf.config.PDF_LIST_MAX_PAGE_SIZE", 50):
+            pdfs, next_cursor = await pdf_service.list_user_pdfs(1, limit=500, fields=["title"])
+
+        # Assert
+        assert pdfs == [{"id": "665b1e6f8f1b2c3d4e5f6a7b", "title": "Test"}]
+        assert pdf_service._decode_cursor(next_cursor) == (upload_date, "665b1e6f8f1b2c3d4e5f6a7b")
+        mock_pdf_repository.get_user_pdfs_page.assert_called_once_with(1, limit=50, after=None, fields=["title"])
+
+    @pytest.mark.asyncio
+    async def test_list_user_pdfs_rejects_unknown_fields(self, pdf_service, mock_pdf_repository):
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await pdf_service.list_user_pdfs(1, fields=["text_content"])
+        assert exc_info.value.code == ErrorCode.INVALID_INPUT.code
+        mock_pdf_repository.get_user_pdfs_page.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_list_user_pdfs_rejects_invalid_cursor(self, pdf_service, mock_pdf_repository):
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            await pdf_service.list_user_pdfs(1, cursor="not-a-cursor")
+        assert exc_info.value.code == ErrorCode.INVALID_INPUT.code
+
+    @pytest.mark.parametrize(
+        "range_header, expected",
+        [
+            ("bytes=0-9", (0, 9)),
+            ("bytes=90-", (90, 99)),
+            ("bytes=-10", (90, 99)),
+            ("bytes=50-500", (50, 99)),
+            ("bytes=0-1,5-6", None),
+            ("items=0-9", None),
+            ("bytes=9-0", None),
+            (None, None),
+        ],
+    )
+    def test_parse_range(self, range_header, expected):
+        # Act & Assert
+        assert PDFService.parse_range(range_header, 100) == expected
+
+    def test_parse_range_rejects_unsatisfiable_range(self):
+        # Act & Assert
+        with pytest.raises(ExceptionBase) as exc_info:
+            PDFService.parse_range("bytes=100-", 100)
+        assert exc_info.value.code == ErrorCode.RANGE_NOT_SATISFIABLE.code
+
+    @pytest.mark.asyncio
+    async def test_iter_pdf_file_reads_range_in_chunks(self):
+        # Arrange
+        content = io.BytesIO(PDF_CONTENT)
+        grid_out = MagicMock(chunk_size=16, seek=content.seek)
+        grid_out.read = AsyncMock(side_effect=content.read)
+
+        # Act
+        chunks = [chunk async for chunk in PDFService.iter_pdf_file(grid_out, 4, 43)]
+
+        # Assert
+        assert [len(chunk) for chunk in chunks] == [16, 16, 8]
+        assert b"".join(chunks) == PDF_CONTENT[4:44]
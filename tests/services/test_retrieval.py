@@ -0,0 +1,239 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.services import vectors
+from app.services.retrieval import (PDFRetriever, RetrievalMode, bm25_score,
+                                    build_index, chunk_pages, fuse_rankings,
+                                    select_within_budget)
+from app.services.text import estimate_tokens, tokenize
+
+
+@pytest.fixture
+def mock_pdf_repository():
+    repository = MagicMock()
+    repository.get_pdf_pages = AsyncMock()
+    repository.save_pdf_chunks = AsyncMock()
+    repository.get_chunk_stats = AsyncMock()
+    repository.find_pdf_chunks = AsyncMock()
+    repository.get_pdf_chunks = AsyncMock()
+    repository.save_pdf_vectors = AsyncMock()
+    repository.get_pdf_vectors = AsyncMock()
+    repository.get_pdf_chunks_by_index = AsyncMock()
+    return repository
+
+
+@pytest.fixture
+def retriever(mock_pdf_repository):
+    return PDFRetriever(mock_pdf_repository)
+
+
+def indexed_chunks(texts):
+    chunks = [{"chunk_index": index, "page_number": index + 1, "text": text} for index, text in enumerate(texts)]
+    return chunks, build_index(chunks)
+
+
+class TestRetrieval:
+    def test_tokenize_drops_stopwords(self):
+        assert tokenize("What is the Revenue of 2024?") == ["revenue", "2024"]
+
+    def test_chunk_pages_splits_long_pages_with_overlap(self):
+        # Arrange
+        words = [f"word{index:02d}" for index in range(40)]
+
+        # Act
+        chunks = chunk_pages([(1, " ".join(words)), (2, "short page")], chunk_tokens=20, overlap_tokens=5)
+
+        # Assert
+        assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+        assert all(estimate_tokens(chunk["text"]) <= 20 for chunk in chunks)
+        first, second = chunks[0]["text"].split(), chunks[1]["text"].split()
+        assert first[-1] in second
+        assert chunks[-1] == {"chunk_index": len(chunks) - 1, "page_number": 2, "text": "short page"}
+        assert {word for chunk in chunks[:-1] for word in chunk["text"].split()} == set(words)
+
+    def test_bm25_ranks_rare_terms_higher(self):
+        # Arrange
+        chunks, stats = indexed_chunks(["revenue grew this year", "costs grew this year", "costs were flat"])
+
+        # Act
+        scores = [bm25_score(["revenue", "grew"], chunk, stats) for chunk in chunks]
+
+        # Assert
+        assert scores[0] > scores[1] > scores[2] == 0
+
+    def test_select_within_budget_keeps_document_order(self):
+        # Arrange
+        chunks = [
+            {"chunk_index": 2, "text": "b" * 40},
+            {"chunk_index": 0, "text": "a" * 400},
+            {"chunk_index": 1, "text": "c" * 40},
+        ]
+
+        # Act
+        selected = select_within_budget(chunks, top_k=5, token_budget=50)
+
+        # Assert
+        assert [chunk["chunk_index"] for chunk in selected] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_retrieve_returns_best_chunks_within_budget(self, retriever, mock_pdf_repository):
+        # Arrange
+        chunks, stats = indexed_chunks(["revenue grew this year", "costs grew this year", "revenue by region"])
+        mock_pdf_repository.get_chunk_stats.return_value = stats
+        mock_pdf_repository.find_pdf_chunks.return_value = chunks
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        selected = await retriever.retrieve(pdf, "How did revenue grow?", top_k=2, token_budget=100)
+
+        # Assert
+        assert [chunk["chunk_index"] for chunk in selected] == [0, 2]
+        mock_pdf_repository.find_pdf_chunks.assert_called_once_with("hash", ["revenue", "grow"])
+
+    def test_fuse_rankings_weights_documents_by_best_score(self):
+        # Arrange
+        first = [
+            {"chunk_index": 4, "text": "a1", "score": 4.0},
+            {"chunk_index": 1, "text": "a2", "score": 2.0},
+            {"chunk_index": 0, "text": "a3", "score": 1.0},
+        ]
+        second = [{"chunk_index": 7, "text": "b1", "score": 4.0}]
+        third = [{"chunk_index": 2, "text": "c1", "score": 1.0}]
+
+        # Act
+        fused = fuse_rankings([first, second, third])
+
+        # Assert
+        assert [chunk["text"] for chunk in fused] == ["a1", "b1", "a2", "a3", "c1"]
+
+    @pytest.mark.asyncio
+    async def test_retrieve_many_merges_pdfs_under_one_budget(self, retriever, mock_pdf_repository):
+        # Arrange
+        report, report_stats = indexed_chunks(["revenue grew this year", "costs were flat", "revenue by region"])
+        memo, memo_stats = indexed_chunks(["revenue target for next year"])
+        stats = {"report-hash": report_stats, "memo-hash": memo_stats}
+        chunks = {"report-hash": report, "memo-hash": memo}
+        mock_pdf_repository.get_chunk_stats.side_effect = lambda content_key, terms: stats[content_key]
+        mock_pdf_repository.find_pdf_chunks.side_effect = lambda content_key, terms: [dict(chunk) for chunk in chunks[content_key]]
+        pdfs = [MagicMock(id="report", content_key="report-hash"), MagicMock(id="memo", content_key="memo-hash")]
+
+        # Act
+        selected = await retriever.retrieve_many(pdfs, "What about revenue?", top_k=3, token_budget=100)
+
+        # Assert
+        assert [(chunk["pdf_id"], chunk["chunk_index"]) for chunk in selected] == [("report", 0), ("report", 2), ("memo", 0)]
+
+    @pytest.mark.asyncio
+    async def test_retrieve_many_takes_chunks_of_the_only_relevant_pdf(self, retriever, mock_pdf_repository):
+        # Arrange
+        corpora = {f"hash-{index}": indexed_chunks(["costs were flat", "headcount grew", "new office opened"]) for index in range(9)}
+        corpora["hash-9"] = indexed_chunks(["revenue grew this year", "revenue by region", "revenue outlook"])
+        mock_pdf_repository.get_chunk_stats.side_effect = lambda content_key, terms: corpora[content_key][1]
+        mock_pdf_repository.find_pdf_chunks.side_effect = lambda content_key, terms: [dict(chunk) for chunk in corpora[content_key][0]]
+        pdfs = [MagicMock(id=f"pdf-{index}", content_key=f"hash-{index}") for index in range(10)]
+
+        # Act
+        selected = await retriever.retrieve_many(pdfs, "What about revenue?", top_k=3, token_budget=100)
+
+        # Assert
+        assert [(chunk["pdf_id"], chunk["chunk_index"]) for chunk in selected] == [("pdf-9", 0), ("pdf-9", 1), ("pdf-9", 2)]
+        mock_pdf_repository.get_pdf_chunks.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_retrieve_indexes_pdf_without_index(self, retriever, mock_pdf_repository):
+        # Arrange
+        _, stats = indexed_chunks(["legacy text"])
+        mock_pdf_repository.get_chunk_stats.side_effect = [None, stats]
+        mock_pdf_repository.get_pdf_pages.return_value = [(1, "legacy text")]
+        mock_pdf_repository.find_pdf_chunks.return_value = []
+        mock_pdf_repository.get_pdf_chunks.return_value = [{"chunk_index": 0, "page_number": 1, "text": "legacy text"}]
+        pdf = MagicMock(id="pdf-id", content_key="pdf-id")
+
+        # Act
+        selected = await retriever.retrieve(pdf, "anything else?")
+
+        # Assert
+        assert [chunk["text"] for chunk in selected] == ["legacy text"]
+        mock_pdf_repository.save_pdf_chunks.assert_called_once()
+        assert mock_pdf_repository.save_pdf_chunks.call_args.args[0] == "pdf-id"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_retrieves_index_pdf_once(self, retriever, mock_pdf_repository):
+        # Arrange
+        _, stats = indexed_chunks(["legacy text"])
+        mock_pdf_repository.get_chunk_stats.side_effect = lambda content_key, terms: stats if mock_pdf_repository.save_pdf_chunks.called else None
+
+        async def get_pdf_pages(pdf):
+            await asyncio.sleep(0.01)
+            return [(1, "legacy text")]
+
+        mock_pdf_repository.get_pdf_pages.side_effect = get_pdf_pages
+        mock_pdf_repository.find_pdf_chunks.return_value = []
+        mock_pdf_repository.get_pdf_chunks.return_value = [{"chunk_index": 0, "page_number": 1, "text": "legacy text"}]
+        pdf = MagicMock(id="pdf-id", content_key="pdf-id")
+
+        # Act
+        results = await asyncio.gather(*(retriever.retrieve(pdf, "anything else?") for _ in range(3)))
+
+        # Assert
+        assert all([chunk["text"] for chunk in selected] == ["legacy text"] for selected in results)
+        mock_pdf_repository.save_pdf_chunks.assert_called_once()
+        assert PDFRetriever._indexing == {}
+
+    def test_top_k_cosine_matches_word_forms(self):
+        # Arrange
+        texts = ["quarterly revenue growth", "employee headcount", "office locations"]
+        matrix, idf = vectors.build_vectors(texts, dim=256)
+
+        # Act
+        best = vectors.top_k_cosine(matrix, vectors.query_vector("how much did revenues grow", idf), 2)
+
+        # Assert
+        assert matrix.dtype == np.float32 and matrix.shape == (3, 256)
+        assert best[0][0] == 0
+        assert all(index != 2 for index, _ in best)
+
+    @pytest.mark.asyncio
+    async def test_retrieve_vector_mode_uses_memory_mapped_matrix(self, retriever, mock_pdf_repository, tmp_path):
+        # Arrange
+        texts = ["revenue grew strongly", "costs were flat", "new offices opened"]
+        matrix, idf = vectors.build_vectors(texts, dim=256)
+        mock_pdf_repository.get_chunk_stats.return_value = {
+            "chunk_count": 3,
+            "avg_length": 3,
+            "doc_freq": {},
+            "vector": {"file_id": "vector-id", "dim": 256, "idf": idf.tolist()},
+        }
+        mock_pdf_repository.get_pdf_vectors.return_value = vectors.to_bytes(matrix)
+        mock_pdf_repository.get_pdf_chunks_by_index.side_effect = lambda key, indexes: [
+            {"chunk_index": index, "page_number": 1, "text": texts[index]} for index in sorted(indexes)
+        ]
+        pdf = MagicMock(id="pdf-id", content_key="hash")
+
+        # Act
+        with patch("app.services.retrieval.config.PDF_VECTOR_CACHE_DIR", str(tmp_path)):
+            selected = await retriever.retrieve(pdf, "Did revenues grow?", top_k=1, mode=RetrievalMode.VECTOR)
+            await retriever.retrieve(pdf, "Did revenues grow?", top_k=1, mode=RetrievalMode.VECTOR)
+
+        # Assert
+        assert [chunk["text"] for chunk in selected] == ["revenue grew strongly"]
+        assert (tmp_path / "hash-vector-id.npy").exists()
+        mock_pdf_repository.get_pdf_vectors.assert_called_once_with("vector-id")
+
+    def test_prune_cache_removes_stale_and_least_recently_used_matrices(self, tmp_path):
+        # Arrange
+        for index, name in enumerate(["hash-old.npy", "other-a.npy", "other-b.npy", "hash-new.npy"]):
+            path = tmp_path / name
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (index, index))
+
+        # Act
+        with patch("app.services.retrieval.config.PDF_VECTOR_CACHE_MAX_BYTES", 200):
+            PDFRetriever._prune_cache("hash", tmp_path / "hash-new.npy")
+
+        # Assert
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["hash-new.npy", "other-b.npy"]